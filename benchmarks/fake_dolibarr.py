@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Fake Dolibarr REST API for offline benchmarks - served through httpx.MockTransport
+"""
+import asyncio
+import json
+import re
+from datetime import datetime, timezone
+import httpx
+
+# Base timestamp for generated data (2025-01-01 00:00:00 UTC)
+BASE_TS = 1735689600
+
+# sqlfilters field -> attribute of the generated objects
+FILTER_FIELDS = {
+    "t.rowid": "id",
+    "t.ref": "ref",
+    "t.title": "title",
+    "t.label": "label",
+    "t.tms": "tms",
+    "t.fk_projet": "fk_project",
+    "t.fk_task_parent": "fk_task_parent",
+    "t.progress": "progress",
+    "t.dateo": "date_start",
+    "t.datee": "date_end",
+    "t.fk_statut": "status",
+    "t.duration_effective": "duration_effective",
+}
+
+# Fields compared as Unix timestamps ('YYYY-MM-DD HH:MM:SS' in filters)
+DATE_FIELDS = {"tms", "date_start", "date_end"}
+
+CRITERIA_RE = re.compile(r"\((t\.\w+):(=|!=|<>|<=|>=|<|>|like|notlike):'?([^')]*?)'?\)")
+
+def parse_filter_value(field, value):
+    if field in DATE_FIELDS:
+        try:
+            return int(datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp())
+        except ValueError:
+            return int(float(value))
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+def match_criteria(item, field, operator, value):
+    actual = item.get(field)
+    if operator in ("like", "notlike"):
+        pattern = "^" + re.escape(value).replace("%", ".*").replace("_", ".") + "$"
+        found = re.match(pattern, str(actual or ""), re.IGNORECASE) is not None
+        return found if operator == "like" else not found
+    expected = parse_filter_value(field, value)
+    try:
+        actual = float(actual) if not isinstance(expected, str) else str(actual)
+    except (TypeError, ValueError):
+        return False
+    return {
+        "=": actual == expected,
+        "!=": actual != expected,
+        "<>": actual != expected,
+        "<": actual < expected,
+        ">": actual > expected,
+        "<=": actual <= expected,
+        ">=": actual >= expected,
+    }[operator]
+
+class FakeDolibarr:
+    """In-memory Dolibarr with generated projects and tasks and optional latency."""
+
+    def __init__(self, projects=10, tasks=None, latency=0.0, timespent_lines=5):
+        self.latency = latency
+        self.timespent_lines = timespent_lines
+        self.requests = 0
+        self.projects = {}
+        self.tasks = {}
+        self.project_tasks = {}
+        self.next_id = 10_000_000
+
+        for project_id in range(1, projects + 1):
+            self.projects[project_id] = {
+                "id": str(project_id),
+                "ref": f"PJ{project_id:06d}",
+                "title": f"Project {project_id}",
+                "description": f"Generated project {project_id}",
+                "status": str(project_id % 3),
+                "socid": str(project_id % 50 + 1),
+                "budget_amount": f"{(project_id % 20 + 1) * 1000:.2f}",
+                "date_start": BASE_TS + project_id * 3600,
+                "date_end": BASE_TS + project_id * 3600 + 90 * 86400,
+                "tms": BASE_TS + project_id * 60,
+            }
+            self.project_tasks[project_id] = []
+
+        task_count = projects if tasks is None else tasks
+        for task_id in range(1, task_count + 1):
+            project_id = (task_id - 1) % max(1, projects) + 1
+            siblings = self.project_tasks.get(project_id, [])
+            # Every third task is a child of the previous task of the same project
+            parent = siblings[-1] if siblings and task_id % 3 == 0 else 0
+            self.tasks[task_id] = {
+                "id": str(task_id),
+                "ref": f"TK{task_id:07d}",
+                "label": f"Task {task_id}",
+                "description": f"Generated task {task_id}",
+                "fk_project": str(project_id),
+                "fk_task_parent": str(parent),
+                "progress": str(task_id * 7 % 101),
+                "priority": "0",
+                "planned_workload": str((task_id % 10 + 1) * 3600),
+                "duration_effective": str((task_id % 7) * 1800),
+                "date_start": BASE_TS + task_id * 600,
+                "date_end": BASE_TS + task_id * 600 + 14 * 86400,
+                "tms": BASE_TS + task_id * 30,
+            }
+            self.project_tasks.setdefault(project_id, []).append(task_id)
+
+        # Modification clock: writes get a t.tms newer than any generated object
+        self.clock = max([BASE_TS] + [int(item["tms"]) for item in (*self.projects.values(), *self.tasks.values())])
+
+    def touch(self):
+        self.clock += 1
+        return self.clock
+
+    # --- transport ---
+
+    def transport(self):
+        return httpx.MockTransport(self.handle)
+
+    async def handle(self, request):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        path = request.url.path.split("/api/index.php", 1)[-1]
+        params = dict(request.url.params)
+        body = json.loads(request.content) if request.content else None
+        try:
+            status, payload = self.route(request.method, path, params, body)
+        except (ValueError, KeyError) as e:
+            status, payload = 400, {"error": {"code": 400, "message": str(e)}}
+        return httpx.Response(status, json=payload)
+
+    def not_found(self, what):
+        return 404, {"error": {"code": 404, "message": f"Not Found: {what} not found"}}
+
+    def route(self, method, path, params, body):
+        if path == "/status":
+            return 200, {"success": {"code": 200, "dolibarr_version": "20.0.0"}}
+
+        match = re.fullmatch(r"/projects/(\d+)/tasks", path)
+        if match:
+            project_id = int(match.group(1))
+            if project_id not in self.projects:
+                return self.not_found("project")
+            include = int(params.get("includetimespent", 0) or 0)
+            return 200, [self.task_view(self.tasks[tid], include) for tid in self.project_tasks.get(project_id, []) if tid in self.tasks]
+
+        match = re.fullmatch(r"/projects/(\d+)", path)
+        if match:
+            return self.object_route(self.projects, int(match.group(1)), method, body, "project")
+
+        if path == "/projects":
+            if method == "POST":
+                return 200, self.create(self.projects, body)
+            return self.list_route(self.projects, params)
+
+        match = re.fullmatch(r"/tasks/(\d+)/addtimespent", path)
+        if match:
+            task = self.tasks.get(int(match.group(1)))
+            if task is None:
+                return self.not_found("task")
+            task["duration_effective"] = str(int(task.get("duration_effective") or 0) + int(body.get("duration", 0)))
+            return 200, 1
+
+        match = re.fullmatch(r"/tasks/(\d+)", path)
+        if match:
+            task_id = int(match.group(1))
+            if method == "GET":
+                task = self.tasks.get(task_id)
+                if task is None:
+                    return self.not_found("task")
+                return 200, self.task_view(task, int(params.get("includetimespent", 0) or 0))
+            return self.object_route(self.tasks, task_id, method, body, "task")
+
+        if path == "/tasks":
+            if method == "POST":
+                task_id = self.create(self.tasks, body)
+                project_id = int(self.tasks[task_id].get("fk_project") or 0)
+                self.project_tasks.setdefault(project_id, []).append(task_id)
+                return 200, task_id
+            return self.list_route(self.tasks, params)
+
+        return 501, {"error": {"code": 501, "message": f"{method} {path} not implemented by the fake"}}
+
+    def create(self, table, body):
+        self.next_id += 1
+        item = {key: value if key in DATE_FIELDS else str(value) for key, value in (body or {}).items()}
+        item["id"] = str(self.next_id)
+        item.setdefault("fk_task_parent", "0")
+        item["tms"] = self.touch()
+        table[self.next_id] = item
+        return self.next_id
+
+    def object_route(self, table, object_id, method, body, what):
+        item = table.get(object_id)
+        if item is None:
+            return self.not_found(what)
+        if method == "PUT":
+            item.update(body or {})
+            item["tms"] = self.touch()
+            return 200, item
+        if method == "DELETE":
+            del table[object_id]
+            return 200, {"success": {"code": 200, "message": f"Object {what} deleted"}}
+        return 200, item
+
+    def list_route(self, table, params):
+        items = list(table.values())
+        for field, operator, value in CRITERIA_RE.findall(params.get("sqlfilters", "")):
+            attribute = FILTER_FIELDS.get(field, field.split(".", 1)[-1])
+            items = [item for item in items if match_criteria(item, attribute, operator, value)]
+
+        sortfield = FILTER_FIELDS.get(params.get("sortfield", "t.rowid"), "id")
+        numeric = sortfield in ("id", "tms", "progress", "date_start", "date_end")
+        items.sort(key=lambda item: float(item.get(sortfield) or 0) if numeric else str(item.get(sortfield) or ""),
+                   reverse=params.get("sortorder", "ASC").upper() == "DESC")
+
+        limit = int(params.get("limit", 100) or 100)
+        page = int(params.get("page", 0) or 0)
+        rows = items[page * limit:(page + 1) * limit]
+        if not rows:
+            return self.not_found("no object")
+        if params.get("properties"):
+            wanted = params["properties"].split(",")
+            rows = [{key: row[key] for key in wanted if key in row} for row in rows]
+        return 200, rows
+
+    def task_view(self, task, includetimespent):
+        if not includetimespent:
+            return task
+        view = dict(task)
+        task_id = int(task["id"])
+        durations = [(task_id + n) % 8 * 900 + 900 for n in range(self.timespent_lines)]
+        view["timespent_total_duration"] = str(sum(durations))
+        view["timespent_nblines"] = str(len(durations))
+        view["timespent_min_date"] = BASE_TS
+        view["timespent_max_date"] = BASE_TS + (len(durations) - 1) * 86400
+        if includetimespent == 2:
+            view["timespent_lines"] = [
+                {
+                    "id": str(task_id * 1000 + n),
+                    "task_date": datetime.fromtimestamp(BASE_TS + n * 86400, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+                    "task_duration": str(duration),
+                    "fk_user": str(n % 4 + 1),
+                    "note": f"Entry {n}",
+                }
+                for n, duration in enumerate(durations)
+            ]
+        return view
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite - runs every MCP tool of both Dolibarr servers against a fake Dolibarr
+"""
+import os
+import sys
+import argparse
+import asyncio
+import importlib.util
+import json
+import logging
+import time
+import tracemalloc
+from pathlib import Path
+import httpx
+
+# The servers read their configuration at import time
+os.environ.setdefault("DOLIBARR_URL", "http://dolibarr.invalid")
+os.environ.setdefault("DOLIBARR_API_KEY", "benchmark")
+os.environ["DOLIBARR_MIRROR_PATH"] = ""
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from fake_dolibarr import FakeDolibarr  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+SERVERS = {
+    "projects": ROOT / "mcp-server-projects" / "dolibarr_projects_server.py",
+    "tasks": ROOT / "mcp-server-tasks" / "dolibarr_tasks_server.py",
+}
+
+logger = logging.getLogger("dolibarr-benchmarks")
+
+# === SCENARIOS ===
+# Tool name -> function(dataset_size, iteration) returning the tool arguments.
+# Every registered tool must have a scenario so new tools are benchmarked too.
+
+def middle(size):
+    return max(1, size // 2)
+
+def timesheet_csv(size, iteration):
+    lines = ["task_id,date,duration,note"]
+    lines.extend(f"{(n % size) + 1},2025-01-{n % 28 + 1:02d},3600,Benchmark {iteration}" for n in range(50))
+    return "\n".join(lines)
+
+SCENARIOS = {
+    # Projects server
+    "dolibarr_get_project": lambda size, i: {"project_id": middle(size)},
+    "dolibarr_get_project_by_ref": lambda size, i: {"ref": f"PJ{middle(size):06d}"},
+    "dolibarr_list_projects": lambda size, i: {"limit": "100", "page": "0"},
+    "dolibarr_list_all_projects": lambda size, i: {},
+    "dolibarr_create_project": lambda size, i: {"ref": f"BENCH{i:05d}", "title": f"Benchmark {i}", "budget_amount": "1000"},
+    "dolibarr_clone_project": lambda size, i: {"source_project_id": 1, "ref": f"CLONE{i:05d}", "date_offset_days": "30"},
+    "dolibarr_update_project": lambda size, i: {"project_id": middle(size), "title": f"Benchmark {i}"},
+    "dolibarr_delete_project": lambda size, i: {"project_id": (size - i - 1) % size + 1, "confirm": "yes"},
+    "dolibarr_get_project_tasks": lambda size, i: {"project_id": middle(size), "includetimespent": 1},
+    "dolibarr_cache_stats": lambda size, i: {},
+    "dolibarr_mirror_status": lambda size, i: {},
+    "dolibarr_portfolio_rollup": lambda size, i: {"limit": "20"},
+    "dolibarr_project_changes": lambda size, i: {"since": "2025-01-01T12:00:00", "max_results": "500", "output_format": "tsv"},
+    # Tasks server
+    "dolibarr_get_task": lambda size, i: {"task_id": middle(size), "includetimespent": 2},
+    "dolibarr_get_task_by_ref": lambda size, i: {"ref": f"TK{middle(size):07d}"},
+    "dolibarr_get_tasks_batch": lambda size, i: {"task_ids": list(range(1, min(size, 50) + 1)), "includetimespent": 1},
+    "dolibarr_create_task": lambda size, i: {"ref": f"BT{i:05d}", "label": f"Benchmark {i}", "fk_project": str(middle(size)), "planned_workload": "7200"},
+    "dolibarr_modify_task": lambda size, i: {"task_id": middle(size), "progress": str(i % 101)},
+    "dolibarr_modify_tasks_bulk": lambda size, i: {"patches": [{"task_id": n, "progress": (n + i) % 101, "planned_workload": 72000} for n in range(1, min(size, 50) + 1)]},
+    "dolibarr_task_add_spenttime": lambda size, i: {"task_id": middle(size), "date": "2025-01-15", "duration": "3600"},
+    "dolibarr_task_add_spenttime_bulk": lambda size, i: {"entries": timesheet_csv(size, i)},
+    "dolibarr_search_tasks": lambda size, i: {"progress_max": "99", "end_to": "2025-03-01", "max_results": "1000", "output_format": "tsv"},
+    "dolibarr_get_task_tree": lambda size, i: {"project_id": middle(size)},
+    "dolibarr_task_changes": lambda size, i: {"since": "2025-01-01T12:00:00", "max_results": "500", "output_format": "tsv"},
+    "dolibarr_task_timesheet": lambda size, i: {"project_id": str(middle(size)), "group_by": "user,week", "entries_page": "0"},
+}
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+def load_server(name, path):
+    """Import a server script as a module without running its stdio entry point."""
+    spec = importlib.util.spec_from_file_location(f"benchmark_{name}_server", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def reset_server_state(module):
+    """
+    Drop the per-process state so every call starts cold: background work,
+    read cache, request coalescing, breaker, adaptive limiter (concurrency
+    and latency baselines), metrics, change feed watermarks, ref index and
+    mirror.
+    """
+    common = sys.modules["dolibarr_common"]
+    for task in list(common._background_tasks):
+        task.cancel()
+    common.cache.clear()
+    common._inflight.clear()
+    common.coalesce_stats.update(upstream=0, coalesced=0)
+    common.breaker.record_success()
+    common.limiter = common.AdaptiveLimiter(common.ADAPTIVE_MAX_CONCURRENCY, common.ADAPTIVE_MIN_CONCURRENCY,
+                                            common.ADAPTIVE_LATENCY_TOLERANCE, common.SCHEDULER_RESERVED_SLOTS)
+    common.metrics.counters.clear()
+    common.metrics.histograms.clear()
+    common.change_watermarks.clear()
+    if hasattr(module, "ref_index"):
+        module.ref_index.clear()
+    if getattr(module, "mirror", None) is not None:
+        module.mirror.close()
+        module.mirror = None
+
+async def list_tools(module):
+    return [tool.name for tool in await module.mcp.list_tools()]
+
+async def benchmark_tool(module, tool_name, size, fake, iterations, warm):
+    """Run one tool `iterations` times and collect latency, requests, allocations and output size."""
+    function = module.mcp._tool_manager.get_tool(tool_name).fn
+    scenario = SCENARIOS[tool_name]
+    latencies = []
+    requests = []
+    outputs = []
+
+    for iteration in range(iterations):
+        if not warm:
+            reset_server_state(module)
+        before = fake.requests
+        started = time.perf_counter()
+        result = await function(**scenario(size, iteration))
+        latencies.append(time.perf_counter() - started)
+        requests.append(fake.requests - before)
+        outputs.append(len(str(result).encode("utf-8")))
+        if iteration == 0 and str(result).startswith("❌"):
+            logger.warning(f"{tool_name} returned an error at size {size}: {str(result)[:200]}")
+
+    # One extra traced run for allocations (tracemalloc slows the call down)
+    if not warm:
+        reset_server_state(module)
+    tracemalloc.start()
+    await function(**scenario(size, iterations))
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "requests": max(requests),
+        "peak_alloc_kb": peak / 1024,
+        "output_bytes": max(outputs),
+    }
+
+async def run(args):
+    modules = {name: load_server(name, path) for name, path in SERVERS.items()}
+    logging.getLogger().setLevel(logging.WARNING)
+
+    missing = []
+    for name, module in modules.items():
+        for tool_name in await list_tools(module):
+            if tool_name not in SCENARIOS:
+                missing.append(f"{name}:{tool_name}")
+    if missing:
+        print(f"❌ No benchmark scenario for: {', '.join(missing)}", file=sys.stderr)
+        return None
+
+    results = {}
+    for size in args.sizes:
+        for name, module in modules.items():
+            for tool_name in await list_tools(module):
+                if args.tools and not any(pattern in tool_name for pattern in args.tools):
+                    continue
+                # Fresh dataset per tool so writes never leak into other measurements
+                fake = FakeDolibarr(projects=size, tasks=size, latency=args.latency)
+                # Both servers share the HTTP client of dolibarr_common
+                common = sys.modules["dolibarr_common"]
+                common._http_client = httpx.AsyncClient(
+                    transport=fake.transport(), headers=common.get_headers(), limits=httpx.Limits(max_connections=common.HTTP_MAX_CONNECTIONS)
+                )
+                try:
+                    stats = await benchmark_tool(module, tool_name, size, fake, args.iterations, args.warm)
+                finally:
+                    await common._http_client.aclose()
+                    common._http_client = None
+                key = f"{name}:{tool_name}@{size}"
+                results[key] = stats
+                print(
+                    f"{key:<55} p50 {stats['p50_ms']:9.2f} ms  p95 {stats['p95_ms']:9.2f} ms  p99 {stats['p99_ms']:9.2f} ms  "
+                    f"req {stats['requests']:5d}  alloc {stats['peak_alloc_kb']:10.1f} KiB  out {stats['output_bytes']:9d} B",
+                    flush=True
+                )
+    return results
+
+def compare(results, baseline, tolerance):
+    """Return regressions of results against a stored baseline."""
+    regressions = []
+    for key, stats in results.items():
+        reference = baseline.get(key)
+        if reference is None:
+            continue
+        for metric in ("p95_ms", "requests", "peak_alloc_kb", "output_bytes"):
+            allowed = reference[metric] * (1 + tolerance)
+            # Ignore sub-millisecond noise on very fast tools
+            if metric == "p95_ms":
+                allowed = max(allowed, reference[metric] + 1.0)
+            if stats[metric] > allowed:
+                regressions.append(f"{key} {metric}: {stats[metric]:.2f} > {reference[metric]:.2f} (+{tolerance:.0%} allowed)")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Dolibarr MCP tools against a local fake Dolibarr")
+    parser.add_argument("--sizes", default="10,1000,50000", help="comma-separated dataset sizes (projects and tasks)")
+    parser.add_argument("--latency", type=float, default=0.005, help="simulated upstream latency per request, in seconds")
+    parser.add_argument("--iterations", type=int, default=10, help="measured calls per tool and size")
+    parser.add_argument("--tools", default="", help="comma-separated substrings selecting the tools to run")
+    parser.add_argument("--warm", action="store_true", help="keep caches between calls instead of measuring cold calls")
+    parser.add_argument("--json", dest="json_path", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="fail if results regress against this JSON baseline")
+    parser.add_argument("--save-baseline", help="store the results as a new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression (default 0.25)")
+    args = parser.parse_args()
+    args.sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    args.tools = [tool.strip() for tool in args.tools.split(",") if tool.strip()]
+
+    results = asyncio.run(run(args))
+    if results is None:
+        return 2
+
+    for path in (args.json_path, args.save_baseline):
+        if path:
+            Path(path).write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+            print(f"Results written to {path}")
+
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        if regressions:
+            print("\n❌ Performance regressions:")
+            for regression in regressions:
+                print(f"   • {regression}")
+            return 1
+        print("\n✅ No regression against baseline")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
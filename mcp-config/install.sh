@@ -87,14 +87,14 @@ if command -v docker &> /dev/null; then
         echo -e "${GREEN}✓${NC} Image dolibarr-projects-mcp-server trouvée"
     else
         echo -e "${YELLOW}⚠${NC}  Image dolibarr-projects-mcp-server non trouvée"
-        echo "   Construisez-la avec: cd ../mcp-server && docker build -t dolibarr-projects-mcp-server:latest ."
+        echo "   Construisez-la avec: cd .. && docker build -f mcp-server-projects/Dockerfile -t dolibarr-projects-mcp-server:latest ."
     fi
 
     if docker images | grep -q "dolibarr-tasks-mcp-server"; then
         echo -e "${GREEN}✓${NC} Image dolibarr-tasks-mcp-server trouvée"
     else
         echo -e "${YELLOW}⚠${NC}  Image dolibarr-tasks-mcp-server non trouvée"
-        echo "   Construisez-la avec: cd ../mcp-server-tasks && docker build -t dolibarr-tasks-mcp-server:latest ."
+        echo "   Construisez-la avec: cd .. && docker build -f mcp-server-tasks/Dockerfile -t dolibarr-tasks-mcp-server:latest ."
     fi
 else
     echo -e "${RED}✗${NC} Docker n'est pas installé ou n'est pas dans le PATH"
@@ -114,8 +114,8 @@ echo "   docker mcp secret set DOLIBARR_URL=\"https://votre-dolibarr.com\""
 echo "   docker mcp secret set DOLIBARR_API_KEY=\"votre_cle_api\""
 echo ""
 echo "2. Construisez les images Docker si ce n'est pas déjà fait:"
-echo "   cd ../mcp-server && docker build -t dolibarr-projects-mcp-server:latest ."
-echo "   cd ../mcp-server-tasks && docker build -t dolibarr-tasks-mcp-server:latest ."
+echo "   cd .. && docker build -f mcp-server-projects/Dockerfile -t dolibarr-projects-mcp-server:latest ."
+echo "   cd .. && docker build -f mcp-server-tasks/Dockerfile -t dolibarr-tasks-mcp-server:latest ."
 echo ""
 echo "3. Vérifiez les serveurs MCP:"
 echo "   docker mcp server list"
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Combined Dolibarr MCP Server - Projects and tasks tools in a single process
+"""
+import os
+import sys
+import inspect
+import logging
+
+# The server modules sit next to this file in the Docker image, and in
+# their own directories in a repository checkout
+HERE = os.path.dirname(os.path.abspath(__file__))
+for directory in (HERE, os.path.join(HERE, "..", "mcp-server-common"), os.path.join(HERE, "..", "mcp-server-projects"),
+                  os.path.join(HERE, "..", "mcp-server-tasks")):
+    if os.path.isdir(directory) and directory not in sys.path:
+        sys.path.append(directory)
+
+import dolibarr_common as common
+import dolibarr_projects_server as projects
+import dolibarr_tasks_server as tasks
+from mcp.server.fastmcp import FastMCP
+
+logger = logging.getLogger("dolibarr-server")
+
+# Both server modules import dolibarr_common, so they already share one HTTP
+# pool, read cache, resilience layer, request scheduler, metrics registry,
+# background task set and one set of change feed watermarks and resource
+# subscriptions. Importing them registers their change feeds, resource
+# listings, warm-up steps and lifespan hooks with it as well. Reference
+# indexes stay per module since project and task refs share a namespace.
+
+def register_tools(target, *modules):
+    """
+    Register the tools of each server module on the target server.
+
+    Tools are the module's dolibarr_* coroutine functions, in definition order.
+    When two modules define the same tool, the first one wins.
+    """
+    registered = []
+    for module in modules:
+        for name, function in vars(module).items():
+            if not name.startswith("dolibarr_") or not inspect.iscoroutinefunction(function):
+                continue
+            if name in registered:
+                logger.debug(f"Tool {name} already registered - skipping {module.__name__} version")
+                continue
+            target.add_tool(function, name=name)
+            registered.append(name)
+    return registered
+
+# Initialize MCP server - the shared lifespan opens the HTTP pool, the
+# projects module's local mirror, the metrics exporters and the background
+# work of both modules, and cancels all of it on shutdown
+mcp = FastMCP("dolibarr", lifespan=common.server_lifespan, host=common.MCP_HOST, port=common.MCP_PORT)
+
+register_tools(mcp, projects, tasks)
+projects.register_resources(mcp)
+tasks.register_resources(mcp)
+common.enable_resource_listing(mcp)
+common.enable_resource_subscriptions(mcp)
+
+# === SERVER STARTUP ===
+if __name__ == "__main__":
+    logger.info("Starting combined Dolibarr MCP server...")
+
+    if not common.DOLIBARR_URL:
+        logger.warning("DOLIBARR_URL not set - server will return errors until configured")
+    if not common.DOLIBARR_API_KEY:
+        logger.warning("DOLIBARR_API_KEY not set - server will return errors until configured")
+
+    if common.MCP_TRANSPORT not in common.MCP_TRANSPORTS:
+        logger.error(f"Unknown DOLIBARR_MCP_TRANSPORT '{common.MCP_TRANSPORT}' - expected one of: {', '.join(common.MCP_TRANSPORTS)}")
+        sys.exit(1)
+
+    try:
+        common.run_server(mcp)
+    except Exception as e:
+        logger.error(f"Server error: {e}", exc_info=True)
+        sys.exit(1)
@@ -0,0 +1,1391 @@
+#!/usr/bin/env python3
+"""
+Shared Dolibarr MCP infrastructure - configuration, HTTP client, metrics,
+resilience, cache, pagination, change feeds and server startup, imported by
+the projects and tasks servers so one process holds a single copy of it
+"""
+import time
+
+# Reference for the cold-start log line, taken before the heavy imports
+STARTED_AT = time.perf_counter()
+
+import os
+import sys
+import asyncio
+import logging
+import json
+import random
+import re
+import functools
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import AsyncExitStack, asynccontextmanager, contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import httpx
+from mcp.server.lowlevel.server import request_ctx
+from mcp.types import ListResourcesRequest, ListResourcesResult
+
+# Configure logging to stderr
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    stream=sys.stderr
+)
+logger = logging.getLogger("dolibarr-common")
+
+# Configuration
+DOLIBARR_URL = os.environ.get("DOLIBARR_URL", "")
+DOLIBARR_API_KEY = os.environ.get("DOLIBARR_API_KEY", "")
+
+def get_env_int(name, default):
+    """Read an integer setting from the environment, falling back to default."""
+    value = os.environ.get(name, "").strip()
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning(f"{name}={value!r} is not a valid integer - using default {default}")
+        return default
+
+def get_env_float(name, default):
+    """Read a float setting from the environment, falling back to default."""
+    value = os.environ.get(name, "").strip()
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        logger.warning(f"{name}={value!r} is not a valid number - using default {default}")
+        return default
+
+def get_env_bool(name, default=False):
+    """Read a boolean setting from the environment (1/true/yes/on)."""
+    value = os.environ.get(name, "").strip().lower()
+    if not value:
+        return default
+    return value in ("1", "true", "yes", "on")
+
+# HTTP connection pool settings
+HTTP_MAX_CONNECTIONS = get_env_int("DOLIBARR_HTTP_MAX_CONNECTIONS", 20)
+HTTP_MAX_KEEPALIVE = get_env_int("DOLIBARR_HTTP_MAX_KEEPALIVE", 10)
+HTTP_KEEPALIVE_EXPIRY = get_env_float("DOLIBARR_HTTP_KEEPALIVE_EXPIRY", 30.0)
+HTTP2_ENABLED = get_env_bool("DOLIBARR_HTTP2")
+
+# Per-operation timeouts in seconds: single-object reads, list pages, writes
+TIMEOUTS = {
+    "read": get_env_float("DOLIBARR_TIMEOUT_READ", 10.0),
+    "list": get_env_float("DOLIBARR_TIMEOUT_LIST", 30.0),
+    "write": get_env_float("DOLIBARR_TIMEOUT_WRITE", 10.0),
+}
+
+# Retry, circuit breaker and adaptive concurrency settings
+RETRY_MAX = max(0, get_env_int("DOLIBARR_RETRY_MAX", 3))
+RETRY_BASE_DELAY = get_env_float("DOLIBARR_RETRY_BASE_DELAY", 0.5)
+RETRY_MAX_DELAY = get_env_float("DOLIBARR_RETRY_MAX_DELAY", 10.0)
+BREAKER_THRESHOLD = max(1, get_env_int("DOLIBARR_BREAKER_THRESHOLD", 5))
+BREAKER_RESET_TIMEOUT = get_env_float("DOLIBARR_BREAKER_RESET_TIMEOUT", 30.0)
+ADAPTIVE_MAX_CONCURRENCY = get_env_int("DOLIBARR_ADAPTIVE_MAX_CONCURRENCY", HTTP_MAX_CONNECTIONS)
+ADAPTIVE_MIN_CONCURRENCY = get_env_int("DOLIBARR_ADAPTIVE_MIN_CONCURRENCY", 2)
+ADAPTIVE_LATENCY_TOLERANCE = get_env_float("DOLIBARR_ADAPTIVE_LATENCY_TOLERANCE", 3.0)
+
+# Upstream scheduler: slots of the in-flight limit (DOLIBARR_ADAPTIVE_MAX_CONCURRENCY at most)
+# that bulk reads leave free for interactive reads and writes
+SCHEDULER_RESERVED_SLOTS = max(0, get_env_int("DOLIBARR_SCHEDULER_RESERVED_SLOTS", 2))
+
+# Read cache settings (TTL in seconds, 0 disables the cache)
+CACHE_TTL = get_env_float("DOLIBARR_CACHE_TTL", 60.0)
+CACHE_MAX_ENTRIES = get_env_int("DOLIBARR_CACHE_MAX_ENTRIES", 512)
+
+# Maximum number of ref -> id mappings kept in memory
+REF_INDEX_MAX_ENTRIES = max(1, get_env_int("DOLIBARR_REF_INDEX_MAX_ENTRIES", 50000))
+
+# Pagination settings for "list all" tools
+PAGE_SIZE = max(1, get_env_int("DOLIBARR_PAGE_SIZE", 100))
+PAGE_CONCURRENCY = max(1, get_env_int("DOLIBARR_PAGE_CONCURRENCY", 4))
+
+# Change feeds (poll interval in seconds, 0 disables the background poller)
+CHANGES_POLL_INTERVAL = get_env_float("DOLIBARR_CHANGES_POLL_INTERVAL", 0.0)
+CHANGES_MAX_RESULTS = max(1, get_env_int("DOLIBARR_CHANGES_MAX_RESULTS", 1000))
+# Seconds subtracted from the t.tms filter of the change feeds: Dolibarr compares
+# t.tms in the database session timezone, which may be behind UTC
+CHANGES_TMS_OVERLAP = max(0, get_env_int("DOLIBARR_CHANGES_TMS_OVERLAP", 3600))
+
+# Opt-in warm-up at server start: API key check, pooled connections and a
+# background prefetch of recently modified objects
+WARMUP_ENABLED = get_env_bool("DOLIBARR_WARMUP", False)
+WARMUP_CONNECTIONS = max(1, get_env_int("DOLIBARR_WARMUP_CONNECTIONS", 4))
+WARMUP_PREFETCH_SIZE = max(0, get_env_int("DOLIBARR_WARMUP_PREFETCH_SIZE", 100))
+
+# Metrics export (port 0 disables the /metrics endpoint, an empty path disables the file dump)
+METRICS_PORT = get_env_int("DOLIBARR_METRICS_PORT", 0)
+METRICS_HOST = os.environ.get("DOLIBARR_METRICS_HOST", "127.0.0.1")
+METRICS_FILE = os.environ.get("DOLIBARR_METRICS_FILE", "")
+METRICS_DUMP_INTERVAL = max(1.0, get_env_float("DOLIBARR_METRICS_DUMP_INTERVAL", 60.0))
+
+# MCP transport: "stdio" (one process per session), or "streamable-http" / "sse"
+# for a long-running process serving many sessions on MCP_HOST:MCP_PORT
+MCP_TRANSPORT = os.environ.get("DOLIBARR_MCP_TRANSPORT", "stdio").strip().lower()
+MCP_HOST = os.environ.get("DOLIBARR_MCP_HOST", "127.0.0.1")
+MCP_PORT = get_env_int("DOLIBARR_MCP_PORT", 8000)
+MCP_TRANSPORTS = ("stdio", "streamable-http", "sse")
+
+# === HTTP CLIENT ===
+
+# Process-wide client, opened by the server lifespan and reused by every tool
+_http_client = None
+
+def create_http_client():
+    """Create the pooled HTTP client used for all Dolibarr API requests."""
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+    )
+    try:
+        return httpx.AsyncClient(headers=get_headers(), limits=limits, http2=HTTP2_ENABLED, timeout=TIMEOUTS["read"])
+    except ImportError:
+        # HTTP/2 needs the optional 'h2' package (pip install 'httpx[http2]')
+        logger.warning("DOLIBARR_HTTP2 is enabled but 'h2' is not installed - falling back to HTTP/1.1")
+        return httpx.AsyncClient(headers=get_headers(), limits=limits, timeout=TIMEOUTS["read"])
+
+def get_client():
+    """Get the shared HTTP client, creating it if the lifespan has not run yet."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = create_http_client()
+    return _http_client
+
+# True while shared_resources() is open
+_shared_resources_active = False
+
+# Async context manager factories entered by shared_resources() - the server
+# modules add their own process-wide resources here (e.g. the local mirror)
+LIFESPAN_HOOKS = []
+
+@asynccontextmanager
+async def shared_resources():
+    """Open the shared HTTP client, the LIFESPAN_HOOKS, change poller, warm-up and metrics exporters, close them on exit."""
+    global _http_client, _shared_resources_active
+    client = get_client()
+    _shared_resources_active = True
+    logger.info(f"HTTP pool ready: max_connections={HTTP_MAX_CONNECTIONS}, max_keepalive={HTTP_MAX_KEEPALIVE}, http2={HTTP2_ENABLED}")
+
+    try:
+        async with AsyncExitStack() as hooks:
+            for hook in LIFESPAN_HOOKS:
+                await hooks.enter_async_context(hook())
+
+            background = []
+            if CHANGES_POLL_INTERVAL > 0 and DOLIBARR_URL and DOLIBARR_API_KEY:
+                background.append(asyncio.create_task(change_poller_loop()))
+                logger.info(f"Change poller enabled: {', '.join(CHANGE_FEEDS)} every {CHANGES_POLL_INTERVAL:g}s")
+            if WARMUP_ENABLED and DOLIBARR_URL and DOLIBARR_API_KEY:
+                background.append(asyncio.create_task(warm_up()))
+
+            try:
+                async with metrics_exporters():
+                    logger.info(f"Cold start: ready {(time.perf_counter() - STARTED_AT) * 1000:.0f} ms after import ({MCP_TRANSPORT})")
+                    yield client
+            finally:
+                # Background work of every server module, before the hooks close what it uses
+                for task in background + list(_background_tasks):
+                    task.cancel()
+                    try:
+                        await task
+                    except asyncio.CancelledError:
+                        pass
+    finally:
+        _shared_resources_active = False
+        if _http_client is client:
+            _http_client = None
+        await client.aclose()
+
+@asynccontextmanager
+async def server_lifespan(server):
+    """
+    Session lifespan. Under stdio the session owns the shared resources; with
+    an HTTP transport they are held for the whole process (see run_server).
+    """
+    if _shared_resources_active:
+        yield {"http_client": get_client()}
+        return
+    async with shared_resources() as client:
+        yield {"http_client": client}
+
+def get_headers():
+    """Get HTTP headers for Dolibarr API requests."""
+    return {
+        "DOLAPIKEY": DOLIBARR_API_KEY,
+        "Content-Type": "application/json",
+        "Accept": "application/json"
+    }
+
+# === OUTPUT FORMATS ===
+
+# Output formats of the list tools; json and tsv only return the selected fields
+OUTPUT_FORMATS = ("text", "json", "tsv")
+
+def parse_output_options(output_format, fields, default_fields):
+    """
+    Validate the output_format and fields parameters of a list tool.
+
+    Returns: (output_format, fields) with fields as a tuple of API field names
+
+    Raises: ValueError if the format is unknown
+    """
+    output_format = output_format.strip().lower() or "text"
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"output_format must be one of: {', '.join(OUTPUT_FORMATS)}")
+    selected = tuple(field.strip() for field in fields.split(",") if field.strip())
+    return output_format, selected or default_fields
+
+class UnknownFieldError(ValueError):
+    """Raised when the fields parameter names a field the listed objects do not have."""
+
+def check_fields(items, fields):
+    """Raise UnknownFieldError for fields found in none of the items (nothing to check without items)."""
+    unknown = [field for field in fields if items and not any(field in item for item in items)]
+    if unknown:
+        raise UnknownFieldError(f"Unknown field(s): {', '.join(unknown)}")
+
+def select_rows(items, fields):
+    """Return only the selected fields of each API object, as a list of values."""
+    items = list(items)
+    check_fields(items, fields)
+    return [[item.get(field) for field in fields] for item in items]
+
+def tsv_value(value):
+    """Render one value as a TSV cell - empty for null, tabs and newlines replaced by spaces."""
+    if value is None:
+        return ""
+    return str(value).replace("\t", " ").replace("\r", " ").replace("\n", " ")
+
+def format_rows(rows, fields, output_format, **extra):
+    """
+    Render selected rows in a dense machine-readable form.
+
+    - json: {"fields": [...], "rows": [[...], ...], **extra} without whitespace
+    - tsv: a header line, one line per row, then "# key=value" lines for extra
+    """
+    if output_format == "json":
+        payload = {"fields": list(fields), "rows": list(rows)}
+        payload.update(extra)
+        return json.dumps(payload, separators=(",", ":"), ensure_ascii=False, default=str)
+    lines = ["\t".join(fields)]
+    lines.extend("\t".join(map(tsv_value, row)) for row in rows)
+    lines.extend(f"# {key}={value}" for key, value in extra.items() if value is not None)
+    return "\n".join(lines)
+
+# === METRICS ===
+
+# Histogram buckets (seconds) shared by tool and upstream latency
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Metrics:
+    """
+    In-process counters and histograms rendered in the Prometheus text format.
+
+    Series are keyed by metric name and a tuple of (label, value) pairs.
+    Gauges are sampled from callbacks when the metrics are rendered.
+    """
+
+    def __init__(self):
+        self.descriptions = {}
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+
+    def describe(self, name, kind, text):
+        self.descriptions[name] = (kind, text)
+
+    def inc(self, name, labels=(), value=1):
+        key = (name, tuple(labels))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(labels))
+        series = self.histograms.get(key)
+        if series is None:
+            # Per-bucket counts (last slot is +Inf), sum, count
+            series = self.histograms[key] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0, 0]
+        index = next((i for i, bound in enumerate(LATENCY_BUCKETS) if value <= bound), len(LATENCY_BUCKETS))
+        series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def gauge(self, name, text, callback):
+        self.describe(name, "gauge", text)
+        self.gauges[name] = callback
+
+    @staticmethod
+    def format_labels(labels):
+        if not labels:
+            return ""
+        pairs = []
+        for key, value in labels:
+            value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            pairs.append(f'{key}="{value}"')
+        return "{" + ",".join(pairs) + "}"
+
+    def render(self):
+        """Return all series in the Prometheus text exposition format (version 0.0.4)."""
+        series_by_name = {}
+        for (name, labels), value in self.counters.items():
+            series_by_name.setdefault(name, []).append(f"{name}{self.format_labels(labels)} {value:g}")
+        for (name, labels), (buckets, total, count) in self.histograms.items():
+            lines = series_by_name.setdefault(name, [])
+            cumulative = 0
+            for bound, bucket in zip(LATENCY_BUCKETS + (float("inf"),), buckets):
+                cumulative += bucket
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{name}_bucket{self.format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{self.format_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{self.format_labels(labels)} {count}")
+        for name, callback in self.gauges.items():
+            try:
+                value = callback()
+                # A callback returns a number, or a dict of label tuples -> number
+                if isinstance(value, dict):
+                    series_by_name[name] = [f"{name}{self.format_labels(labels)} {float(number):g}" for labels, number in value.items()]
+                else:
+                    series_by_name[name] = [f"{name} {float(value):g}"]
+            except Exception as e:
+                logger.warning(f"Gauge {name} failed: {e}")
+
+        output = []
+        for name in sorted(series_by_name):
+            kind, text = self.descriptions.get(name, ("untyped", ""))
+            output.append(f"# HELP {name} {text}")
+            output.append(f"# TYPE {name} {kind}")
+            output.extend(series_by_name[name])
+        return "\n".join(output) + "\n"
+
+metrics = Metrics()
+metrics.describe("dolibarr_tool_calls_total", "counter", "MCP tool calls by tool and outcome")
+metrics.describe("dolibarr_tool_errors_total", "counter", "MCP tool errors by tool and upstream HTTP status")
+metrics.describe("dolibarr_tool_duration_seconds", "histogram", "MCP tool latency")
+metrics.describe("dolibarr_upstream_requests_total", "counter", "Dolibarr API requests by endpoint and HTTP status")
+metrics.describe("dolibarr_upstream_duration_seconds", "histogram", "Dolibarr API request latency by endpoint")
+metrics.describe("dolibarr_upstream_response_bytes_total", "counter", "Dolibarr API response body bytes by endpoint")
+metrics.gauge("dolibarr_upstream_in_flight", "Dolibarr API requests currently in flight", lambda: limiter.in_flight)
+metrics.gauge("dolibarr_upstream_concurrency_limit", "Current adaptive concurrency limit", lambda: int(limiter.limit))
+metrics.gauge("dolibarr_upstream_queue_depth", "Dolibarr API requests waiting for a scheduler slot, by class",
+              lambda: {(("class", name),): limiter.queued[name] for name in REQUEST_CLASSES})
+metrics.gauge("dolibarr_upstream_in_flight_by_class", "Dolibarr API requests in flight, by scheduler class",
+              lambda: {(("class", name),): limiter.running[name] for name in REQUEST_CLASSES})
+metrics.describe("dolibarr_upstream_queue_wait_seconds", "histogram", "Time Dolibarr API requests waited for a scheduler slot, by class")
+metrics.gauge("dolibarr_http_pool_max_connections", "Size of the shared HTTP connection pool", lambda: HTTP_MAX_CONNECTIONS)
+metrics.gauge("dolibarr_http_pool_utilization", "In-flight requests divided by the pool size", lambda: limiter.in_flight / HTTP_MAX_CONNECTIONS)
+metrics.gauge("dolibarr_circuit_breaker_open", "1 while the circuit breaker rejects requests", lambda: breaker.state != "closed")
+metrics.gauge("dolibarr_cache_entries", "Entries in the read cache", lambda: cache.stats()["entries"])
+
+# Upstream failure of the tool call being executed, reported in tool error metrics
+_tool_call = contextvars.ContextVar("dolibarr_tool_call", default=None)
+
+def endpoint_label(url):
+    """Collapse object IDs in an API URL so endpoints have a bounded set of label values."""
+    path = url.split("/api/index.php", 1)[-1].split("?", 1)[0]
+    return re.sub(r"/\d+(?=/|$)", "/{id}", path) or "/"
+
+def mark_tool_failure(status):
+    """Remember the upstream failure of the current tool call."""
+    call = _tool_call.get()
+    if call is not None:
+        call["status"] = status
+
+def record_upstream(method, url, status, latency, size=0):
+    """Record one Dolibarr API request (status is an HTTP code or an error name)."""
+    labels = (("method", method.upper()), ("endpoint", endpoint_label(url)))
+    metrics.inc("dolibarr_upstream_requests_total", labels + (("status", str(status)),))
+    metrics.observe("dolibarr_upstream_duration_seconds", labels, latency)
+    if size:
+        metrics.inc("dolibarr_upstream_response_bytes_total", labels, size)
+    if not isinstance(status, int) or status >= 400:
+        mark_tool_failure(status)
+
+def instrument_tool(func):
+    """Record call count, latency and errors of an MCP tool (errors are results starting with ❌)."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        parent = _tool_call.get()
+        call = {"status": None}
+        token = _tool_call.set(call)
+        priority_token = _request_priority.set("bulk") if func.__name__ in BULK_TOOLS else None
+        started = time.monotonic()
+        outcome = "error"
+        try:
+            result = await func(*args, **kwargs)
+            if not (isinstance(result, str) and result.startswith("❌")):
+                outcome = "ok"
+            return result
+        finally:
+            _tool_call.reset(token)
+            if priority_token is not None:
+                _request_priority.reset(priority_token)
+            tool = (("tool", func.__name__),)
+            metrics.observe("dolibarr_tool_duration_seconds", tool, time.monotonic() - started)
+            metrics.inc("dolibarr_tool_calls_total", tool + (("outcome", outcome),))
+            if outcome == "error":
+                metrics.inc("dolibarr_tool_errors_total", tool + (("status", str(call["status"] or "none")),))
+            if parent is not None and call["status"] is not None:
+                parent["status"] = call["status"]
+    return wrapper
+
+async def handle_metrics_request(reader, writer):
+    """Serve GET /metrics on the local metrics endpoint."""
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?", 1)[0] == "/metrics":
+            status, body = "200 OK", metrics.render().encode("utf-8")
+        else:
+            status, body = "404 Not Found", b"Not Found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+def dump_metrics(path):
+    """Write the metrics to a file atomically."""
+    temporary = f"{path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        f.write(metrics.render())
+    os.replace(temporary, path)
+
+async def metrics_dump_loop():
+    """Periodically dump the metrics to METRICS_FILE."""
+    while True:
+        await asyncio.sleep(METRICS_DUMP_INTERVAL)
+        try:
+            await asyncio.to_thread(dump_metrics, METRICS_FILE)
+        except OSError as e:
+            logger.warning(f"Metrics dump to {METRICS_FILE} failed: {e}")
+
+@asynccontextmanager
+async def metrics_exporters():
+    """Run the optional /metrics endpoint and metrics file dump for the lifetime of the server."""
+    server = None
+    dump_task = None
+    if METRICS_PORT:
+        try:
+            server = await asyncio.start_server(handle_metrics_request, METRICS_HOST, METRICS_PORT)
+            logger.info(f"Metrics endpoint: http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+        except OSError as e:
+            logger.warning(f"Metrics endpoint could not listen on {METRICS_HOST}:{METRICS_PORT}: {e}")
+    if METRICS_FILE:
+        dump_task = asyncio.create_task(metrics_dump_loop())
+        logger.info(f"Metrics dumped to {METRICS_FILE} every {METRICS_DUMP_INTERVAL:g}s")
+
+    try:
+        yield
+    finally:
+        if dump_task is not None:
+            dump_task.cancel()
+            try:
+                await dump_task
+            except asyncio.CancelledError:
+                pass
+            try:
+                dump_metrics(METRICS_FILE)
+            except OSError as e:
+                logger.warning(f"Metrics dump to {METRICS_FILE} failed: {e}")
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+
+# === RESILIENCE ===
+
+# HTTP statuses meaning Dolibarr (or its proxy) is temporarily unavailable
+TRANSIENT_STATUSES = (502, 503, 504)
+
+def is_transient(response):
+    """
+    Tell whether a response means Dolibarr is temporarily unavailable.
+
+    Dolibarr itself answers 503 with an {"error": ...} body for invalid
+    sqlfilters, a bad sortfield or an SQL error. Such an answer is final:
+    retrying cannot change it and it says nothing about Dolibarr's health.
+    Only 502/504 and a 503 without that body (proxy, maintenance) are transient.
+    """
+    if response.status_code not in TRANSIENT_STATUSES:
+        return False
+    if response.status_code == 503:
+        try:
+            body = response.json()
+        except ValueError:
+            return True
+        return not (isinstance(body, dict) and "error" in body)
+    return True
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Dolibarr while the circuit breaker is open."""
+
+class CircuitBreaker:
+    """Fail fast after repeated upstream failures, probing again after a cool-down."""
+
+    def __init__(self, threshold, reset_timeout):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probe_started = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_request(self):
+        """Raise CircuitOpenError unless a request may be sent now."""
+        state = self.state
+        now = time.monotonic()
+        # In half-open state a single probe goes through; a probe that never
+        # reported back (e.g. cancelled) is replaced after reset_timeout
+        probing = self._probe_started is not None and now - self._probe_started < self.reset_timeout
+        if state == "open" or (state == "half-open" and probing):
+            retry_in = max(0, self.reset_timeout - (now - self.opened_at))
+            raise CircuitOpenError(f"Dolibarr API temporarily unavailable - circuit breaker open, retry in {retry_in:.0f}s")
+        if state == "half-open":
+            self._probe_started = now
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info("Dolibarr API reachable again - circuit breaker closed")
+        self.failures = 0
+        self.opened_at = None
+        self._probe_started = None
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_started = None
+        if self.opened_at is not None or self.failures >= self.threshold:
+            if self.opened_at is None:
+                logger.warning(f"Dolibarr API failed {self.failures} times in a row - circuit breaker open for {self.reset_timeout:g}s")
+            self.opened_at = time.monotonic()
+
+# Upstream request classes, in dispatch priority order
+REQUEST_CLASSES = ("interactive", "write", "bulk")
+
+class AdaptiveLimiter:
+    """
+    Central scheduler of upstream requests with a concurrency limit that adapts to Dolibarr latency.
+
+    The limit grows additively while latency stays near its baseline and
+    shrinks multiplicatively when a request is much slower than the
+    baseline for its operation or fails.
+
+    Requests wait in one queue per class: a free slot goes to an interactive
+    read first, then a write, then a bulk read. Bulk reads never take the
+    last `reserved` slots, so single-object reads are not stuck behind a
+    large listing. Within a class, sessions are served round-robin.
+    """
+
+    def __init__(self, max_limit, min_limit, tolerance, reserved=0):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.tolerance = tolerance
+        self.reserved = max(0, reserved)
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self._baselines = {}
+        # Per class: session key -> waiting futures, the first session is served next
+        self._queues = {name: OrderedDict() for name in REQUEST_CLASSES}
+        self.queued = dict.fromkeys(REQUEST_CLASSES, 0)
+        self.running = dict.fromkeys(REQUEST_CLASSES, 0)
+        self.waits = {name: {"requests": 0, "total": 0.0, "max": 0.0} for name in REQUEST_CLASSES}
+
+    @property
+    def bulk_limit(self):
+        return max(1, int(self.limit) - self.reserved)
+
+    def _can_start(self, request_class):
+        if self.in_flight >= int(self.limit):
+            return False
+        return request_class != "bulk" or self.running["bulk"] < self.bulk_limit
+
+    def _start(self, request_class):
+        self.in_flight += 1
+        self.running[request_class] += 1
+
+    def _dispatch(self):
+        """Hand free slots to waiting requests, by class priority then session round-robin."""
+        for request_class in REQUEST_CLASSES:
+            queues = self._queues[request_class]
+            while queues and self._can_start(request_class):
+                key, waiters = next(iter(queues.items()))
+                waiter = waiters.popleft()
+                if waiters:
+                    queues.move_to_end(key)
+                else:
+                    del queues[key]
+                self.queued[request_class] -= 1
+                if not waiter.done():
+                    # The slot is taken on behalf of the waiter, so nobody overtakes it
+                    self._start(request_class)
+                    waiter.set_result(None)
+
+    async def acquire(self, request_class="interactive", session=None):
+        """Wait for a slot; returns the seconds spent waiting."""
+        started = time.monotonic()
+        ahead = any(self.queued[name] for name in REQUEST_CLASSES[:REQUEST_CLASSES.index(request_class) + 1])
+        if not ahead and self._can_start(request_class):
+            self._start(request_class)
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            waiters = self._queues[request_class].setdefault(id(session), deque())
+            waiters.append(waiter)
+            self.queued[request_class] += 1
+            try:
+                await waiter
+            except BaseException:
+                if waiter.done() and not waiter.cancelled():
+                    # Cancelled after being handed a slot: give it back
+                    self.in_flight -= 1
+                    self.running[request_class] -= 1
+                    self._dispatch()
+                elif waiter in waiters:
+                    waiters.remove(waiter)
+                    self.queued[request_class] -= 1
+                    if not waiters and self._queues[request_class].get(id(session)) is waiters:
+                        del self._queues[request_class][id(session)]
+                raise
+
+        waited = time.monotonic() - started
+        stats = self.waits[request_class]
+        stats["requests"] += 1
+        stats["total"] += waited
+        stats["max"] = max(stats["max"], waited)
+        return waited
+
+    def release(self, operation, latency, ok, request_class="interactive"):
+        self.in_flight -= 1
+        self.running[request_class] -= 1
+        baseline = self._baselines.get(operation)
+        if baseline is None or latency < baseline:
+            self._baselines[operation] = latency
+        else:
+            # Let the baseline drift slowly towards current latency
+            self._baselines[operation] = baseline * 0.95 + latency * 0.05
+
+        if not ok or (baseline is not None and latency > baseline * self.tolerance):
+            self.limit = max(self.min_limit, self.limit * 0.75)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+        self._dispatch()
+
+breaker = CircuitBreaker(BREAKER_THRESHOLD, BREAKER_RESET_TIMEOUT)
+limiter = AdaptiveLimiter(ADAPTIVE_MAX_CONCURRENCY, ADAPTIVE_MIN_CONCURRENCY, ADAPTIVE_LATENCY_TOLERANCE, SCHEDULER_RESERVED_SLOTS)
+
+# Tools whose reads are scheduled as bulk reads (each server module adds its own)
+BULK_TOOLS = set()
+
+# Request class forced for the current context: bulk tools and background work run as "bulk"
+_request_priority = contextvars.ContextVar("dolibarr_request_priority", default=None)
+
+def current_session():
+    """The MCP session of the request being handled, or None outside a client request."""
+    try:
+        return request_ctx.get().session
+    except LookupError:
+        return None
+
+@contextmanager
+def bulk_priority(enabled=True):
+    """Send the upstream requests made inside the block at bulk priority (no-op when not enabled)."""
+    token = _request_priority.set("bulk") if enabled else None
+    try:
+        yield
+    finally:
+        if token is not None:
+            _request_priority.reset(token)
+
+def request_class(operation):
+    """Scheduler class of an upstream request: "write", "bulk" (lists, bulk tools, background work) or "interactive"."""
+    if operation == "write":
+        return "write"
+    if operation == "list" or _request_priority.get() == "bulk" or current_session() is None:
+        return "bulk"
+    return "interactive"
+
+def format_scheduler_stats():
+    """Describe the upstream scheduler queues for dolibarr_cache_stats."""
+    lines = [f"🚦 Upstream Scheduler (limit {int(limiter.limit)}/{limiter.max_limit}, {limiter.in_flight} in flight):", ""]
+    for name in REQUEST_CLASSES:
+        stats = limiter.waits[name]
+        average = stats["total"] / stats["requests"] if stats["requests"] else 0.0
+        lines.append(f"   {name.capitalize()}: {limiter.running[name]} in flight, {limiter.queued[name]} queued - "
+                     f"{stats['requests']} request(s), wait avg {average * 1000:.0f} ms, max {stats['max'] * 1000:.0f} ms")
+    return "\n".join(lines)
+
+def retry_delay(attempt):
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+def parse_retry_after(response):
+    """Return the Retry-After delay in seconds, or None if absent or invalid."""
+    value = response.headers.get("Retry-After", "").strip()
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+async def send_request(method, url, params=None, json=None, operation="read"):
+    """
+    Send a request to Dolibarr through the resilience layer.
+
+    - GETs are retried with exponential backoff and jitter on timeouts,
+      network errors and transient statuses (see is_transient)
+    - any method is retried when the connection could not be opened or
+      Dolibarr answers 429 (honoring Retry-After), since nothing was processed
+    - the circuit breaker fails fast while Dolibarr is down
+    - the scheduler caps concurrent requests when latency rises, and serves
+      interactive reads before writes and bulk reads (see AdaptiveLimiter)
+
+    The timeout comes from the operation: "read", "list" or "write".
+
+    Returns: httpx.Response (status is not checked)
+
+    Raises: CircuitOpenError, httpx.TransportError
+    """
+    idempotent = method.upper() == "GET"
+    timeout = TIMEOUTS.get(operation, TIMEOUTS["read"])
+    priority = request_class(operation)
+    session = current_session()
+    attempt = 0
+
+    while True:
+        try:
+            breaker.before_request()
+        except CircuitOpenError:
+            mark_tool_failure("circuit_open")
+            raise
+        waited = await limiter.acquire(priority, session)
+        metrics.observe("dolibarr_upstream_queue_wait_seconds", (("class", priority),), waited)
+        started = time.monotonic()
+        try:
+            response = await get_client().request(method, url, params=params, json=json, timeout=timeout)
+        except httpx.TransportError as e:
+            limiter.release(operation, time.monotonic() - started, ok=False, request_class=priority)
+            record_upstream(method, url, type(e).__name__, time.monotonic() - started)
+            if not isinstance(e, httpx.PoolTimeout):
+                breaker.record_failure()
+            not_sent = isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+            if attempt < RETRY_MAX and (idempotent or not_sent):
+                logger.warning(f"{method} {url} failed ({type(e).__name__}) - retry {attempt + 1}/{RETRY_MAX}")
+                await asyncio.sleep(retry_delay(attempt))
+                attempt += 1
+                continue
+            raise
+        except BaseException:
+            limiter.release(operation, time.monotonic() - started, ok=False, request_class=priority)
+            raise
+
+        latency = time.monotonic() - started
+        transient = is_transient(response)
+        limiter.release(operation, latency, ok=not transient, request_class=priority)
+        record_upstream(method, url, response.status_code, latency, len(response.content))
+        if transient:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+        if attempt < RETRY_MAX and (response.status_code == 429 or (transient and idempotent)):
+            delay = parse_retry_after(response) if response.status_code == 429 else None
+            delay = min(RETRY_MAX_DELAY, delay) if delay is not None else retry_delay(attempt)
+            logger.warning(f"{method} {url} returned {response.status_code} - retry {attempt + 1}/{RETRY_MAX} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+
+        return response
+
+# === REQUEST COALESCING ===
+
+# Upstream GETs currently in flight, keyed by URL and params
+_inflight = {}
+coalesce_stats = {"upstream": 0, "coalesced": 0}
+
+async def _fetch_json(url, params, operation):
+    response = await send_request("GET", url, params=params, operation=operation)
+    response.raise_for_status()
+    return response.json()
+
+def _finish_inflight(key, task):
+    if _inflight.get(key) is task:
+        del _inflight[key]
+    # Mark the error as retrieved even if every waiter was cancelled
+    if not task.cancelled():
+        task.exception()
+
+async def get_json(url, params=None, operation="read"):
+    """
+    GET a Dolibarr endpoint and return the decoded JSON.
+
+    Identical concurrent requests (same URL and params) share a single
+    upstream call and its decoded result. The shared call runs as its own
+    task, so a cancelled caller does not cancel it for the others.
+
+    Raises: httpx.HTTPStatusError on non-2xx responses
+    """
+    key = TTLCache.make_key(url, params)
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_fetch_json(url, params, operation))
+        _inflight[key] = task
+        task.add_done_callback(lambda done: _finish_inflight(key, done))
+        coalesce_stats["upstream"] += 1
+    else:
+        coalesce_stats["coalesced"] += 1
+    return await asyncio.shield(task)
+
+# === CACHE ===
+
+class TTLCache:
+    """Small in-process read cache with per-entry TTL and LRU eviction."""
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(url, params=None):
+        """Build a cache key from an endpoint URL and its query parameters."""
+        return (url, tuple(sorted((str(k), str(v)) for k, v in (params or {}).items())))
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, url, params=None):
+        """Return (True, value) on a fresh hit, (False, None) otherwise."""
+        if not self.enabled:
+            return False, None
+        key = self.make_key(url, params)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return False, None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, value
+
+    def set(self, url, params, value):
+        """Store a value, evicting the least recently used entries if full."""
+        if not self.enabled:
+            return
+        key = self.make_key(url, params)
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def has_fresh(self, url, params=None):
+        """True if an unexpired entry exists, without touching counters or LRU order."""
+        entry = self._entries.get(self.make_key(url, params))
+        return entry is not None and entry[0] > time.monotonic()
+
+    def peek(self, url):
+        """Return cached values for a URL (any params) without touching counters or LRU order (expired ones included)."""
+        return [value for key, (_expires, value) in self._entries.items() if key[0] == url]
+
+    def invalidate(self, *urls):
+        """Drop every cached entry (whatever its params) for the given URLs."""
+        targets = set(urls)
+        for key in [key for key in self._entries if key[0] in targets]:
+            del self._entries[key]
+
+    def invalidate_matching(self, predicate):
+        """Drop every cached entry whose URL satisfies predicate(url)."""
+        for key in [key for key in self._entries if predicate(key[0])]:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss counters and current occupancy."""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+        }
+
+cache = TTLCache(CACHE_TTL, CACHE_MAX_ENTRIES)
+
+async def cached_get_json(url, params=None, operation="read"):
+    """GET a Dolibarr endpoint through the read cache and return the decoded JSON."""
+    found, value = cache.get(url, params)
+    if found:
+        return value
+    value = await get_json(url, params, operation)
+    cache.set(url, params, value)
+    return value
+
+# === REFERENCE LOOKUPS ===
+
+def check_filter_value(value, name):
+    """
+    Reject a value that cannot be embedded in a sqlfilters string.
+
+    The sqlfilters syntax has no escape for a quote: the value ends at the
+    next ', so anything after it would be parsed as filter syntax.
+
+    Raises: ValueError if the value contains a quote
+    """
+    if "'" in value:
+        raise ValueError(f"{name} containing a quote (') cannot be used in a Dolibarr filter, got: {value}")
+
+def build_ref_filter(ref):
+    """
+    Build a sqlfilters expression matching t.ref.
+
+    A ref containing a quote is rejected (see check_filter_value); Dolibarr's
+    numbering modules never generate quotes. The parser also splits on parentheses,
+    so a ref containing them is matched with LIKE, with each parenthesis
+    and each '%' replaced by the '_' single character wildcard: the match
+    is then limited to refs of the same length, and callers compare the
+    returned refs exactly.
+
+    Raises: ValueError if the ref contains a quote
+    """
+    check_filter_value(ref, "references")
+    if "(" in ref or ")" in ref:
+        pattern = ref.replace("(", "_").replace(")", "_").replace("%", "_")
+        return f"(t.ref:like:'{pattern}')"
+    return f"(t.ref:=:'{ref}')"
+
+# === PAGINATION ===
+
+async def fetch_page(url, params, page, limit, operation="list"):
+    """Fetch a single page of a Dolibarr list endpoint (404 means an empty page)."""
+    page_params = dict(params or {})
+    page_params["limit"] = limit
+    page_params["page"] = page
+    try:
+        return await get_json(url, page_params, operation) or []
+    except httpx.HTTPStatusError as e:
+        # Dolibarr answers 404 instead of an empty list when a page has no rows
+        if e.response.status_code == 404:
+            return []
+        raise
+
+async def iter_pages(url, params=None, limit=None, concurrency=None, operation="list"):
+    """
+    Yield the pages of a Dolibarr list endpoint in order.
+
+    The first page is fetched alone; if it is full, the following pages are
+    fetched in parallel windows of `concurrency` requests. Iteration stops at
+    the first short or empty page, and pages are always yielded in page order
+    so the endpoint's sortfield/sortorder is preserved.
+    """
+    limit = limit or PAGE_SIZE
+    concurrency = max(1, concurrency or PAGE_CONCURRENCY)
+
+    first = await fetch_page(url, params, 0, limit, operation)
+    if first:
+        yield first
+    if len(first) < limit:
+        return
+
+    page = 1
+    while True:
+        window = range(page, page + concurrency)
+        results = await asyncio.gather(
+            *(fetch_page(url, params, p, limit, operation) for p in window),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+            if result:
+                yield result
+            if len(result) < limit:
+                return
+        page += concurrency
+
+async def fetch_all_pages(url, params=None, limit=None, concurrency=None, operation="list"):
+    """Fetch every row of a Dolibarr list endpoint using concurrent pagination."""
+    rows = []
+    async for rows_page in iter_pages(url, params, limit, concurrency, operation):
+        rows.extend(rows_page)
+    return rows
+
+# === WARM-UP ===
+
+# Steps run by warm_up() once the API key is validated (each server module adds its own)
+WARMUP_PREFETCH = []
+
+# Background tasks started outside the lifespan's own (held so they are not garbage collected)
+_background_tasks = set()
+
+def spawn_background(coro):
+    """Run a coroutine in the background as bulk work, detached from the current tool call's metrics."""
+    async def runner():
+        _tool_call.set(None)
+        _request_priority.set("bulk")
+        try:
+            await coro
+        except Exception as e:
+            logger.warning(f"Background request failed: {e}")
+
+    task = asyncio.create_task(runner())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+async def warm_up():
+    """
+    Check the API key once, open pooled connections, then run the WARMUP_PREFETCH steps.
+
+    Runs in the background so the MCP handshake never waits for it; tool
+    calls made meanwhile share its requests through coalescing and the cache.
+    """
+    started = time.monotonic()
+    url = f"{DOLIBARR_URL}/api/index.php/status"
+    try:
+        await get_json(url)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code in (401, 403):
+            logger.error("Warm-up: Dolibarr rejected the API key - check DOLIBARR_API_KEY")
+        else:
+            logger.error(f"Warm-up: /status answered {e.response.status_code}")
+        return
+    except Exception as e:
+        logger.error(f"Warm-up: Dolibarr is not reachable - {e}")
+        return
+
+    # Concurrent requests each take their own connection, which then stays in
+    # the keep-alive pool (send_request, since get_json would coalesce them)
+    extra = min(WARMUP_CONNECTIONS, HTTP_MAX_KEEPALIVE) - 1
+    if extra > 0:
+        await asyncio.gather(*(send_request("GET", url) for _ in range(extra)), return_exceptions=True)
+    logger.info(f"Warm-up: API key valid, {extra + 1} connection(s) open in {time.monotonic() - started:.2f}s")
+
+    for step in WARMUP_PREFETCH:
+        try:
+            summary = await step()
+            logger.info(f"Warm-up: {step.__name__} done ({summary}) after {time.monotonic() - started:.2f}s")
+        except Exception as e:
+            logger.warning(f"Warm-up: {step.__name__} failed - {e}")
+
+# === CHANGE FEED ===
+
+def parse_tms(value):
+    """Convert a Dolibarr modification timestamp (Unix time or 'YYYY-MM-DD HH:MM:SS') to Unix time."""
+    if value in (None, ""):
+        return 0
+    try:
+        return int(float(value))
+    except (ValueError, TypeError):
+        pass
+    try:
+        return int(datetime.fromisoformat(str(value)).replace(tzinfo=timezone.utc).timestamp())
+    except ValueError:
+        return 0
+
+def format_tms_filter(timestamp):
+    """Format Unix time for a sqlfilters comparison on t.tms."""
+    return datetime.fromtimestamp(max(0, timestamp), tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+def parse_watermark(since):
+    """
+    Parse a change feed watermark.
+
+    Accepts a token returned by a change feed tool - '<unix time>' or
+    '<unix time>:<id>,<id>' with the IDs already delivered at that second -
+    or an ISO 8601 date (UTC unless it carries an offset).
+
+    Returns: (unix time, set of IDs)
+
+    Raises: ValueError on anything else
+    """
+    since = since.strip()
+    match = re.fullmatch(r"(\d+)(?::([\d,]*))?", since)
+    if match:
+        return int(match.group(1)), {int(value) for value in (match.group(2) or "").split(",") if value}
+    try:
+        moment = datetime.fromisoformat(since)
+        # A date without offset is UTC; an explicit offset is honoured
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return int(moment.timestamp()), set()
+    except ValueError:
+        raise ValueError(f"since must be a watermark returned by a change feed or an ISO 8601 date, got: {since}")
+
+def format_watermark(timestamp, ids):
+    if not ids:
+        return str(timestamp)
+    return f"{timestamp}:{','.join(map(str, sorted(ids)))}"
+
+async def read_changes(path, watermark=None, sqlfilters="", max_results=None):
+    """
+    Read the objects of a list endpoint modified since a watermark, oldest first.
+
+    Pages are read by keyset on t.tms - each request restarts at the newest
+    t.tms delivered - instead of by offset, so objects modified during the
+    scan cannot shift a page boundary and be skipped. t.tms has a one-second
+    resolution: objects already delivered at the watermark second are
+    dropped, the others of that second are still returned.
+
+    The filter starts CHANGES_TMS_OVERLAP seconds before the watermark, since
+    the UTC filter string is compared in the database timezone; the rows
+    older than the watermark it lets through are dropped here.
+
+    watermark None starts the feed at the most recent change without
+    returning anything.
+
+    Returns: (objects, new watermark token, truncated)
+    """
+    url = f"{DOLIBARR_URL}/api/index.php/{path}"
+    max_results = max_results or CHANGES_MAX_RESULTS
+
+    if watermark is None:
+        params = {"sortfield": "t.tms", "sortorder": "DESC"}
+        if sqlfilters:
+            params["sqlfilters"] = sqlfilters
+        latest = await fetch_page(url, params, 0, 1, "changes")
+        if not latest:
+            return [], "0", False
+        return [], format_watermark(parse_tms(latest[0].get('tms')), {int(latest[0]['id'])}), False
+
+    timestamp, seen = watermark
+    seen = set(seen)
+    changes = []
+    limit = min(PAGE_SIZE, max_results + 1)
+    page = 0
+    while True:
+        criteria = f"(t.tms:>=:'{format_tms_filter(timestamp - CHANGES_TMS_OVERLAP)}')"
+        params = {"sortfield": "t.tms", "sortorder": "ASC", "sqlfilters": f"{criteria} and {sqlfilters}" if sqlfilters else criteria}
+        rows = await fetch_page(url, params, page, limit, "changes")
+        fresh = 0
+        for row in rows:
+            stamp = parse_tms(row.get('tms'))
+            row_id = int(row.get('id') or 0)
+            if stamp < timestamp or (stamp == timestamp and row_id in seen):
+                continue
+            if len(changes) == max_results:
+                return changes, format_watermark(timestamp, seen), True
+            if stamp > timestamp:
+                timestamp, seen = stamp, set()
+            seen.add(row_id)
+            changes.append(row)
+            fresh += 1
+        if len(rows) < limit:
+            return changes, format_watermark(timestamp, seen), False
+        # A full page of objects already delivered at one second: move past it
+        page = 0 if fresh else page + 1
+
+# Feed name -> (list endpoint, function called for each changed object returning its
+# resource URIs); each server module adds its own feeds
+CHANGE_FEEDS = {}
+
+# Server-remembered watermarks of the change feed tools and of the poller, per feed and consumer
+change_watermarks = {}
+
+# Resource URI -> sessions subscribed to it with resources/subscribe
+resource_subscriptions = {}
+
+def enable_resource_subscriptions(server):
+    """Handle resources/subscribe and resources/unsubscribe on a FastMCP server and advertise it."""
+    lowlevel = server._mcp_server
+
+    @lowlevel.subscribe_resource()
+    async def subscribe(uri):
+        resource_subscriptions.setdefault(str(uri), set()).add(lowlevel.request_context.session)
+
+    @lowlevel.unsubscribe_resource()
+    async def unsubscribe(uri):
+        sessions = resource_subscriptions.get(str(uri))
+        if sessions is not None:
+            sessions.discard(lowlevel.request_context.session)
+            if not sessions:
+                del resource_subscriptions[str(uri)]
+
+    get_capabilities = lowlevel.get_capabilities
+
+    def capabilities(*args, **kwargs):
+        result = get_capabilities(*args, **kwargs)
+        if result.resources is not None:
+            result.resources.subscribe = True
+        return result
+
+    lowlevel.get_capabilities = capabilities
+
+async def notify_resource_updated(uris):
+    """Send notifications/resources/updated to the sessions subscribed to any of the URIs."""
+    for uri in uris:
+        for session in list(resource_subscriptions.get(uri, ())):
+            try:
+                await session.send_resource_updated(uri)
+            except Exception as e:
+                # The session is gone: drop all its subscriptions
+                logger.debug(f"Dropping subscriptions of a closed session: {e}")
+                for sessions in resource_subscriptions.values():
+                    sessions.discard(session)
+
+async def apply_changes(feed, changes):
+    """Invalidate cached copies of changed objects and notify subscribers."""
+    _path, on_change = CHANGE_FEEDS[feed]
+    uris = set()
+    for item in changes:
+        uris.update(on_change(item))
+    if uris and resource_subscriptions:
+        await notify_resource_updated(sorted(uris))
+
+async def change_poller_loop():
+    """Poll every change feed, invalidating the cache and notifying subscribers of each change."""
+    while True:
+        await asyncio.sleep(CHANGES_POLL_INTERVAL)
+        for feed, (path, _on_change) in list(CHANGE_FEEDS.items()):
+            key = ("poller", feed)
+            try:
+                watermark = change_watermarks.get(key)
+                changes, token, _truncated = await read_changes(path, parse_watermark(watermark) if watermark else None)
+                change_watermarks[key] = token
+                await apply_changes(feed, changes)
+                if changes:
+                    logger.info(f"Change poller: {len(changes)} {feed} change(s)")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Change poller failed for {feed}: {e}")
+
+# === RESOURCES ===
+
+def resource_json(value):
+    """Serialize an API object or list as the text of a JSON resource."""
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+# Listing name -> (list endpoint, function returning the resources/list entry of an
+# object, function indexing the refs of a page); each server module adds its own
+RESOURCE_LISTINGS = {}
+
+async def list_resources_page(request: ListResourcesRequest) -> ListResourcesResult:
+    """
+    resources/list handler: the objects of each RESOURCE_LISTINGS endpoint, one Dolibarr page per call.
+
+    The cursor is '<listing>:<page>'. Every entry carries the object's t.tms
+    as _meta.version, so a host can keep the resources it already read and
+    only re-read those whose version changed.
+    """
+    names = list(RESOURCE_LISTINGS)
+    if not names or not DOLIBARR_URL or not DOLIBARR_API_KEY:
+        return ListResourcesResult(resources=[])
+
+    cursor = request.params.cursor if request.params else None
+    name, page = names[0], 0
+    if cursor:
+        name, _, page_text = cursor.partition(":")
+        if name not in RESOURCE_LISTINGS or not page_text.isdigit():
+            raise ValueError(f"Invalid cursor: {cursor}")
+        page = int(page_text)
+
+    path, to_resource, remember_refs = RESOURCE_LISTINGS[name]
+    params = {"sortfield": "t.rowid", "sortorder": "ASC"}
+    rows = await fetch_page(f"{DOLIBARR_URL}/api/index.php/{path}", params, page, PAGE_SIZE)
+    remember_refs(rows)
+
+    next_cursor = None
+    if len(rows) >= PAGE_SIZE:
+        next_cursor = f"{name}:{page + 1}"
+    elif names.index(name) + 1 < len(names):
+        next_cursor = f"{names[names.index(name) + 1]}:0"
+    return ListResourcesResult(resources=[to_resource(row) for row in rows], nextCursor=next_cursor)
+
+def enable_resource_listing(server):
+    """Serve resources/list on a FastMCP server from RESOURCE_LISTINGS, with pagination."""
+    server._mcp_server.list_resources()(list_resources_page)
+
+# === CACHE STATISTICS ===
+
+def format_cache_stats():
+    """Describe the read cache, request coalescing and scheduler queues for dolibarr_cache_stats."""
+    stats = cache.stats()
+    if not cache.enabled:
+        return (
+            "📊 Read cache is disabled (set DOLIBARR_CACHE_TTL and DOLIBARR_CACHE_MAX_ENTRIES to enable it)\n\n"
+            f"🔀 Request Coalescing:\n\n"
+            f"   Upstream GETs: {coalesce_stats['upstream']}\n"
+            f"   Coalesced GETs (served by an identical in-flight request): {coalesce_stats['coalesced']}\n\n"
+            f"{format_scheduler_stats()}"
+        )
+
+    return (
+        f"📊 Read Cache Statistics:\n\n"
+        f"   Entries: {stats['entries']}/{stats['max_entries']}\n"
+        f"   TTL: {stats['ttl']:g} seconds\n"
+        f"   Hits: {stats['hits']}\n"
+        f"   Misses: {stats['misses']}\n"
+        f"   Evictions: {stats['evictions']}\n"
+        f"   Hit ratio: {stats['hit_ratio']:.1%}\n\n"
+        f"🔀 Request Coalescing:\n\n"
+        f"   Upstream GETs: {coalesce_stats['upstream']}\n"
+        f"   Coalesced GETs (served by an identical in-flight request): {coalesce_stats['coalesced']}\n\n"
+        f"{format_scheduler_stats()}"
+    )
+
+# === SERVER STARTUP ===
+
+def run_server(server):
+    """
+    Run an MCP server on the configured transport.
+
+    Under stdio the process serves a single session. HTTP transports serve
+    many sessions from one warm process, so the web app holds the shared
+    resources for the lifetime of the process.
+    """
+    if MCP_TRANSPORT == "stdio":
+        server.run(transport="stdio")
+        return
+
+    # Deferred: only the HTTP transports need the ASGI server
+    import uvicorn
+
+    app = server.sse_app() if MCP_TRANSPORT == "sse" else server.streamable_http_app()
+    app_lifespan = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def process_lifespan(app):
+        async with shared_resources():
+            async with app_lifespan(app):
+                yield
+
+    app.router.lifespan_context = process_lifespan
+    path = server.settings.sse_path if MCP_TRANSPORT == "sse" else server.settings.streamable_http_path
+    logger.info(f"Serving MCP over {MCP_TRANSPORT} on http://{MCP_HOST}:{MCP_PORT}{path}")
+    uvicorn.run(app, host=MCP_HOST, port=MCP_PORT, log_level="warning")
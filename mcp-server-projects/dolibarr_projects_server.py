@@ -4,37 +4,78 @@ Simple Dolibarr Projects MCP Server - Manage Dolibarr projects via MCP
 """
 import os
 import sys
+
+# The shared module sits next to this file in the Docker image, and in its own
+# directory in a repository checkout. Imported first: its import time is the
+# reference for the cold-start log line
+HERE = os.path.dirname(os.path.abspath(__file__))
+for directory in (HERE, os.path.join(HERE, "..", "mcp-server-common")):
+    if os.path.isdir(directory) and directory not in sys.path:
+        sys.path.append(directory)
+
+from dolibarr_common import (
+    BULK_TOOLS, CHANGES_MAX_RESULTS, CHANGE_FEEDS, DOLIBARR_API_KEY, DOLIBARR_URL, LIFESPAN_HOOKS, MCP_HOST,
+    MCP_PORT, MCP_TRANSPORT, MCP_TRANSPORTS, PAGE_SIZE, REF_INDEX_MAX_ENTRIES, RESOURCE_LISTINGS,
+    UnknownFieldError, WARMUP_PREFETCH, WARMUP_PREFETCH_SIZE, apply_changes, build_ref_filter, cache,
+    cached_get_json, change_watermarks, enable_resource_listing, enable_resource_subscriptions,
+    fetch_all_pages, fetch_page, format_cache_stats, format_rows, format_tms_filter, get_env_bool,
+    get_env_float, get_env_int, get_json, instrument_tool, iter_pages, parse_output_options, parse_tms,
+    parse_watermark, read_changes, resource_json, run_server, select_rows, send_request, server_lifespan,
+    spawn_background
+)
+
+import asyncio
 import logging
 import json
+import base64
+import threading
+import math
+import operator
+import time
+from array import array
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 import httpx
 from mcp.server.fastmcp import FastMCP
+from mcp.types import Resource
 
-# Configure logging to stderr
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    stream=sys.stderr
-)
 logger = logging.getLogger("dolibarr-projects-server")
 
+# Configuration (settings shared with the tasks server are read by dolibarr_common)
+
+# Optional local SQLite mirror (disabled unless DOLIBARR_MIRROR_PATH is set)
+MIRROR_PATH = os.environ.get("DOLIBARR_MIRROR_PATH", "")
+MIRROR_MAX_STALENESS = get_env_float("DOLIBARR_MIRROR_MAX_STALENESS", 600.0)
+MIRROR_SYNC_INTERVAL = max(1.0, get_env_float("DOLIBARR_MIRROR_SYNC_INTERVAL", 120.0))
+MIRROR_FULL_SYNC_INTERVAL = get_env_float("DOLIBARR_MIRROR_FULL_SYNC_INTERVAL", 86400.0)
+MIRROR_DELTA_OVERLAP = get_env_int("DOLIBARR_MIRROR_DELTA_OVERLAP", 3600)
+
+# Largest chunk returned by dolibarr_list_all_projects in cursor mode
+CURSOR_MAX_CHUNK_SIZE = max(1, get_env_int("DOLIBARR_CURSOR_MAX_CHUNK_SIZE", 1000))
+
+# Projects returned by dolibarr_list_all_projects without chunk_size before it
+# stops and returns a cursor for the rest
+LIST_ALL_MAX_PROJECTS = max(1, get_env_int("DOLIBARR_LIST_ALL_MAX_PROJECTS", 5000))
+
+# Project task lists fetched in parallel by dolibarr_portfolio_rollup
+ROLLUP_CONCURRENCY = max(1, get_env_int("DOLIBARR_ROLLUP_CONCURRENCY", 8))
+
+# Project cloning (largest task tree cloned, task creations sent in parallel)
+CLONE_MAX_TASKS = max(1, get_env_int("DOLIBARR_CLONE_MAX_TASKS", 1000))
+CLONE_CONCURRENCY = max(1, get_env_int("DOLIBARR_CLONE_CONCURRENCY", 8))
+
+# Fetch a project's task list in the background after dolibarr_get_project
+PREDICTIVE_PREFETCH = get_env_bool("DOLIBARR_PREDICTIVE_PREFETCH", False)
+
 # Initialize MCP server
-mcp = FastMCP("dolibarr_projects")
+mcp = FastMCP("dolibarr_projects", lifespan=server_lifespan, host=MCP_HOST, port=MCP_PORT)
 
-# Configuration
-DOLIBARR_URL = os.environ.get("DOLIBARR_URL", "")
-DOLIBARR_API_KEY = os.environ.get("DOLIBARR_API_KEY", "")
+# Tools whose reads are scheduled as bulk reads
+BULK_TOOLS.update({"dolibarr_list_all_projects", "dolibarr_portfolio_rollup"})
 
 # === UTILITY FUNCTIONS ===
 
-def get_headers():
-    """Get HTTP headers for Dolibarr API requests."""
-    return {
-        "DOLAPIKEY": DOLIBARR_API_KEY,
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
-
 def get_project_status(fk_statut):
     """Convert project status code to human-readable label."""
     status_map = {
@@ -102,9 +143,545 @@ def format_project_info(project):
 
     return "\n".join(lines)
 
+def format_project_line(project):
+    """Format a project as a single list line."""
+    project_id = project.get('id', 'N/A')
+    project_url = f"{DOLIBARR_URL}/projet/card.php?id={project_id}" if DOLIBARR_URL and project_id != 'N/A' else "N/A"
+
+    # Get status with proper mapping (API returns 'status' or 'statut', not 'fk_statut')
+    status_value = project.get('status') or project.get('statut') or project.get('fk_statut')
+    status_label = get_project_status(status_value) if status_value is not None else 'N/A'
+
+    return f"• {project.get('ref', 'N/A')} - {project.get('title', 'N/A')} (ID: {project_id}) - Status: {status_label} - URL: {project_url}"
+
+def iter_project_lines(projects):
+    """Lazily format projects as list lines, one at a time."""
+    for project in projects:
+        yield format_project_line(project)
+
+# Default fields of the json and tsv outputs
+PROJECT_FIELDS = ("id", "ref", "title", "status")
+TASK_FIELDS = ("id", "ref", "label", "progress")
+CHANGE_PROJECT_FIELDS = ("id", "ref", "title", "status", "tms")
+
+def encode_cursor(page, limit, sortfield, sortorder):
+    """Encode a listing position into an opaque continuation token."""
+    payload = json.dumps({"p": page, "n": limit, "f": sortfield, "o": sortorder}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(token):
+    """
+    Decode a continuation token produced by encode_cursor.
+
+    Returns: (page, limit, sortfield, sortorder)
+
+    Raises: ValueError if the token is malformed
+    """
+    try:
+        padded = token.strip() + "=" * (-len(token.strip()) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        page, limit = int(data["p"]), int(data["n"])
+        sortfield, sortorder = str(data["f"]), str(data["o"]).upper()
+    except (ValueError, KeyError, TypeError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {token}") from e
+    if page < 0 or limit <= 0 or sortorder not in ("ASC", "DESC"):
+        raise ValueError(f"Invalid cursor: {token}")
+    return page, limit, sortfield, sortorder
+
+# === REFERENCE INDEX ===
+
+# ref -> id mappings learned from every object the server sees (LRU bounded)
+ref_index = OrderedDict()
+
+def remember_refs(items):
+    """Record the ref -> id mapping of every object in an API response."""
+    if isinstance(items, dict):
+        items = [items]
+    if not isinstance(items, list):
+        return
+    for item in items:
+        if not isinstance(item, dict) or not item.get('ref') or not item.get('id'):
+            continue
+        try:
+            object_id = int(item.get('id'))
+        except (ValueError, TypeError):
+            continue
+        ref = str(item.get('ref'))
+        ref_index[ref] = object_id
+        ref_index.move_to_end(ref)
+    while len(ref_index) > REF_INDEX_MAX_ENTRIES:
+        ref_index.popitem(last=False)
+
+def forget_ref(object_id):
+    """Drop every ref pointing to an object that no longer exists."""
+    for ref in [ref for ref, known_id in ref_index.items() if known_id == object_id]:
+        del ref_index[ref]
+
+# === LOCAL MIRROR ===
+
+class LocalMirror:
+    """SQLite copy of Dolibarr projects and tasks, kept up to date by delta syncs."""
+
+    # sortfield values the mirror can answer for dolibarr_list_projects
+    SORT_COLUMNS = {"t.rowid": "id", "t.ref": "ref", "t.title": "title", "t.tms": "tms"}
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        # Deferred: only needed when the mirror is enabled
+        import sqlite3
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS projects (
+                id INTEGER PRIMARY KEY, ref TEXT, title TEXT, tms INTEGER, data TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS projects_ref ON projects (ref);
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY, fk_project INTEGER, ref TEXT, tms INTEGER, data TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS tasks_project ON tasks (fk_project);
+            CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value REAL);
+        """)
+        self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def get_state(self, key, default=0):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def is_fresh(self):
+        """True when the last successful sync is within the staleness bound."""
+        return time.time() - self.get_state("last_sync") <= MIRROR_MAX_STALENESS
+
+    def store(self, projects, tasks, full=False, live_ids=None):
+        """
+        Upsert projects and tasks; a full sync replaces the previous contents.
+
+        A delta sync cannot see deleted rows: live_ids, the ("projects",
+        "tasks") id sets listed just before the delta, reconciles them by
+        removing mirrored rows whose id is neither listed nor in the delta.
+        """
+        project_rows = [
+            (int(p['id']), p.get('ref'), p.get('title'), parse_tms(p.get('tms')), json.dumps(p))
+            for p in projects if p.get('id')
+        ]
+        task_rows = [
+            (int(t['id']), int(t.get('fk_project') or 0), t.get('ref'), parse_tms(t.get('tms')), json.dumps(t))
+            for t in tasks if t.get('id')
+        ]
+        watermark = max([row[3] for row in project_rows + task_rows] + [self.get_state("watermark")])
+        now = time.time()
+        with self._lock, self._db:
+            if full:
+                self._db.execute("DELETE FROM projects")
+                self._db.execute("DELETE FROM tasks")
+            elif live_ids is not None:
+                for table, rows, ids in (("projects", project_rows, live_ids[0]), ("tasks", task_rows, live_ids[1])):
+                    keep = ids | {row[0] for row in rows}
+                    gone = [(row[0],) for row in self._db.execute(f"SELECT id FROM {table}") if row[0] not in keep]
+                    self._db.executemany(f"DELETE FROM {table} WHERE id = ?", gone)
+            self._db.executemany("INSERT OR REPLACE INTO projects VALUES (?, ?, ?, ?, ?)", project_rows)
+            self._db.executemany("INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?, ?)", task_rows)
+            states = [("watermark", watermark), ("last_sync", now)]
+            if full:
+                states.append(("last_full_sync", now))
+            self._db.executemany("INSERT OR REPLACE INTO sync_state VALUES (?, ?)", states)
+
+    def upsert_project(self, project):
+        """Write a single project through to the mirror (after an update)."""
+        if not isinstance(project, dict) or not project.get('id'):
+            return
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO projects VALUES (?, ?, ?, ?, ?)",
+                (int(project['id']), project.get('ref'), project.get('title'), parse_tms(project.get('tms')), json.dumps(project))
+            )
+
+    def delete_project(self, project_id):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM projects WHERE id = ?", (project_id,))
+            self._db.execute("DELETE FROM tasks WHERE fk_project = ?", (project_id,))
+
+    def get_project(self, project_id):
+        with self._lock:
+            row = self._db.execute("SELECT data FROM projects WHERE id = ?", (project_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_projects(self, limit, page, sortfield, sortorder):
+        """Return one page of projects, or None if the sort cannot be answered locally."""
+        column = self.SORT_COLUMNS.get(sortfield)
+        if column is None or sortorder.upper() not in ("ASC", "DESC"):
+            return None
+        query = f"SELECT data FROM projects ORDER BY {column} {sortorder.upper()}, id LIMIT ? OFFSET ?"
+        with self._lock:
+            rows = self._db.execute(query, (limit, limit * page)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def find_project_id(self, ref):
+        with self._lock:
+            row = self._db.execute("SELECT id FROM projects WHERE ref = ?", (ref,)).fetchone()
+        return row[0] if row else None
+
+    def get_project_tasks(self, project_id):
+        """Return the project's tasks, or None if the project is not mirrored."""
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM projects WHERE id = ?", (project_id,)).fetchone() is None:
+                return None
+            rows = self._db.execute("SELECT data FROM tasks WHERE fk_project = ? ORDER BY id", (project_id,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def counts(self):
+        with self._lock:
+            projects = self._db.execute("SELECT COUNT(*) FROM projects").fetchone()[0]
+            tasks = self._db.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+        return projects, tasks
+
+# Opened by the server lifespan when DOLIBARR_MIRROR_PATH is set
+mirror = None
+
+def get_fresh_mirror():
+    """Return the mirror if it is enabled and within the staleness bound."""
+    if mirror is not None and mirror.is_fresh():
+        return mirror
+    return None
+
+async def sync_mirror(full=False):
+    """
+    Run one full or delta (t.tms based) sync of projects and tasks into the mirror.
+
+    A delta sync also lists the ids of all projects and tasks (properties=id)
+    so that rows deleted in Dolibarr leave the mirror at once.
+    """
+    params = {"sortfield": "t.rowid", "sortorder": "ASC"}
+    if not full:
+        # Overlap the watermark to absorb clock and timezone skew; upserts are idempotent
+        since = mirror.get_state("watermark") - MIRROR_DELTA_OVERLAP
+        params["sqlfilters"] = f"(t.tms:>=:'{format_tms_filter(since)}')"
+
+    started = time.monotonic()
+    live_ids = None
+    if not full:
+        # Listed before the delta: a row created in between is in the delta and kept
+        id_params = {"sortfield": "t.rowid", "sortorder": "ASC", "properties": "id"}
+        live_ids = tuple([
+            {int(row['id']) for row in await fetch_all_pages(f"{DOLIBARR_URL}/api/index.php/{path}", id_params) if row.get('id')}
+            for path in ("projects", "tasks")
+        ])
+    projects = await fetch_all_pages(f"{DOLIBARR_URL}/api/index.php/projects", params)
+    tasks = await fetch_all_pages(f"{DOLIBARR_URL}/api/index.php/tasks", params)
+    await asyncio.to_thread(mirror.store, projects, tasks, full, live_ids)
+
+    logger.info(f"Mirror {'full' if full else 'delta'} sync: {len(projects)} project(s), {len(tasks)} task(s) in {time.monotonic() - started:.2f}s")
+
+async def mirror_sync_loop():
+    """Keep the mirror up to date: full sync when due, delta syncs in between."""
+    while True:
+        try:
+            full_due = time.time() - mirror.get_state("last_full_sync") >= MIRROR_FULL_SYNC_INTERVAL
+            await sync_mirror(full=full_due)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Mirror sync failed: {e}")
+        await asyncio.sleep(MIRROR_SYNC_INTERVAL)
+
+@asynccontextmanager
+async def mirror_resources():
+    """Open the optional local mirror and keep it synced while the shared resources are open."""
+    global mirror
+    if not (MIRROR_PATH and DOLIBARR_URL and DOLIBARR_API_KEY):
+        yield
+        return
+    mirror = LocalMirror(MIRROR_PATH)
+    sync_task = asyncio.create_task(mirror_sync_loop())
+    logger.info(f"Local mirror enabled: {MIRROR_PATH} (max staleness {MIRROR_MAX_STALENESS:g}s)")
+    try:
+        yield
+    finally:
+        sync_task.cancel()
+        try:
+            await sync_task
+        except asyncio.CancelledError:
+            pass
+        mirror.close()
+        mirror = None
+
+LIFESPAN_HOOKS.append(mirror_resources)
+
+async def fetch_project(project_id):
+    """Get a project from the mirror when fresh, otherwise from the API (through the cache)."""
+    local = get_fresh_mirror()
+    project = local.get_project(project_id) if local else None
+
+    if project is None:
+        project = await cached_get_json(f"{DOLIBARR_URL}/api/index.php/projects/{project_id}")
+
+    remember_refs(project)
+    return project
+
+async def fetch_project_tasks(project_id, includetimespent=0):
+    """Get a project's tasks from the mirror when fresh, otherwise from the API (through the cache)."""
+    # Time spent data is not mirrored, so only plain task lists are served locally
+    local = get_fresh_mirror() if includetimespent == 0 else None
+    tasks = local.get_project_tasks(project_id) if local else None
+
+    if tasks is None:
+        url = f"{DOLIBARR_URL}/api/index.php/projects/{project_id}/tasks"
+        tasks = await cached_get_json(url, {"includetimespent": includetimespent})
+
+    return tasks
+
+# === WARM-UP ===
+
+async def prefetch_projects():
+    """Cache the most recently modified projects and index their refs."""
+    if mirror is not None:
+        return "served by the local mirror"
+    url = f"{DOLIBARR_URL}/api/index.php/projects"
+    projects = await fetch_page(url, {"sortfield": "t.tms", "sortorder": "DESC"}, 0, WARMUP_PREFETCH_SIZE) if WARMUP_PREFETCH_SIZE else []
+    remember_refs(projects)
+    # Oldest first, so the most recent projects are the last evicted
+    for project in reversed(projects):
+        cache.set(f"{url}/{project['id']}", None, project)
+    return f"{len(projects)} project(s)"
+
+def prefetch_project_tasks(project_id):
+    """Fetch a project's task list into the cache in the background - agents usually ask for it next."""
+    # Without the cache the result would be thrown away
+    if not cache.enabled or get_fresh_mirror() is not None:
+        return
+    if cache.has_fresh(f"{DOLIBARR_URL}/api/index.php/projects/{project_id}/tasks", {"includetimespent": 0}):
+        return
+    spawn_background(fetch_project_tasks(project_id))
+
+WARMUP_PREFETCH.append(prefetch_projects)
+
+# === CHANGE FEED ===
+
+def project_changed(project):
+    """Drop cached copies of a project changed in Dolibarr; return the resource URIs it backs."""
+    url = f"{DOLIBARR_URL}/api/index.php/projects/{project.get('id')}"
+    cache.invalidate(url, f"{DOLIBARR_URL}/api/index.php/projects")
+    if mirror is not None:
+        mirror.upsert_project(project)
+    return [f"dolibarr://project/{project.get('id')}"]
+
+CHANGE_FEEDS["projects"] = ("projects", project_changed)
+
+enable_resource_subscriptions(mcp)
+
+# === RESOURCES ===
+
+def project_resource(project):
+    """resources/list entry of a project."""
+    return Resource(
+        uri=f"dolibarr://project/{project.get('id')}",
+        name=str(project.get('ref') or project.get('id')),
+        title=project.get('title'),
+        mimeType="application/json",
+        _meta={"version": str(parse_tms(project.get('tms')))},
+    )
+
+async def read_project_resource(project_id: int) -> str:
+    """Dolibarr project as returned by the API (same source as dolibarr_get_project)."""
+    try:
+        return resource_json(await fetch_project(project_id))
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 404:
+            raise ValueError(f"Project {project_id} not found") from e
+        raise
+
+async def read_project_tasks_resource(project_id: int) -> str:
+    """Tasks of a Dolibarr project as returned by the API (same source as dolibarr_get_project_tasks)."""
+    try:
+        return resource_json(await fetch_project_tasks(project_id) or [])
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 404:
+            return resource_json([])
+        raise
+
+RESOURCE_LISTINGS["projects"] = ("projects", project_resource, remember_refs)
+
+def register_resources(server):
+    """Register the project resource templates on a FastMCP server."""
+    server.resource("dolibarr://project/{project_id}", name="project", title="Dolibarr project",
+                    mime_type="application/json")(read_project_resource)
+    server.resource("dolibarr://project/{project_id}/tasks", name="project_tasks", title="Dolibarr project tasks",
+                    mime_type="application/json")(read_project_tasks_resource)
+
+register_resources(mcp)
+enable_resource_listing(mcp)
+
+# === PORTFOLIO ROLLUP ===
+
+ROLLUP_FIELDS = ("id", "ref", "title", "tasks", "planned_hours", "spent_hours", "spent_ratio", "completion", "budget_amount")
+ROLLUP_SORTS = ("overrun", "spent", "planned", "completion", "budget")
+
+def to_number(value):
+    """Convert an API numeric field (often a string, or null) to float, 0.0 when missing."""
+    try:
+        return float(value) if value not in (None, "") else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+def rollup_portfolio(projects, task_lists):
+    """
+    Compute workload totals of each project from columnar task data.
+
+    task_lists[i] holds the tasks of projects[i]. The task fields are copied
+    once into flat array('d') columns, then each project's totals are
+    C-level sums over its slice of the columns. Completion is the mean task
+    progress weighted by planned workload (plain mean if nothing is planned).
+    Time spent uses timespent_total_duration, or duration_effective when
+    the summary is missing.
+
+    Returns: list of dicts with the ROLLUP_FIELDS keys
+    """
+    tasks = [task for task_list in task_lists for task in task_list]
+    planned = array("d", [to_number(task.get("planned_workload")) for task in tasks])
+    spent = array("d", [to_number(task.get("timespent_total_duration", task.get("duration_effective"))) for task in tasks])
+    progress = array("d", [to_number(task.get("progress")) for task in tasks])
+    weighted = array("d", map(operator.mul, planned, progress))
+
+    rows = []
+    start = 0
+    for project, task_list in zip(projects, task_lists):
+        end = start + len(task_list)
+        planned_total = math.fsum(planned[start:end])
+        spent_total = math.fsum(spent[start:end])
+        if planned_total:
+            completion = math.fsum(weighted[start:end]) / planned_total
+        else:
+            completion = math.fsum(progress[start:end]) / len(task_list) if task_list else 0.0
+        rows.append({
+            "id": project.get("id"),
+            "ref": project.get("ref"),
+            "title": project.get("title"),
+            "tasks": len(task_list),
+            "planned_hours": round(planned_total / 3600, 2),
+            "spent_hours": round(spent_total / 3600, 2),
+            "spent_ratio": round(spent_total / planned_total, 3) if planned_total else None,
+            "completion": round(completion, 1),
+            "budget_amount": to_number(project.get("budget_amount")),
+        })
+        start = end
+    return rows
+
+def rank_rollup(rows, sort_by):
+    """Sort rollup rows in place, largest first (projects without planned workload last for 'overrun')."""
+    if sort_by == "overrun":
+        rows.sort(key=lambda row: (row["spent_ratio"] is None, -(row["spent_ratio"] or 0), -row["spent_hours"]))
+    else:
+        column = {"spent": "spent_hours", "planned": "planned_hours", "completion": "completion", "budget": "budget_amount"}[sort_by]
+        rows.sort(key=lambda row: row[column], reverse=True)
+    return rows
+
+def format_rollup_line(rank, row):
+    """Format a rollup row as a single ranked line."""
+    ratio = f" ({row['spent_ratio'] * 100:.0f}% of planned)" if row["spent_ratio"] is not None else ""
+    return (f"{rank}. {row['ref']} - {row['title']} (ID: {row['id']}) - {row['tasks']} task(s) - "
+            f"Planned: {row['planned_hours']:.2f} h - Spent: {row['spent_hours']:.2f} h{ratio} - "
+            f"Completion: {row['completion']:.0f}% - Budget: {row['budget_amount']:.2f}")
+
+# === PROJECT CLONING ===
+
+# Fields copied from the source project and from each source task
+CLONE_PROJECT_FIELDS = ("description", "socid", "public", "budget_amount", "date_start", "date_end", "note_public", "note_private")
+CLONE_TASK_FIELDS = ("label", "description", "planned_workload", "priority", "budget_amount", "date_start", "date_end",
+                     "note_public", "note_private")
+CLONE_DATE_FIELDS = ("date_start", "date_end")
+
+def clone_payload(source, fields, date_offset):
+    """Copy the set fields of a source object, shifting its dates by date_offset seconds."""
+    payload = {}
+    for field in fields:
+        value = source.get(field)
+        if value in (None, ""):
+            continue
+        if field in CLONE_DATE_FIELDS:
+            try:
+                value = int(float(value)) + date_offset
+            except (TypeError, ValueError):
+                continue
+        payload[field] = value
+    return payload
+
+def plan_clone_levels(tasks):
+    """
+    Split tasks into levels of the fk_task_parent hierarchy.
+
+    Level 0 holds the tasks without a parent in the list; level n the
+    children of level n-1, so each level only needs the IDs created by the
+    previous ones. Tasks caught in a parent cycle are put at level 0.
+
+    Returns: (list of levels, each a list of tasks in source order; number of tasks in a cycle)
+    """
+    by_id = {str(task.get("id")): task for task in tasks}
+    children = {}
+    level = []
+    for task in by_id.values():
+        parent = str(task.get("fk_task_parent") or 0)
+        if parent in by_id and parent != str(task.get("id")):
+            children.setdefault(parent, []).append(task)
+        else:
+            level.append(task)
+
+    levels = []
+    placed = 0
+    while level:
+        levels.append(level)
+        placed += len(level)
+        level = [child for task in level for child in children.get(str(task.get("id")), [])]
+
+    cycles = len(by_id) - placed
+    if cycles:
+        reached = {str(task.get("id")) for level in levels for task in level}
+        stranded = [task for task in by_id.values() if str(task.get("id")) not in reached]
+        # Clone the cycle members flat rather than dropping them
+        for task in stranded:
+            task["fk_task_parent"] = "0"
+        if levels:
+            levels[0].extend(stranded)
+        else:
+            levels.append(stranded)
+    return levels, cycles
+
+def describe_http_error(e):
+    """Short description of a failed request, for per-object error lists."""
+    if isinstance(e, httpx.HTTPStatusError):
+        if e.response.status_code == 401:
+            return "authentication failed or insufficient permissions"
+        return f"API error {e.response.status_code} - {e.response.text}"
+    return str(e) or type(e).__name__
+
+async def create_object(path, payload):
+    """POST a new Dolibarr object and return its ID."""
+    response = await send_request("POST", f"{DOLIBARR_URL}/api/index.php/{path}", json=payload, operation="write")
+    response.raise_for_status()
+    return response.json()
+
+async def delete_objects(path, object_ids, semaphore):
+    """Delete objects concurrently; returns the IDs that could not be deleted."""
+    async def delete_one(object_id):
+        async with semaphore:
+            try:
+                response = await send_request("DELETE", f"{DOLIBARR_URL}/api/index.php/{path}/{object_id}", operation="write")
+                if response.status_code != 404:
+                    response.raise_for_status()
+                return None
+            except Exception as e:
+                logger.error(f"Rollback: could not delete {path}/{object_id}: {e}")
+                return object_id
+
+    return [object_id for object_id in await asyncio.gather(*(delete_one(object_id) for object_id in object_ids)) if object_id is not None]
+
 # === MCP TOOLS ===
 
 @mcp.tool()
+@instrument_tool
 async def dolibarr_get_project(project_id: int) -> str:
     """Get details of a specific Dolibarr project by ID."""
     logger.info(f"Fetching project with ID: {project_id}")
@@ -116,13 +693,11 @@ async def dolibarr_get_project(project_id: int) -> str:
         return "❌ Error: DOLIBARR_URL and DOLIBARR_API_KEY must be configured"
 
     try:
-        async with httpx.AsyncClient() as client:
-            url = f"{DOLIBARR_URL}/api/index.php/projects/{project_id}"
-            response = await client.get(url, headers=get_headers(), timeout=10)
-            response.raise_for_status()
-            project = response.json()
+        project = await fetch_project(project_id)
+        if PREDICTIVE_PREFETCH:
+            prefetch_project_tasks(project_id)
 
-            return f"✅ Project Retrieved:\n\n{format_project_info(project)}"
+        return f"✅ Project Retrieved:\n\n{format_project_info(project)}"
 
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 404:
@@ -136,6 +711,7 @@ async def dolibarr_get_project(project_id: int) -> str:
         return f"❌ Error: {str(e)}"
 
 @mcp.tool()
+@instrument_tool
 async def dolibarr_get_project_by_ref(ref: str = "") -> str:
     """Get a Dolibarr project by its reference code."""
     logger.info(f"Fetching project with reference: {ref}")
@@ -146,25 +722,40 @@ async def dolibarr_get_project_by_ref(ref: str = "") -> str:
     if not DOLIBARR_URL or not DOLIBARR_API_KEY:
         return "❌ Error: DOLIBARR_URL and DOLIBARR_API_KEY must be configured"
 
+    ref = ref.strip()
+
     try:
-        # Build SQL filter to search by reference
-        sql_filter = f"(t.ref:=:'{ref.strip()}')"
+        project = None
 
-        async with httpx.AsyncClient() as client:
+        # Resolve the ref locally first and use the cheap /projects/{id} endpoint
+        local = get_fresh_mirror()
+        project_id = ref_index.get(ref) or (local.find_project_id(ref) if local else None)
+        if project_id:
+            try:
+                project = await fetch_project(project_id)
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code != 404:
+                    raise
+                forget_ref(project_id)
+            if project is not None and project.get('ref') != ref:
+                # The ref was changed since it was indexed
+                project = None
+                ref_index.pop(ref, None)
+
+        if project is None:
+            # Index miss: fall back to a filtered list query
             url = f"{DOLIBARR_URL}/api/index.php/projects"
-            params = {"sqlfilters": sql_filter}
-            response = await client.get(url, headers=get_headers(), params=params, timeout=10)
-            response.raise_for_status()
-            projects = response.json()
+            params = {"sqlfilters": build_ref_filter(ref)}
+            projects = await cached_get_json(url, params)
+            remember_refs(projects)
 
-            # Check if a project was found
-            if not projects or len(projects) == 0:
+            # Reference is unique; the filter may over-match, so compare exactly
+            matches = [p for p in projects or [] if p.get('ref') == ref]
+            if not matches:
                 return f"❌ Error: Project with reference '{ref}' not found"
+            project = matches[0]
 
-            # Get first project (reference is unique)
-            project = projects[0]
-
-            return f"✅ Project Retrieved:\n\n{format_project_info(project)}"
+        return f"✅ Project Retrieved:\n\n{format_project_info(project)}"
 
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 404:
@@ -173,58 +764,65 @@ async def dolibarr_get_project_by_ref(ref: str = "") -> str:
             return "❌ Error: Authentication failed or insufficient permissions"
         else:
             return f"❌ API Error: {e.response.status_code} - {e.response.text}"
+    except ValueError as e:
+        return f"❌ Error: {str(e)}"
     except Exception as e:
         logger.error(f"Error fetching project by reference: {e}")
         return f"❌ Error: {str(e)}"
 
 @mcp.tool()
-async def dolibarr_list_projects(limit: str = "100", page: str = "0", sortfield: str = "t.rowid", sortorder: str = "ASC") -> str:
-    """List Dolibarr projects with optional pagination and sorting."""
+@instrument_tool
+async def dolibarr_list_projects(limit: str = "100", page: str = "0", sortfield: str = "t.rowid", sortorder: str = "ASC", output_format: str = "text", fields: str = "") -> str:
+    """List Dolibarr projects with optional pagination and sorting - output_format 'json' or 'tsv' returns only the comma-separated fields (default id,ref,title,status)."""
     logger.info(f"Listing projects: limit={limit}, page={page}")
 
     if not DOLIBARR_URL or not DOLIBARR_API_KEY:
         return "❌ Error: DOLIBARR_URL and DOLIBARR_API_KEY must be configured"
 
+    try:
+        output_format, fields = parse_output_options(output_format, fields, PROJECT_FIELDS)
+    except ValueError as e:
+        return f"❌ Error: {str(e)}"
+
     try:
         limit_int = int(limit) if limit.strip() else 100
         page_int = int(page) if page.strip() else 0
 
-        async with httpx.AsyncClient() as client:
-            url = f"{DOLIBARR_URL}/api/index.php/projects"
-            params = {
-                "limit": limit_int,
-                "page": page_int,
-                "sortfield": sortfield if sortfield.strip() else "t.rowid",
-                "sortorder": sortorder if sortorder.strip() else "ASC"
-            }
+        params = {
+            "limit": limit_int,
+            "page": page_int,
+            "sortfield": sortfield if sortfield.strip() else "t.rowid",
+            "sortorder": sortorder if sortorder.strip() else "ASC"
+        }
 
-            response = await client.get(url, headers=get_headers(), params=params, timeout=10)
-            response.raise_for_status()
-            projects = response.json()
+        local = get_fresh_mirror()
+        projects = local.list_projects(limit_int, page_int, params["sortfield"], params["sortorder"]) if local else None
 
-            if not projects:
-                return "📊 No projects found"
+        if projects is None:
+            url = f"{DOLIBARR_URL}/api/index.php/projects"
+            projects = await get_json(url, params)
+            remember_refs(projects)
 
-            result_lines = [f"✅ Found {len(projects)} project(s):\n"]
-            for project in projects:
-                project_id = project.get('id', 'N/A')
-                project_url = f"{DOLIBARR_URL}/projet/card.php?id={project_id}" if DOLIBARR_URL and project_id != 'N/A' else "N/A"
+        if output_format != "text":
+            return format_rows(select_rows(projects or [], fields), fields, output_format)
 
-                # Get status with proper mapping (API returns 'status' or 'statut', not 'fk_statut')
-                status_value = project.get('status') or project.get('statut') or project.get('fk_statut')
-                status_label = get_project_status(status_value) if status_value is not None else 'N/A'
+        if not projects:
+            return "📊 No projects found"
 
-                result_lines.append(f"• {project.get('ref', 'N/A')} - {project.get('title', 'N/A')} (ID: {project_id}) - Status: {status_label} - URL: {project_url}")
+        result_lines = [f"✅ Found {len(projects)} project(s):\n"]
+        result_lines.extend(iter_project_lines(projects))
 
-            return "\n".join(result_lines)
+        return "\n".join(result_lines)
 
+    except UnknownFieldError as e:
+        return f"❌ Error: {str(e)}"
     except ValueError as e:
         return f"❌ Error: Invalid number format - {str(e)}"
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 401:
             return "❌ Error: Authentication failed or insufficient permissions"
         elif e.response.status_code == 404:
-            return "📊 No projects found"
+            return format_rows([], fields, output_format) if output_format != "text" else "📊 No projects found"
         else:
             return f"❌ API Error: {e.response.status_code} - {e.response.text}"
     except Exception as e:
@@ -232,65 +830,104 @@ async def dolibarr_list_projects(limit: str = "100", page: str = "0", sortfield:
         return f"❌ Error: {str(e)}"
 
 @mcp.tool()
-async def dolibarr_list_all_projects(sortfield: str = "t.rowid", sortorder: str = "ASC") -> str:
-    """List ALL Dolibarr projects with automatic pagination."""
+@instrument_tool
+async def dolibarr_list_all_projects(sortfield: str = "t.rowid", sortorder: str = "ASC", cursor: str = "", chunk_size: str = "", output_format: str = "text", fields: str = "") -> str:
+    """List ALL Dolibarr projects with automatic pagination - pass chunk_size (and then the returned cursor) to stream the list in bounded chunks; without chunk_size the list stops after DOLIBARR_LIST_ALL_MAX_PROJECTS projects (default 5000) with a cursor for the rest; output_format 'json' or 'tsv' returns only the comma-separated fields (default id,ref,title,status)."""
     logger.info(f"Listing all projects with automatic pagination")
 
     if not DOLIBARR_URL or not DOLIBARR_API_KEY:
         return "❌ Error: DOLIBARR_URL and DOLIBARR_API_KEY must be configured"
 
-    all_projects = []
-    page = 0
-    limit = 100
+    try:
+        output_format, fields = parse_output_options(output_format, fields, PROJECT_FIELDS)
+    except ValueError as e:
+        return f"❌ Error: {str(e)}"
+
+    # Checked before it can be encoded into a cursor
+    sortorder = sortorder.strip().upper() or "ASC"
+    if sortorder not in ("ASC", "DESC"):
+        return "❌ Error: sortorder must be ASC or DESC"
+
+    url = f"{DOLIBARR_URL}/api/index.php/projects"
 
     try:
-        async with httpx.AsyncClient() as client:
-            while True:
-                # Fetch one page
-                url = f"{DOLIBARR_URL}/api/index.php/projects"
-                params = {
-                    "sortfield": sortfield if sortfield.strip() else "t.rowid",
-                    "sortorder": sortorder if sortorder.strip() else "ASC",
-                    "limit": limit,
-                    "page": page
-                }
-
-                response = await client.get(url, headers=get_headers(), params=params, timeout=30)
-                response.raise_for_status()
-                projects = response.json()
-
-                # If no projects, stop
-                if not projects or len(projects) == 0:
-                    break
-
-                # Add projects to complete list
-                all_projects.extend(projects)
-
-                # If less than limit projects, it's the last page
-                if len(projects) < limit:
-                    break
-
-                # Move to next page
-                page += 1
+        # Cursor mode: return one bounded chunk plus a continuation token
+        if cursor.strip() or chunk_size.strip():
+            if cursor.strip():
+                try:
+                    page, limit, sortfield, sortorder = decode_cursor(cursor)
+                except ValueError as e:
+                    return f"❌ Error: {str(e)}"
+            else:
+                page = 0
+                limit = int(chunk_size)
+                sortfield = sortfield.strip() or "t.rowid"
+            if not 1 <= limit <= CURSOR_MAX_CHUNK_SIZE:
+                return f"❌ Error: chunk_size must be between 1 and {CURSOR_MAX_CHUNK_SIZE}"
+
+            params = {"sortfield": sortfield, "sortorder": sortorder}
+            projects = await fetch_page(url, params, page, limit)
+            remember_refs(projects)
+
+            if output_format != "text":
+                next_cursor = encode_cursor(page + 1, limit, sortfield, sortorder) if len(projects) == limit else None
+                return format_rows(select_rows(projects, fields), fields, output_format, cursor=next_cursor)
 
-        # Check if we found any projects
-        if not all_projects:
-            return "📊 No projects found"
+            if not projects:
+                return "📊 No projects found" if page == 0 else "📊 No more projects"
 
-        # Format output
-        result_lines = [f"✅ Found {len(all_projects)} project(s) (all pages):\n"]
-        for project in all_projects:
-            project_id = project.get('id', 'N/A')
-            project_url = f"{DOLIBARR_URL}/projet/card.php?id={project_id}" if DOLIBARR_URL and project_id != 'N/A' else "N/A"
+            first = page * limit + 1
+            result_lines = [f"✅ Projects {first}-{first + len(projects) - 1} (chunk {page + 1}):\n"]
+            result_lines.extend(iter_project_lines(projects))
 
-            # Get status with proper mapping
-            status_value = project.get('status') or project.get('statut') or project.get('fk_statut')
-            status_label = get_project_status(status_value) if status_value is not None else 'N/A'
+            if len(projects) < limit:
+                result_lines.append("\n🏁 End of list reached")
+            else:
+                next_cursor = encode_cursor(page + 1, limit, sortfield, sortorder)
+                result_lines.append(f"\n➡️ More projects available - call again with cursor='{next_cursor}'")
 
-            result_lines.append(f"• {project.get('ref', 'N/A')} - {project.get('title', 'N/A')} (ID: {project_id}) - Status: {status_label} - URL: {project_url}")
+            return "\n".join(result_lines)
 
-        return "\n".join(result_lines)
+        # Full mode: format each page as it arrives instead of buffering raw
+        # projects, and stop with a cursor past LIST_ALL_MAX_PROJECTS
+        params = {
+            "sortfield": sortfield if sortfield.strip() else "t.rowid",
+            "sortorder": sortorder
+        }
+        limit = min(PAGE_SIZE, CURSOR_MAX_CHUNK_SIZE)
+        rows = []
+        pages = 0
+        next_cursor = None
+        async for projects in iter_pages(url, params, limit):
+            remember_refs(projects)
+            if output_format != "text":
+                rows.extend(select_rows(projects, fields))
+            else:
+                rows.extend(iter_project_lines(projects))
+            pages += 1
+            if len(rows) >= LIST_ALL_MAX_PROJECTS and len(projects) == limit:
+                next_cursor = encode_cursor(pages, limit, params["sortfield"], sortorder)
+                break
+
+        if output_format != "text":
+            return format_rows(rows, fields, output_format, cursor=next_cursor)
+
+        project_lines = rows
 
+        # Check if we found any projects
+        if not project_lines:
+            return "📊 No projects found"
+
+        if next_cursor is not None:
+            return (f"✅ First {len(project_lines)} project(s) (list capped at {LIST_ALL_MAX_PROJECTS}):\n\n" + "\n".join(project_lines)
+                    + f"\n\n➡️ More projects available - call again with cursor='{next_cursor}'")
+
+        return f"✅ Found {len(project_lines)} project(s) (all pages):\n\n" + "\n".join(project_lines)
+
+    except UnknownFieldError as e:
+        return f"❌ Error: {str(e)}"
+    except ValueError as e:
+        return f"❌ Error: Invalid number format - {str(e)}"
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 401:
             return "❌ Error: Authentication failed or insufficient permissions"
@@ -301,6 +938,7 @@ async def dolibarr_list_all_projects(sortfield: str = "t.rowid", sortorder: str
         return f"❌ Error: {str(e)}"
 
 @mcp.tool()
+@instrument_tool
 async def dolibarr_create_project(ref: str = "", title: str = "", description: str = "", fk_soc: str = "", budget_amount: str = "") -> str:
     """Create a new Dolibarr project with required ref and title."""
     logger.info(f"Creating project: {ref} - {title}")
@@ -335,16 +973,16 @@ async def dolibarr_create_project(ref: str = "", title: str = "", description: s
             except ValueError:
                 return f"❌ Error: budget_amount must be a valid number, got: {budget_amount}"
 
-        async with httpx.AsyncClient() as client:
-            url = f"{DOLIBARR_URL}/api/index.php/projects"
-            response = await client.post(url, headers=get_headers(), json=project_data, timeout=10)
-            response.raise_for_status()
-            project_id = response.json()
+        url = f"{DOLIBARR_URL}/api/index.php/projects"
+        response = await send_request("POST", url, json=project_data, operation="write")
+        response.raise_for_status()
+        project_id = response.json()
+        remember_refs({"id": project_id, "ref": project_data["ref"]})
 
-            # Build URL to the created project
-            project_url = f"{DOLIBARR_URL}/projet/card.php?id={project_id}" if DOLIBARR_URL else "N/A"
+        # Build URL to the created project
+        project_url = f"{DOLIBARR_URL}/projet/card.php?id={project_id}" if DOLIBARR_URL else "N/A"
 
-            return f"✅ Project Created Successfully!\n\n   Project ID: {project_id}\n   Reference: {ref}\n   Title: {title}\n   URL: {project_url}"
+        return f"✅ Project Created Successfully!\n\n   Project ID: {project_id}\n   Reference: {ref}\n   Title: {title}\n   URL: {project_url}"
 
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 401:
@@ -358,6 +996,128 @@ async def dolibarr_create_project(ref: str = "", title: str = "", description: s
         return f"❌ Error: {str(e)}"
 
 @mcp.tool()
+@instrument_tool
+async def dolibarr_clone_project(source_project_id: int, ref: str = "", title: str = "", date_offset_days: str = "") -> str:
+    """Clone a Dolibarr project and its task tree under a new ref - tasks are created level by level (each level concurrently), get refs '<ref>-001', '<ref>-002'... and start at 0% progress. date_offset_days shifts every date_start/date_end. Everything created is deleted again if a step fails."""
+    logger.info(f"Cloning project {source_project_id} as {ref}")
+
+    if not source_project_id or source_project_id <= 0:
+        return "❌ Error: source_project_id is required and must be a positive integer"
+
+    if not ref.strip():
+        return "❌ Error: ref (reference of the new project) is required"
+
+    date_offset = 0
+    if date_offset_days.strip():
+        try:
+            date_offset = int(date_offset_days) * 86400
+        except ValueError:
+            return f"❌ Error: date_offset_days must be a whole number of days, got: {date_offset_days}"
+
+    if not DOLIBARR_URL or not DOLIBARR_API_KEY:
+        return "❌ Error: DOLIBARR_URL and DOLIBARR_API_KEY must be configured"
+
+    try:
+        source, tasks = await asyncio.gather(fetch_project(source_project_id), fetch_project_tasks(source_project_id))
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 404:
+            return f"❌ Error: Project {source_project_id} not found"
+        elif e.response.status_code == 401:
+            return "❌ Error: Authentication failed or insufficient permissions"
+        else:
+            return f"❌ API Error: {e.response.status_code} - {e.response.text}"
+    except Exception as e:
+        logger.error(f"Error reading project to clone: {e}")
+        return f"❌ Error: {str(e)}"
+
+    tasks = sorted(tasks or [], key=lambda task: int(task.get("id") or 0))
+    if len(tasks) > CLONE_MAX_TASKS:
+        return f"❌ Error: project {source_project_id} has {len(tasks)} tasks, at most {CLONE_MAX_TASKS} can be cloned in one call"
+
+    project_data = clone_payload(source, CLONE_PROJECT_FIELDS, date_offset)
+    project_data["ref"] = ref.strip()
+    project_data["title"] = title.strip() or source.get("title") or ref.strip()
+
+    # Copy the parent list, since plan_clone_levels() rewrites fk_task_parent of cycle members
+    levels, cycles = plan_clone_levels([dict(task) for task in tasks])
+    width = max(3, len(str(len(tasks))))
+    task_refs = {str(task.get("id")): f"{project_data['ref']}-{n:0{width}d}" for n, task in enumerate(tasks, start=1)}
+
+    semaphore = asyncio.Semaphore(CLONE_CONCURRENCY)
+    project_id = None
+    created = []  # one list of new task IDs per level
+    id_map = {}
+
+    async def create_task(task):
+        payload = clone_payload(task, CLONE_TASK_FIELDS, date_offset)
+        payload["ref"] = task_refs[str(task.get("id"))]
+        payload.setdefault("label", payload["ref"])
+        payload["fk_project"] = project_id
+        parent = str(task.get("fk_task_parent") or 0)
+        if parent in id_map:
+            payload["fk_task_parent"] = id_map[parent]
+        async with semaphore:
+            return await create_object("tasks", payload)
+
+    failure = None
+    try:
+        project_id = await create_object("projects", project_data)
+        for level in levels:
+            results = await asyncio.gather(*(create_task(task) for task in level), return_exceptions=True)
+            created.append([new_id for new_id in results if not isinstance(new_id, BaseException)])
+            errors = [(task, result) for task, result in zip(level, results) if isinstance(result, BaseException)]
+            if errors:
+                task, error = errors[0]
+                failure = f"task {task.get('ref', 'N/A')} (ID: {task.get('id')}) - {describe_http_error(error)}"
+                if len(errors) > 1:
+                    failure += f" (and {len(errors) - 1} more)"
+                break
+            id_map.update((str(task.get("id")), new_id) for task, new_id in zip(level, results))
+    except Exception as e:
+        logger.error(f"Error cloning project {source_project_id}: {e}")
+        failure = f"project {project_data['ref']} - {describe_http_error(e)}"
+
+    if failure is not None:
+        lines = [f"❌ Error: cloning project {source_project_id} failed at {failure}"]
+        if project_id is None:
+            return lines[0]
+        # Roll back: deepest tasks first, so no parent is deleted before its children
+        leftover = []
+        for level_ids in reversed(created):
+            leftover.extend(await delete_objects("tasks", level_ids, semaphore))
+        leftover_project = await delete_objects("projects", [project_id], semaphore)
+        cache.invalidate(f"{DOLIBARR_URL}/api/index.php/projects", f"{DOLIBARR_URL}/api/index.php/projects/{project_id}/tasks")
+        created_count = sum(len(level_ids) for level_ids in created)
+        if leftover or leftover_project:
+            lines.append(f"⚠️ Rollback incomplete - delete these by hand: project {project_id}" if leftover_project else "⚠️ Rollback incomplete - delete these by hand:")
+            if leftover:
+                lines.append(f"   Tasks: {', '.join(map(str, leftover))}")
+        else:
+            lines.append(f"↩️ Rolled back: project {project_id} and {created_count} task(s) deleted")
+        return "\n".join(lines)
+
+    cache.invalidate(f"{DOLIBARR_URL}/api/index.php/projects")
+    remember_refs({"id": project_id, "ref": project_data["ref"]})
+
+    project_url = f"{DOLIBARR_URL}/projet/card.php?id={project_id}"
+    lines = [
+        "✅ Project Cloned Successfully!",
+        "",
+        f"   Project ID: {project_id}",
+        f"   Reference: {project_data['ref']}",
+        f"   Title: {project_data['title']}",
+        f"   Source: {source.get('ref', 'N/A')} (ID: {source_project_id})",
+        f"   Tasks: {len(id_map)} created in {len(levels)} level(s)",
+    ]
+    if date_offset:
+        lines.append(f"   Dates shifted by: {date_offset // 86400:+d} day(s)")
+    if cycles:
+        lines.append(f"   ⚠️ {cycles} task(s) in a parent cycle were cloned without a parent")
+    lines.append(f"   URL: {project_url}")
+    return "\n".join(lines)
+
+@mcp.tool()
+@instrument_tool
 async def dolibarr_update_project(project_id: int, title: str = "", description: str = "", budget_amount: str = "") -> str:
     """Update an existing Dolibarr project by ID."""
     logger.info(f"Updating project: {project_id}")
@@ -386,13 +1146,19 @@ async def dolibarr_update_project(project_id: int, title: str = "", description:
         return "❌ Error: At least one field to update must be provided (title, description, or budget_amount)"
 
     try:
-        async with httpx.AsyncClient() as client:
-            url = f"{DOLIBARR_URL}/api/index.php/projects/{project_id}"
-            response = await client.put(url, headers=get_headers(), json=update_data, timeout=10)
-            response.raise_for_status()
-            updated_project = response.json()
+        url = f"{DOLIBARR_URL}/api/index.php/projects/{project_id}"
+        response = await send_request("PUT", url, json=update_data, operation="write")
+        response.raise_for_status()
+        updated_project = response.json()
+
+        # Write-through: refresh the cached project, drop cached ref lookups
+        cache.invalidate(f"{DOLIBARR_URL}/api/index.php/projects")
+        cache.set(url, None, updated_project)
+        remember_refs(updated_project)
+        if mirror is not None:
+            mirror.upsert_project(updated_project)
 
-            return f"✅ Project Updated Successfully:\n\n{format_project_info(updated_project)}"
+        return f"✅ Project Updated Successfully:\n\n{format_project_info(updated_project)}"
 
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 404:
@@ -406,6 +1172,7 @@ async def dolibarr_update_project(project_id: int, title: str = "", description:
         return f"❌ Error: {str(e)}"
 
 @mcp.tool()
+@instrument_tool
 async def dolibarr_delete_project(project_id: int, confirm: str = "") -> str:
     """Delete a Dolibarr project by ID (requires confirm='yes' for safety)."""
     logger.info(f"Deleting project: {project_id}")
@@ -425,13 +1192,17 @@ async def dolibarr_delete_project(project_id: int, confirm: str = "") -> str:
         )
 
     try:
-        async with httpx.AsyncClient() as client:
-            url = f"{DOLIBARR_URL}/api/index.php/projects/{project_id}"
-            response = await client.delete(url, headers=get_headers(), timeout=10)
-            response.raise_for_status()
-            result = response.json()
+        url = f"{DOLIBARR_URL}/api/index.php/projects/{project_id}"
+        response = await send_request("DELETE", url, operation="write")
+        response.raise_for_status()
+        result = response.json()
 
-            return f"✅ Project {project_id} deleted successfully"
+        cache.invalidate(url, f"{url}/tasks", f"{DOLIBARR_URL}/api/index.php/projects")
+        forget_ref(project_id)
+        if mirror is not None:
+            mirror.delete_project(project_id)
+
+        return f"✅ Project {project_id} deleted successfully"
 
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 404:
@@ -445,8 +1216,9 @@ async def dolibarr_delete_project(project_id: int, confirm: str = "") -> str:
         return f"❌ Error: {str(e)}"
 
 @mcp.tool()
-async def dolibarr_get_project_tasks(project_id: int, includetimespent: int = 0) -> str:
-    """Get all tasks for a specific Dolibarr project."""
+@instrument_tool
+async def dolibarr_get_project_tasks(project_id: int, includetimespent: int = 0, output_format: str = "text", fields: str = "") -> str:
+    """Get all tasks for a specific Dolibarr project - output_format 'json' or 'tsv' returns only the comma-separated fields (default id,ref,label,progress)."""
     logger.info(f"Fetching tasks for project: {project_id}")
 
     if not project_id or project_id <= 0:
@@ -455,34 +1227,38 @@ async def dolibarr_get_project_tasks(project_id: int, includetimespent: int = 0)
     if not DOLIBARR_URL or not DOLIBARR_API_KEY:
         return "❌ Error: DOLIBARR_URL and DOLIBARR_API_KEY must be configured"
 
+    try:
+        output_format, fields = parse_output_options(output_format, fields, TASK_FIELDS)
+    except ValueError as e:
+        return f"❌ Error: {str(e)}"
+
     try:
         # includetimespent is already an int from the parameter type
         if includetimespent not in [0, 1, 2]:
             return "❌ Error: includetimespent must be 0, 1, or 2"
 
-        async with httpx.AsyncClient() as client:
-            url = f"{DOLIBARR_URL}/api/index.php/projects/{project_id}/tasks"
-            params = {"includetimespent": includetimespent}
+        tasks = await fetch_project_tasks(project_id, includetimespent)
 
-            response = await client.get(url, headers=get_headers(), params=params, timeout=10)
-            response.raise_for_status()
-            tasks = response.json()
+        if output_format != "text":
+            return format_rows(select_rows(tasks or [], fields), fields, output_format)
 
-            if not tasks:
-                return f"📊 No tasks found for project {project_id}"
+        if not tasks:
+            return f"📊 No tasks found for project {project_id}"
 
-            result_lines = [f"✅ Found {len(tasks)} task(s) for project {project_id}:\n"]
-            for task in tasks:
-                task_id = task.get('id', 'N/A')
-                task_url = f"{DOLIBARR_URL}/projet/tasks/task.php?id={task_id}" if DOLIBARR_URL and task_id != 'N/A' else "N/A"
-                task_line = f"• {task.get('ref', 'N/A')} - {task.get('label', 'N/A')} (ID: {task_id})"
-                if task.get('progress'):
-                    task_line += f" - Progress: {task.get('progress')}%"
-                task_line += f" - URL: {task_url}"
-                result_lines.append(task_line)
+        result_lines = [f"✅ Found {len(tasks)} task(s) for project {project_id}:\n"]
+        for task in tasks:
+            task_id = task.get('id', 'N/A')
+            task_url = f"{DOLIBARR_URL}/projet/tasks/task.php?id={task_id}" if DOLIBARR_URL and task_id != 'N/A' else "N/A"
+            task_line = f"• {task.get('ref', 'N/A')} - {task.get('label', 'N/A')} (ID: {task_id})"
+            if task.get('progress'):
+                task_line += f" - Progress: {task.get('progress')}%"
+            task_line += f" - URL: {task_url}"
+            result_lines.append(task_line)
 
-            return "\n".join(result_lines)
+        return "\n".join(result_lines)
 
+    except UnknownFieldError as e:
+        return f"❌ Error: {str(e)}"
     except ValueError as e:
         return f"❌ Error: Invalid number format - {str(e)}"
     except httpx.HTTPStatusError as e:
@@ -496,7 +1272,185 @@ async def dolibarr_get_project_tasks(project_id: int, includetimespent: int = 0)
         logger.error(f"Error fetching tasks: {e}")
         return f"❌ Error: {str(e)}"
 
+@mcp.tool()
+@instrument_tool
+async def dolibarr_portfolio_rollup(status: str = "", sort_by: str = "overrun", limit: str = "50", output_format: str = "text", fields: str = "") -> str:
+    """Rank all projects by planned vs. spent workload - per-project planned hours, time spent, progress-weighted completion and budget, from every project's tasks fetched concurrently; sort_by overrun (spent/planned), spent, planned, completion or budget; status filters projects (0 draft, 1 open, 2 closed)."""
+    logger.info(f"Computing portfolio rollup sorted by {sort_by}")
+
+    if not DOLIBARR_URL or not DOLIBARR_API_KEY:
+        return "❌ Error: DOLIBARR_URL and DOLIBARR_API_KEY must be configured"
+
+    sort_by = sort_by.strip().lower() or "overrun"
+    if sort_by not in ROLLUP_SORTS:
+        return f"❌ Error: sort_by must be one of: {', '.join(ROLLUP_SORTS)}"
+
+    try:
+        output_format, fields = parse_output_options(output_format, fields, ROLLUP_FIELDS)
+        limit_int = int(limit) if limit.strip() else 50
+        params = {"sortfield": "t.rowid", "sortorder": "ASC"}
+        if status.strip():
+            params["sqlfilters"] = f"(t.fk_statut:=:{int(status)})"
+    except ValueError as e:
+        return f"❌ Error: {str(e)}"
+
+    if limit_int <= 0:
+        return "❌ Error: limit must be a positive integer"
+
+    try:
+        projects = await fetch_all_pages(f"{DOLIBARR_URL}/api/index.php/projects", params)
+        remember_refs(projects)
+        if not projects:
+            return format_rows([], fields, output_format) if output_format != "text" else "📊 No projects found"
+
+        semaphore = asyncio.Semaphore(ROLLUP_CONCURRENCY)
+
+        async def fetch_tasks(project):
+            async with semaphore:
+                # Not cached: one entry per project would evict the interactive reads.
+                # A project without tasks answers an empty list; 404 means the
+                # project itself is gone (deleted since the listing).
+                url = f"{DOLIBARR_URL}/api/index.php/projects/{project.get('id')}/tasks"
+                return await get_json(url, {"includetimespent": 1}, "list") or []
+
+        results = await asyncio.gather(*(fetch_tasks(project) for project in projects), return_exceptions=True)
+
+        kept, failed = [], []
+        for project, result in zip(projects, results):
+            if isinstance(result, httpx.HTTPStatusError) and result.response.status_code == 404:
+                failed.append((project, "project not found"))
+            elif isinstance(result, BaseException):
+                logger.warning(f"Tasks of project {project.get('id')} unavailable for rollup: {result}")
+                failed.append((project, str(result) or type(result).__name__))
+            else:
+                kept.append((project, result))
+
+        rows = rank_rollup(rollup_portfolio([project for project, _ in kept], [tasks for _, tasks in kept]), sort_by)
+        shown = rows[:limit_int]
+
+        if output_format != "text":
+            extra = {"failed": [project.get("id") for project, _reason in failed]} if failed else {}
+            return format_rows(select_rows(shown, fields), fields, output_format, **extra)
+
+        planned_total = sum(row["planned_hours"] for row in rows)
+        spent_total = sum(row["spent_hours"] for row in rows)
+        result_lines = [
+            f"✅ Portfolio rollup of {len(rows)} project(s), ranked by {sort_by}:",
+            f"   Total planned: {planned_total:.2f} h - Total spent: {spent_total:.2f} h - "
+            f"Over planned: {sum(1 for row in rows if (row['spent_ratio'] or 0) > 1)} project(s)\n"
+        ]
+        result_lines.extend(format_rollup_line(rank, row) for rank, row in enumerate(shown, start=1))
+        if len(rows) > len(shown):
+            result_lines.append(f"\n… {len(rows) - len(shown)} more project(s) - raise limit to see them")
+        if failed:
+            result_lines.append(f"\n⚠️ Tasks unavailable for {len(failed)} project(s), left out:")
+            result_lines.extend(f"   • {project.get('ref') or project.get('id')}: {reason}" for project, reason in failed)
+
+        return "\n".join(result_lines)
+
+    except UnknownFieldError as e:
+        return f"❌ Error: {str(e)}"
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 401:
+            return "❌ Error: Authentication failed or insufficient permissions"
+        return f"❌ API Error: {e.response.status_code} - {e.response.text}"
+    except Exception as e:
+        logger.error(f"Error computing portfolio rollup: {e}")
+        return f"❌ Error: {str(e)}"
+
+@mcp.tool()
+@instrument_tool
+async def dolibarr_project_changes(since: str = "", consumer: str = "", max_results: str = "500", output_format: str = "text", fields: str = "") -> str:
+    """List projects modified since a watermark (t.tms) and return the next watermark - pass it back as since, or leave since empty to continue from the watermark the server remembers for this consumer name (the first call only starts the feed); since also accepts an ISO 8601 date. output_format 'json' or 'tsv' returns only the comma-separated fields."""
+    logger.info(f"Reading project changes since {since or 'remembered watermark'} for consumer '{consumer}'")
+
+    if not DOLIBARR_URL or not DOLIBARR_API_KEY:
+        return "❌ Error: DOLIBARR_URL and DOLIBARR_API_KEY must be configured"
+
+    key = ("projects", consumer.strip())
+    try:
+        output_format, fields = parse_output_options(output_format, fields, CHANGE_PROJECT_FIELDS)
+        max_results = int(max_results) if max_results.strip() else 500
+        remembered = change_watermarks.get(key)
+        watermark = parse_watermark(since) if since.strip() else (parse_watermark(remembered) if remembered else None)
+    except ValueError as e:
+        return f"❌ Error: {str(e)}"
+
+    if not 1 <= max_results <= CHANGES_MAX_RESULTS:
+        return f"❌ Error: max_results must be between 1 and {CHANGES_MAX_RESULTS}"
+
+    try:
+        changes, token, truncated = await read_changes("projects", watermark, max_results=max_results)
+        change_watermarks[key] = token
+        remember_refs(changes)
+        await apply_changes("projects", changes)
+
+        if output_format != "text":
+            extra = {"watermark": token}
+            if truncated:
+                extra["truncated"] = True
+            return format_rows(select_rows(changes, fields), fields, output_format, **extra)
+
+        if watermark is None:
+            return f"🔖 Change feed started at watermark {token} - call again with since={token} (or an empty since and the same consumer) to get later changes"
+
+        if not changes:
+            return f"📊 No project changed since {format_tms_filter(watermark[0])} UTC\n🔖 Next watermark: {token}"
+
+        result_lines = [f"✅ {len(changes)} project(s) changed since {format_tms_filter(watermark[0])} UTC:\n"]
+        result_lines.extend(
+            f"{format_project_line(project)} - Modified: {format_tms_filter(parse_tms(project.get('tms')))}" for project in changes
+        )
+        result_lines.append(f"\n🔖 Next watermark: {token}")
+        if truncated:
+            result_lines.append(f"⚠️ More than {max_results} changes - call again with the new watermark for the rest")
+
+        return "\n".join(result_lines)
+
+    except UnknownFieldError as e:
+        return f"❌ Error: {str(e)}"
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 401:
+            return "❌ Error: Authentication failed or insufficient permissions"
+        else:
+            return f"❌ API Error: {e.response.status_code} - {e.response.text}"
+    except Exception as e:
+        logger.error(f"Error reading project changes: {e}")
+        return f"❌ Error: {str(e)}"
+
+@mcp.tool()
+@instrument_tool
+async def dolibarr_cache_stats() -> str:
+    """Show read cache hit/miss counters, coalesced request counts and upstream scheduler queues for this server."""
+    logger.info("Reporting cache statistics")
+    return format_cache_stats()
+
+@mcp.tool()
+@instrument_tool
+async def dolibarr_mirror_status() -> str:
+    """Show the state of the optional local SQLite mirror of projects and tasks."""
+    logger.info("Reporting mirror status")
+
+    if mirror is None:
+        return "📊 Local mirror is disabled (set DOLIBARR_MIRROR_PATH to enable it)"
+
+    projects, tasks = mirror.counts()
+    last_sync = mirror.get_state("last_sync")
+    last_full_sync = mirror.get_state("last_full_sync")
+
+    lines = [
+        "📊 Local Mirror Status:\n",
+        f"   Path: {mirror.path}",
+        f"   Projects: {projects}",
+        f"   Tasks: {tasks}",
+        f"   Last sync: {datetime.fromtimestamp(last_sync, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC') if last_sync else 'never'}",
+        f"   Last full sync: {datetime.fromtimestamp(last_full_sync, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC') if last_full_sync else 'never'}",
+        f"   Serving reads: {'yes' if mirror.is_fresh() else f'no (older than {MIRROR_MAX_STALENESS:g}s, using the API)'}",
+    ]
+    return "\n".join(lines)
+
 # === SERVER STARTUP ===
+
 if __name__ == "__main__":
     logger.info("Starting Dolibarr Projects MCP server...")
 
@@ -505,8 +1459,12 @@ if __name__ == "__main__":
     if not DOLIBARR_API_KEY:
         logger.warning("DOLIBARR_API_KEY not set - server will return errors until configured")
 
+    if MCP_TRANSPORT not in MCP_TRANSPORTS:
+        logger.error(f"Unknown DOLIBARR_MCP_TRANSPORT '{MCP_TRANSPORT}' - expected one of: {', '.join(MCP_TRANSPORTS)}")
+        sys.exit(1)
+
     try:
-        mcp.run(transport='stdio')
+        run_server(mcp)
     except Exception as e:
         logger.error(f"Server error: {e}", exc_info=True)
         sys.exit(1)
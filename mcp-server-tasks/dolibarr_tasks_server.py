@@ -4,37 +4,75 @@ Simple Dolibarr Tasks MCP Server - Manage Dolibarr project tasks via MCP
 """
 import os
 import sys
+
+# The shared module sits next to this file in the Docker image, and in its own
+# directory in a repository checkout. Imported first: its import time is the
+# reference for the cold-start log line
+HERE = os.path.dirname(os.path.abspath(__file__))
+for directory in (HERE, os.path.join(HERE, "..", "mcp-server-common")):
+    if os.path.isdir(directory) and directory not in sys.path:
+        sys.path.append(directory)
+
+from dolibarr_common import (
+    BULK_TOOLS, CHANGES_MAX_RESULTS, CHANGE_FEEDS, DOLIBARR_API_KEY, DOLIBARR_URL, MCP_HOST,
+    MCP_PORT, MCP_TRANSPORT, MCP_TRANSPORTS, OUTPUT_FORMATS, REF_INDEX_MAX_ENTRIES,
+    RESOURCE_LISTINGS, UnknownFieldError, WARMUP_PREFETCH, WARMUP_PREFETCH_SIZE, apply_changes,
+    build_ref_filter, bulk_priority, cache, cached_get_json, change_watermarks, check_fields,
+    check_filter_value, enable_resource_listing, enable_resource_subscriptions, fetch_page,
+    format_cache_stats, format_rows, format_tms_filter, get_env_int, get_json, instrument_tool,
+    is_transient, iter_pages, parse_output_options, parse_tms, parse_watermark, read_changes,
+    resource_json, retry_delay, run_server, select_rows, send_request, server_lifespan
+)
+
+import asyncio
 import logging
 import json
-from datetime import datetime, timezone
+import csv
+import io
+from collections import OrderedDict, deque
+from datetime import date, datetime, timezone
 import httpx
 from mcp.server.fastmcp import FastMCP
+from mcp.types import Resource
 
-# Configure logging to stderr
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    stream=sys.stderr
-)
 logger = logging.getLogger("dolibarr-tasks-server")
 
+# Configuration (settings shared with the projects server are read by dolibarr_common)
+
+# Batch tool settings
+BATCH_CONCURRENCY = max(1, get_env_int("DOLIBARR_BATCH_CONCURRENCY", 8))
+BATCH_MAX_SIZE = max(1, get_env_int("DOLIBARR_BATCH_MAX_SIZE", 200))
+
+# Bulk time spent import settings
+BULK_MAX_ENTRIES = max(1, get_env_int("DOLIBARR_BULK_MAX_ENTRIES", 1000))
+BULK_RETRIES = max(0, get_env_int("DOLIBARR_BULK_RETRIES", 2))
+
+# Bulk task update settings (patches per call, PUTs sent in parallel)
+BULK_UPDATE_MAX_TASKS = max(1, get_env_int("DOLIBARR_BULK_UPDATE_MAX_TASKS", 200))
+BULK_UPDATE_CONCURRENCY = max(1, get_env_int("DOLIBARR_BULK_UPDATE_CONCURRENCY", BATCH_CONCURRENCY))
+
+# Pagination settings for list endpoints (rows per page, pages fetched in parallel)
+PAGE_SIZE = max(1, get_env_int("DOLIBARR_PAGE_SIZE", 100))
+PAGE_CONCURRENCY = max(1, get_env_int("DOLIBARR_PAGE_CONCURRENCY", 4))
+
+# Largest number of tasks returned by dolibarr_search_tasks
+SEARCH_MAX_RESULTS = max(1, get_env_int("DOLIBARR_SEARCH_MAX_RESULTS", 5000))
+
+# Largest page of raw entries returned by dolibarr_task_timesheet
+TIMESHEET_MAX_ENTRIES = max(1, get_env_int("DOLIBARR_TIMESHEET_MAX_ENTRIES", 500))
+
+# Most tasks read (one includetimespent=2 GET each) by one project or date range timesheet
+TIMESHEET_MAX_TASKS = max(1, get_env_int("DOLIBARR_TIMESHEET_MAX_TASKS", 500))
+
 # Initialize MCP server
-mcp = FastMCP("dolibarr_tasks")
+mcp = FastMCP("dolibarr_tasks", lifespan=server_lifespan, host=MCP_HOST, port=MCP_PORT)
 
-# Configuration
-DOLIBARR_URL = os.environ.get("DOLIBARR_URL", "")
-DOLIBARR_API_KEY = os.environ.get("DOLIBARR_API_KEY", "")
+# Tools whose reads are scheduled as bulk reads
+# dolibarr_task_timesheet is only bulk for a project or a date range (see the tool)
+BULK_TOOLS.update({"dolibarr_get_tasks_batch", "dolibarr_search_tasks", "dolibarr_get_task_tree"})
 
 # === UTILITY FUNCTIONS ===
 
-def get_headers():
-    """Get HTTP headers for Dolibarr API requests."""
-    return {
-        "DOLAPIKEY": DOLIBARR_API_KEY,
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
-
 def convert_iso_date_to_timestamp(date_str: str) -> int:
     """
     Convert ISO 8601 date to Unix timestamp.
@@ -154,9 +192,720 @@ def format_task_info(task):
 
     return "\n".join(lines)
 
+def format_timespent_summary(task):
+    """Format the time spent summary returned with includetimespent >= 1."""
+    if not task.get('timespent_total_duration'):
+        return ""
+
+    hours = int(task.get('timespent_total_duration', 0)) / 3600
+    lines = [
+        "⏱️  Time Spent Summary:",
+        f"   Total duration: {hours:.2f} hours",
+        f"   Number of entries: {task.get('timespent_nblines', 0)}",
+    ]
+
+    if task.get('timespent_min_date'):
+        lines.append(f"   First entry: {task.get('timespent_min_date')}")
+    if task.get('timespent_max_date'):
+        lines.append(f"   Last entry: {task.get('timespent_max_date')}")
+
+    return "\n".join(lines)
+
+def format_task_details(task, includetimespent=0):
+    """Format a retrieved task with the time spent sections requested by includetimespent."""
+    sections = [f"✅ Task Retrieved:\n\n{format_task_info(task)}"]
+
+    # Add time spent information if requested
+    if includetimespent >= 1 and task.get('timespent_total_duration'):
+        sections.append(format_timespent_summary(task))
+
+    # Add detailed time spent lines if requested (joined once - tasks can have thousands)
+    if includetimespent == 2 and task.get('timespent_lines'):
+        lines = ["📊 Time Spent Entries:"]
+        lines.extend(format_timespent_line(line) for line in task.get('timespent_lines', []))
+        sections.append("\n".join(lines))
+
+    return "\n\n".join(sections)
+
+def format_task_line(task):
+    """Format a task as a single list line."""
+    line = f"• {task.get('ref', 'N/A')} - {task.get('label', 'N/A')} (ID: {task.get('id', 'N/A')}) - Project: {task.get('fk_project', 'N/A')}"
+    if task.get('progress') not in (None, ""):
+        line += f" - Progress: {task.get('progress')}%"
+    if task.get('date_end'):
+        line += f" - End: {task.get('date_end')}"
+    return line
+
+# Default fields of the json and tsv outputs
+SEARCH_FIELDS = ("id", "ref", "label", "fk_project", "progress", "date_end")
+CHANGE_TASK_FIELDS = ("id", "ref", "label", "fk_project", "progress", "tms")
+BULK_UPDATE_FIELDS = ("task_id", "ref", "status", "fields", "error")
+
+TIMESPENT_COLUMNS = ["task_id", "date", "duration", "user_id", "note"]
+
+def parse_timespent_entries(text, input_format="auto"):
+    """
+    Parse bulk time spent entries from JSON lines or CSV text.
+
+    CSV may start with a header row naming the columns; without one the
+    columns are expected in order: task_id, date, duration, user_id, note.
+
+    Returns: list of (line_number, dict of raw string values)
+
+    Raises: ValueError if the text cannot be parsed
+    """
+    input_format = (input_format or "auto").strip().lower()
+    if input_format == "auto":
+        first_line = next((line.strip() for line in text.splitlines() if line.strip()), "")
+        input_format = "jsonl" if first_line.startswith("{") else "csv"
+
+    rows = []
+    if input_format in ("jsonl", "json"):
+        for number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"line {number} is not valid JSON - {e.msg}")
+            if not isinstance(item, dict):
+                raise ValueError(f"line {number} must be a JSON object")
+            rows.append((number, {key: "" if value is None else str(value) for key, value in item.items()}))
+    elif input_format == "csv":
+        reader = csv.reader(io.StringIO(text))
+        columns = TIMESPENT_COLUMNS
+        for row in reader:
+            if not any(cell.strip() for cell in row):
+                continue
+            if not rows and columns is TIMESPENT_COLUMNS and "task_id" in [cell.strip().lower() for cell in row]:
+                columns = [cell.strip().lower() for cell in row]
+                continue
+            rows.append((reader.line_num, {column: cell.strip() for column, cell in zip(columns, row)}))
+    else:
+        raise ValueError(f"input_format must be 'auto', 'jsonl' or 'csv', got: {input_format}")
+
+    return rows
+
+def build_timespent_entry(values):
+    """
+    Validate one raw time spent entry.
+
+    Returns: (task_id, payload for /tasks/{id}/addtimespent)
+
+    Raises: ValueError describing the first invalid field
+    """
+    task_id = values.get("task_id", "").strip()
+    date = values.get("date", "").strip()
+    duration = values.get("duration", "").strip()
+    user_id = values.get("user_id", "").strip()
+    note = values.get("note", "").strip()
+
+    try:
+        task_id = int(task_id)
+    except ValueError:
+        raise ValueError(f"task_id must be a positive integer, got: {task_id!r}")
+    if task_id <= 0:
+        raise ValueError(f"task_id must be a positive integer, got: {task_id}")
+
+    if not date:
+        raise ValueError("date is required (format: ISO 8601 - YYYY-MM-DDTHH:MM:SS or YYYY-MM-DD)")
+    try:
+        date_str = convert_iso_date_to_dolibarr_format(date)
+    except ValueError as e:
+        raise ValueError(f"date - {str(e)}")
+
+    if not duration:
+        raise ValueError("duration is required (in seconds, e.g., '7200' for 2 hours)")
+    try:
+        duration_seconds = int(float(duration))
+    except ValueError:
+        raise ValueError(f"duration must be a number of seconds, got: {duration!r}")
+    if duration_seconds <= 0:
+        raise ValueError(f"duration must be greater than 0 seconds, got: {duration_seconds}")
+
+    timespent_data = {"date": date_str, "duration": duration_seconds}
+
+    if user_id:
+        try:
+            timespent_data["user_id"] = int(user_id)
+        except ValueError:
+            raise ValueError(f"user_id must be a valid integer, got: {user_id!r}")
+
+    if note:
+        timespent_data["note"] = note
+
+    return task_id, timespent_data
+
+def parse_whole_number(value):
+    """Parse an integer given as "50" or "50.0" (JSON numbers arrive as floats); ValueError otherwise."""
+    number = float(value)
+    if not number.is_integer():
+        raise ValueError(f"not a whole number: {value}")
+    return int(number)
+
+TASK_UPDATE_FIELDS = ("label", "description", "progress", "planned_workload", "priority", "budget_amount",
+                      "date_start", "date_end", "note_public", "note_private")
+
+def build_task_update(values):
+    """
+    Validate the fields of a task update.
+
+    Args:
+        values: dict of raw string values keyed by TASK_UPDATE_FIELDS (missing or empty fields are left unchanged)
+
+    Returns: payload for PUT /tasks/{id} (empty if nothing is to be updated)
+
+    Raises: ValueError describing the first invalid field
+    """
+    update_data = {}
+
+    for field in ("label", "description"):
+        if values.get(field, "").strip():
+            update_data[field] = values[field].strip()
+
+    progress = values.get("progress", "")
+    if progress.strip():
+        try:
+            prog_int = parse_whole_number(progress)
+        except ValueError:
+            raise ValueError(f"progress must be a valid integer, got: {progress}")
+        if not 0 <= prog_int <= 100:
+            raise ValueError("progress must be between 0 and 100")
+        update_data["progress"] = prog_int
+
+    planned_workload = values.get("planned_workload", "")
+    if planned_workload.strip():
+        try:
+            # planned_workload must be in SECONDS (not hours)
+            seconds = int(float(planned_workload))
+        except ValueError:
+            raise ValueError(f"planned_workload must be a valid number in SECONDS (e.g., '72000' for 20 hours), got: {planned_workload}")
+
+        # Validation: reject values that are too small (likely hours instead of seconds)
+        if 0 < seconds < 3600:
+            logger.warning(f"planned_workload={seconds}s is less than 1 hour - did you mean to send seconds?")
+            raise ValueError(f"planned_workload must be in SECONDS, not hours. Got {seconds} which is only {seconds/60:.1f} minutes. For 20 hours, send '72000' (20*3600). For 1 hour, send '3600'.")
+
+        update_data["planned_workload"] = seconds
+
+    priority = values.get("priority", "")
+    if priority.strip():
+        try:
+            update_data["priority"] = parse_whole_number(priority)
+        except ValueError:
+            raise ValueError(f"priority must be a valid integer, got: {priority}")
+
+    budget_amount = values.get("budget_amount", "")
+    if budget_amount.strip():
+        try:
+            update_data["budget_amount"] = float(budget_amount)
+        except ValueError:
+            raise ValueError(f"budget_amount must be a valid number, got: {budget_amount}")
+
+    # Date format: ISO 8601 (YYYY-MM-DDTHH:MM:SS) or simple date (YYYY-MM-DD)
+    for field in ("date_start", "date_end"):
+        if values.get(field, "").strip():
+            try:
+                update_data[field] = convert_iso_date_to_timestamp(values[field])
+            except ValueError as e:
+                raise ValueError(f"{field} - {str(e)}")
+
+    for field in ("note_public", "note_private"):
+        if values.get(field, "").strip():
+            update_data[field] = values[field].strip()
+
+    return update_data
+
+# === CACHE ===
+
+def invalidate_task_cache(task_id, project_id=None):
+    """
+    Drop cached entries for a task and for its project's task list.
+
+    When the project is neither given nor found in a cached copy of the task
+    (time spent writes do not return it), every cached project task list is
+    dropped, since any of them may embed the task.
+    """
+    task_url = f"{DOLIBARR_URL}/api/index.php/tasks/{task_id}"
+    if project_id is None:
+        # Find the parent project from any cached variant of this task
+        for value in cache.peek(task_url):
+            if isinstance(value, dict) and value.get('fk_project'):
+                project_id = value.get('fk_project')
+                break
+    cache.invalidate(task_url)
+    if project_id:
+        cache.invalidate(f"{DOLIBARR_URL}/api/index.php/projects/{project_id}/tasks")
+    else:
+        projects_url = f"{DOLIBARR_URL}/api/index.php/projects/"
+        cache.invalidate_matching(lambda url: url.startswith(projects_url) and url.endswith("/tasks"))
+
+# === REFERENCE INDEX ===
+
+# ref -> id mappings learned from every object the server sees (LRU bounded)
+ref_index = OrderedDict()
+
+def remember_refs(items):
+    """Record the ref -> id mapping of every object in an API response."""
+    if isinstance(items, dict):
+        items = [items]
+    if not isinstance(items, list):
+        return
+    for item in items:
+        if not isinstance(item, dict) or not item.get('ref') or not item.get('id'):
+            continue
+        try:
+            object_id = int(item.get('id'))
+        except (ValueError, TypeError):
+            continue
+        ref = str(item.get('ref'))
+        ref_index[ref] = object_id
+        ref_index.move_to_end(ref)
+    while len(ref_index) > REF_INDEX_MAX_ENTRIES:
+        ref_index.popitem(last=False)
+
+def forget_ref(object_id):
+    """Drop every ref pointing to an object that no longer exists."""
+    for ref in [ref for ref, known_id in ref_index.items() if known_id == object_id]:
+        del ref_index[ref]
+
+def build_like_pattern(pattern):
+    """
+    Turn a label pattern into a LIKE value.
+
+    '*' and '%' are wildcards; a pattern without any wildcard matches
+    labels containing it. Parentheses become the '_' single character
+    wildcard since the sqlfilters parser splits on them.
+
+    Raises: ValueError if the pattern contains a quote
+    """
+    check_filter_value(pattern, "label patterns")
+    pattern = pattern.strip().replace("(", "_").replace(")", "_").replace("*", "%")
+    return pattern if "%" in pattern else f"%{pattern}%"
+
+def convert_date_bound(date_str):
+    """
+    Convert a search date bound like convert_iso_date_to_dolibarr_format().
+
+    Raises: ValueError if the date is invalid or carries a UTC offset
+    """
+    value = convert_iso_date_to_dolibarr_format(date_str)
+    if "T" in date_str and datetime.fromisoformat(date_str.strip()).tzinfo is not None:
+        raise ValueError(f"date bounds cannot carry a UTC offset, use YYYY-MM-DDTHH:MM:SS, got: {date_str}")
+    return value
+
+def build_task_search_filter(project_id="", progress_min="", progress_max="", start_from="", start_to="",
+                             end_from="", end_to="", label="", parent_id=""):
+    """
+    Build a /tasks sqlfilters expression from typed search criteria.
+
+    Empty criteria are ignored. Date bounds are inclusive; a date without a
+    time ends at 23:59:59 when used as an upper bound. Bounds are compared
+    with the dates as stored by Dolibarr, so a bound with a UTC offset is
+    rejected rather than silently truncated.
+
+    Returns: the sqlfilters string ("" when no criterion is set)
+
+    Raises: ValueError on an invalid number, progress, date or label
+    """
+    criteria = []
+
+    if str(project_id).strip():
+        criteria.append(f"(t.fk_projet:=:{int(project_id)})")
+    if str(parent_id).strip():
+        criteria.append(f"(t.fk_task_parent:=:{int(parent_id)})")
+
+    for bound, operator in ((progress_min, ">="), (progress_max, "<=")):
+        if str(bound).strip():
+            progress = int(bound)
+            if not 0 <= progress <= 100:
+                raise ValueError(f"progress bounds must be between 0 and 100, got {progress}")
+            criteria.append(f"(t.progress:{operator}:{progress})")
+
+    for column, lower, upper in (("t.dateo", start_from, start_to), ("t.datee", end_from, end_to)):
+        if lower.strip():
+            criteria.append(f"({column}:>=:'{convert_date_bound(lower)}')")
+        if upper.strip():
+            value = convert_date_bound(upper)
+            if "T" not in upper:
+                value = value[:10] + " 23:59:59"
+            criteria.append(f"({column}:<=:'{value}')")
+
+    if label.strip():
+        criteria.append(f"(t.label:like:'{build_like_pattern(label)}')")
+
+    return " and ".join(criteria)
+
+async def fetch_task(task_id, includetimespent=0):
+    """Get a task through the read cache and index its ref."""
+    url = f"{DOLIBARR_URL}/api/index.php/tasks/{task_id}"
+    task = await cached_get_json(url, {"includetimespent": includetimespent})
+    remember_refs(task)
+    return task
+
+# === WARM-UP ===
+
+async def prefetch_recent_tasks():
+    """Cache the most recently modified tasks and index their refs."""
+    url = f"{DOLIBARR_URL}/api/index.php/tasks"
+    tasks = await fetch_page(url, {"sortfield": "t.tms", "sortorder": "DESC"}, 0, WARMUP_PREFETCH_SIZE) if WARMUP_PREFETCH_SIZE else []
+    remember_refs(tasks)
+    # Oldest first, so the most recent tasks are the last evicted; same key as fetch_task()
+    for task in reversed(tasks):
+        cache.set(f"{url}/{task['id']}", {"includetimespent": 0}, task)
+    return f"{len(tasks)} task(s)"
+
+WARMUP_PREFETCH.append(prefetch_recent_tasks)
+
+# === CHANGE FEED ===
+
+def task_changed(task):
+    """Drop cached copies of a task changed in Dolibarr; return the resource URIs it backs."""
+    invalidate_task_cache(task.get('id'), task.get('fk_project') or None)
+    uris = [f"dolibarr://task/{task.get('id')}"]
+    if task.get('fk_project'):
+        uris.append(f"dolibarr://project/{task.get('fk_project')}/tasks")
+    return uris
+
+CHANGE_FEEDS["tasks"] = ("tasks", task_changed)
+
+enable_resource_subscriptions(mcp)
+
+# === RESOURCES ===
+
+def task_resource(task):
+    """resources/list entry of a task."""
+    return Resource(
+        uri=f"dolibarr://task/{task.get('id')}",
+        name=str(task.get('ref') or task.get('id')),
+        title=task.get('label'),
+        mimeType="application/json",
+        _meta={"version": str(parse_tms(task.get('tms')))},
+    )
+
+async def read_task_resource(task_id: int) -> str:
+    """Dolibarr task as returned by the API (same source as dolibarr_get_task)."""
+    try:
+        return resource_json(await fetch_task(task_id))
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 404:
+            raise ValueError(f"Task {task_id} not found") from e
+        raise
+
+RESOURCE_LISTINGS["tasks"] = ("tasks", task_resource, remember_refs)
+
+def register_resources(server):
+    """Register the task resource template on a FastMCP server."""
+    server.resource("dolibarr://task/{task_id}", name="task", title="Dolibarr task",
+                    mime_type="application/json")(read_task_resource)
+
+register_resources(mcp)
+enable_resource_listing(mcp)
+
+# === TASK TREE ===
+
+TREE_FIELDS = ("id", "ref", "label", "depth", "parent", "progress", "subtree_tasks",
+               "planned_hours", "spent_hours", "rollup_progress")
+
+def to_float(value):
+    """Convert a Dolibarr numeric field (often a string, sometimes null) to a float."""
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+class TaskTree:
+    """
+    Parent/child tree of a project's tasks with workload rolled up to every parent.
+
+    Built in O(n): one pass indexes tasks by ID and links each one to its
+    parent, one pre-order walk from the roots assigns depths, and one reverse
+    walk over that order adds every subtree into its parent. Nothing recurses,
+    so deep hierarchies cannot hit the recursion limit.
+
+    - orphans: tasks whose fk_task_parent is not in the project (shown as roots)
+    - cycles: lists of task IDs whose parent chain loops; each loop is broken
+      at its lowest task ID, which is shown as a root, so every task appears once
+    """
+
+    def __init__(self, tasks):
+        self.nodes = {}
+        for task in tasks:
+            task_id = int(task.get('id') or 0)
+            self.nodes[task_id] = {
+                "task": task,
+                "parent": int(to_float(task.get('fk_task_parent'))),
+                "children": [],
+            }
+
+        self.roots = []
+        self.orphans = []
+        for task_id, node in self.nodes.items():
+            parent = node["parent"]
+            if not parent:
+                self.roots.append(task_id)
+            elif parent in self.nodes:
+                self.nodes[parent]["children"].append(task_id)
+            else:
+                self.orphans.append(task_id)
+
+        self.order = []
+        self._walk(self.roots + self.orphans)
+        self.cycles = self._break_cycles()
+        self._roll_up()
+
+    def _walk(self, starts, depth=0):
+        """Append the subtrees under `starts` to the pre-order, recording depths."""
+        stack = [(task_id, depth) for task_id in reversed(starts)]
+        while stack:
+            task_id, level = stack.pop()
+            node = self.nodes[task_id]
+            node["depth"] = level
+            self.order.append(task_id)
+            stack.extend((child, level + 1) for child in reversed(node["children"]))
+
+    def _break_cycles(self):
+        """Find tasks the walk never reached - they hang on a parent loop - and cut each loop."""
+        cycles = []
+        for task_id in self.nodes:
+            if "depth" in self.nodes[task_id]:
+                continue
+            # Follow parent links until a task repeats: the repeated part is the loop
+            path = {}
+            current = task_id
+            while current not in path:
+                path[current] = len(path)
+                current = self.nodes[current]["parent"]
+            cycle = list(path)[path[current]:]
+            # Start the reported loop at the task where it is cut
+            start = min(cycle)
+            cycle = cycle[cycle.index(start):] + cycle[:cycle.index(start)]
+            self.nodes[self.nodes[start]["parent"]]["children"].remove(start)
+            self.roots.append(start)
+            cycles.append(cycle)
+            self._walk([start])
+        return cycles
+
+    def _roll_up(self):
+        """Add every subtree's totals into its parent, children before parents."""
+        for task_id in reversed(self.order):
+            node = self.nodes[task_id]
+            task = node["task"]
+            planned = to_float(task.get('planned_workload'))
+            spent = to_float(task.get('timespent_total_duration') or task.get('duration_effective'))
+            progress = to_float(task.get('progress'))
+            node.update(count=1, planned=planned, spent=spent, weighted=planned * progress, progress_sum=progress)
+            for child in node["children"]:
+                totals = self.nodes[child]
+                node["count"] += totals["count"]
+                node["planned"] += totals["planned"]
+                node["spent"] += totals["spent"]
+                node["weighted"] += totals["weighted"]
+                node["progress_sum"] += totals["progress_sum"]
+
+    def rollup_progress(self, task_id):
+        """Workload-weighted progress of a subtree (plain average when nothing is planned)."""
+        node = self.nodes[task_id]
+        if node["planned"]:
+            return node["weighted"] / node["planned"]
+        return node["progress_sum"] / node["count"]
+
+    def subtree(self, task_id=None, max_depth=0):
+        """
+        Yield (task_id, relative depth) in display order.
+
+        task_id None walks the whole tree; max_depth 0 means no depth limit.
+        """
+        if task_id is None:
+            ordered = self.order
+            start_depth = 0
+        else:
+            ordered = []
+            stack = [task_id]
+            while stack:
+                current = stack.pop()
+                ordered.append(current)
+                stack.extend(reversed(self.nodes[current]["children"]))
+            start_depth = self.nodes[task_id]["depth"]
+        for current in ordered:
+            depth = self.nodes[current]["depth"] - start_depth
+            if not max_depth or depth <= max_depth:
+                yield current, depth
+
+    def row(self, task_id, depth, fields):
+        """Select fields of a node for the json/tsv outputs - task fields or rolled-up values."""
+        node = self.nodes[task_id]
+        values = {
+            "depth": depth,
+            "parent": node["parent"],
+            "subtree_tasks": node["count"],
+            "planned_hours": round(node["planned"] / 3600, 2),
+            "spent_hours": round(node["spent"] / 3600, 2),
+            "rollup_progress": round(self.rollup_progress(task_id), 1),
+        }
+        return [values[field] if field in values else node["task"].get(field) for field in fields]
+
+    def format_line(self, task_id, depth, max_depth=0):
+        """Format a node as an indented tree line with its rolled-up totals."""
+        node = self.nodes[task_id]
+        task = node["task"]
+        line = f"{'   ' * depth}• {task.get('ref', 'N/A')} - {task.get('label', 'N/A')} (ID: {task_id})"
+        if task.get('progress') not in (None, ""):
+            line += f" - Progress: {task.get('progress')}%"
+        totals = f"Planned: {node['planned'] / 3600:.2f}h - Spent: {node['spent'] / 3600:.2f}h"
+        if not node["children"]:
+            line += f" - {totals}"
+        else:
+            line += f" - Subtree of {node['count']}: {totals} - Progress: {self.rollup_progress(task_id):.1f}%"
+            if max_depth and depth == max_depth:
+                line += f" - {node['count'] - 1} sub-task(s) not shown"
+        if task_id in self.orphans:
+            line += f" - ⚠️ orphan (parent {node['parent']} not in project)"
+        elif any(cycle[0] == task_id for cycle in self.cycles):
+            line += f" - ⚠️ parent loop cut here (parent {node['parent']})"
+        return line
+
+# === TIMESHEETS ===
+
+TIMESHEET_GROUPS = ("user", "task", "day", "week", "month")
+TIMESHEET_ENTRY_FIELDS = ("task_id", "id", "date", "user", "hours", "note")
+
+def format_timespent_line(line):
+    """Format a time spent entry of timespent_lines as a single list line."""
+    hours = int(line.get('task_duration', 0)) / 3600
+    text = f"   • ID {line.get('id')}: {hours:.2f}h on {line.get('task_date')}"
+    if line.get('note'):
+        text += f" - {line.get('note')}"
+    return text
+
+def timespent_day(value):
+    """Day of a Dolibarr time spent date - a Unix timestamp or a 'YYYY-MM-DD[ HH:MM:SS]' string."""
+    if isinstance(value, (int, float)) or str(value).strip().isdigit():
+        return datetime.fromtimestamp(int(value), tz=timezone.utc).date()
+    return date.fromisoformat(str(value).strip()[:10])
+
+class TimesheetAggregator:
+    """
+    Single-pass aggregation of time spent lines, fed one task at a time.
+
+    Each line is bucketed by the group_by keys and dropped; only the running
+    totals per bucket are kept, plus the one page of raw entries requested
+    (entries_offset/entries_limit, entries_limit 0 keeps none).
+    """
+
+    def __init__(self, group_by, date_from=None, date_to=None, entries_offset=0, entries_limit=0):
+        self.group_by = group_by
+        self.date_from = date_from
+        self.date_to = date_to
+        self.entries_offset = entries_offset
+        self.entries_limit = entries_limit
+        self.buckets = {}
+        self.entries = []
+        self.total_seconds = 0
+        self.total_entries = 0
+        self.tasks = 0
+
+    def key(self, task_id, line, day):
+        parts = []
+        for group in self.group_by:
+            if group == "user":
+                parts.append(str(line.get('fk_user') or line.get('user_id') or "?"))
+            elif group == "task":
+                parts.append(str(task_id))
+            elif group == "day":
+                parts.append(day.isoformat())
+            elif group == "week":
+                year, week, _weekday = day.isocalendar()
+                parts.append(f"{year}-W{week:02d}")
+            else:
+                parts.append(day.strftime("%Y-%m"))
+        return tuple(parts)
+
+    def add_task(self, task_id, lines):
+        """Fold the timespent_lines of one task into the totals."""
+        counted = False
+        for line in lines or []:
+            day = timespent_day(line.get('task_date'))
+            if (self.date_from and day < self.date_from) or (self.date_to and day > self.date_to):
+                continue
+            seconds = int(to_float(line.get('task_duration')))
+            bucket = self.buckets.setdefault(self.key(task_id, line, day), [0, 0])
+            bucket[0] += seconds
+            bucket[1] += 1
+            if self.entries_offset <= self.total_entries < self.entries_offset + self.entries_limit:
+                self.entries.append((task_id, line))
+            self.total_seconds += seconds
+            self.total_entries += 1
+            counted = True
+        if counted:
+            self.tasks += 1
+
+    def rows(self):
+        """Yield group keys followed by hours, entries and seconds, sorted by key."""
+        for key in sorted(self.buckets):
+            seconds, count = self.buckets[key]
+            yield [*key, round(seconds / 3600, 2), count, seconds]
+
+    def entry_rows(self):
+        for task_id, line in self.entries:
+            yield [task_id, line.get('id'), line.get('task_date'), line.get('fk_user') or line.get('user_id'),
+                   round(to_float(line.get('task_duration')) / 3600, 2), line.get('note')]
+
+def parse_timesheet_date(value, name):
+    """Validate an ISO 8601 date bound of the timesheet tool (None when empty)."""
+    if not value.strip():
+        return None
+    try:
+        return date.fromisoformat(convert_iso_date_to_dolibarr_format(value)[:10])
+    except ValueError as e:
+        raise ValueError(f"{name} - {str(e)}")
+
+def summary_overlaps(task, date_from, date_to):
+    """
+    Whether the includetimespent=1 summary of a task can hold lines in the date range.
+
+    Tasks without the summary fields are kept, so a partial summary never hides time.
+    """
+    if str(task.get('timespent_nblines', "")).strip() in ("0", "0.0"):
+        return False
+    try:
+        if date_from and task.get('timespent_max_date') and timespent_day(task['timespent_max_date']) < date_from:
+            return False
+        if date_to and task.get('timespent_min_date') and timespent_day(task['timespent_min_date']) > date_to:
+            return False
+    except ValueError:
+        pass
+    return True
+
+async def iter_timesheet_task_ids(task_id, project_id, date_from, date_to):
+    """
+    Yield lists of the task IDs whose time spent lines are needed.
+
+    A project is narrowed with the includetimespent=1 summaries of its task
+    list; a date range alone scans every task with time spent, page by page.
+    """
+    if task_id:
+        yield [task_id]
+        return
+    if project_id:
+        url = f"{DOLIBARR_URL}/api/index.php/projects/{project_id}/tasks"
+        try:
+            tasks = await cached_get_json(url, {"includetimespent": 1}, operation="list")
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                return
+            raise
+        remember_refs(tasks or [])
+        yield [int(task['id']) for task in tasks or [] if summary_overlaps(task, date_from, date_to)]
+        return
+    params = {"sortfield": "t.rowid", "sortorder": "ASC", "sqlfilters": "(t.duration_effective:>:0)"}
+    async for page in iter_pages(f"{DOLIBARR_URL}/api/index.php/tasks", params):
+        yield [int(task['id']) for task in page]
+
 # === MCP TOOLS ===
 
 @mcp.tool()
+@instrument_tool
 async def dolibarr_get_task(task_id: int, includetimespent: int = 0) -> str:
     """Get details of a specific Dolibarr task by ID with optional time spent data."""
     logger.info(f"Fetching task with ID: {task_id}")
@@ -171,53 +920,518 @@ async def dolibarr_get_task(task_id: int, includetimespent: int = 0) -> str:
         if includetimespent not in [0, 1, 2]:
             return "❌ Error: includetimespent must be 0, 1, or 2"
 
-        async with httpx.AsyncClient() as client:
-            url = f"{DOLIBARR_URL}/api/index.php/tasks/{task_id}"
-            params = {"includetimespent": includetimespent}
+        task = await fetch_task(task_id, includetimespent)
+
+        return format_task_details(task, includetimespent)
+
+    except ValueError as e:
+        return f"❌ Error: Invalid number format - {str(e)}"
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 404:
+            return f"❌ Error: Task {task_id} not found"
+        elif e.response.status_code == 401:
+            return "❌ Error: Authentication failed or insufficient permissions"
+        else:
+            return f"❌ API Error: {e.response.status_code} - {e.response.text}"
+    except Exception as e:
+        logger.error(f"Error fetching task: {e}")
+        return f"❌ Error: {str(e)}"
+
+@mcp.tool()
+@instrument_tool
+async def dolibarr_get_task_by_ref(ref: str = "", includetimespent: int = 0) -> str:
+    """Get a Dolibarr task by its reference code with optional time spent data."""
+    logger.info(f"Fetching task with reference: {ref}")
 
-            response = await client.get(url, headers=get_headers(), params=params, timeout=10)
-            response.raise_for_status()
-            task = response.json()
+    if not ref.strip():
+        return "❌ Error: ref (task reference) is required"
 
-            result = f"✅ Task Retrieved:\n\n{format_task_info(task)}"
+    if includetimespent not in [0, 1, 2]:
+        return "❌ Error: includetimespent must be 0, 1, or 2"
 
-            # Add time spent information if requested
-            if includetimespent >= 1 and task.get('timespent_total_duration'):
-                hours = int(task.get('timespent_total_duration', 0)) / 3600
-                result += f"\n\n⏱️  Time Spent Summary:"
-                result += f"\n   Total duration: {hours:.2f} hours"
-                result += f"\n   Number of entries: {task.get('timespent_nblines', 0)}"
+    if not DOLIBARR_URL or not DOLIBARR_API_KEY:
+        return "❌ Error: DOLIBARR_URL and DOLIBARR_API_KEY must be configured"
 
-                if task.get('timespent_min_date'):
-                    result += f"\n   First entry: {task.get('timespent_min_date')}"
-                if task.get('timespent_max_date'):
-                    result += f"\n   Last entry: {task.get('timespent_max_date')}"
+    ref = ref.strip()
 
-            # Add detailed time spent lines if requested
-            if includetimespent == 2 and task.get('timespent_lines'):
-                result += f"\n\n📊 Time Spent Entries:"
-                for line in task.get('timespent_lines', []):
-                    hours = int(line.get('task_duration', 0)) / 3600
-                    result += f"\n   • ID {line.get('id')}: {hours:.2f}h on {line.get('task_date')}"
-                    if line.get('note'):
-                        result += f" - {line.get('note')}"
+    try:
+        # Resolve the ref locally first and check it still points to the same task
+        task = None
+        task_id = ref_index.get(ref)
+        if task_id:
+            try:
+                task = await fetch_task(task_id, includetimespent)
+                if task.get('ref') != ref:
+                    ref_index.pop(ref, None)
+                    task = None
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code != 404:
+                    raise
+                forget_ref(task_id)
+
+        if task is None:
+            # Index miss: fall back to a filtered list query
+            url = f"{DOLIBARR_URL}/api/index.php/tasks"
+            tasks = await cached_get_json(url, {"sqlfilters": build_ref_filter(ref)})
+            remember_refs(tasks)
+
+            # The filter may over-match, so compare refs exactly
+            matches = [t for t in tasks or [] if t.get('ref') == ref]
+            if not matches:
+                return f"❌ Error: Task with reference '{ref}' not found"
+            task = matches[0]
+            # List rows carry no time spent data
+            if includetimespent:
+                task = await fetch_task(int(task['id']), includetimespent)
 
-            return result
+        return format_task_details(task, includetimespent)
 
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 404:
+            return f"❌ Error: Task with reference '{ref}' not found"
+        elif e.response.status_code == 401:
+            return "❌ Error: Authentication failed or insufficient permissions"
+        else:
+            return f"❌ API Error: {e.response.status_code} - {e.response.text}"
     except ValueError as e:
-        return f"❌ Error: Invalid number format - {str(e)}"
+        return f"❌ Error: {str(e)}"
+    except Exception as e:
+        logger.error(f"Error fetching task by reference: {e}")
+        return f"❌ Error: {str(e)}"
+
+@mcp.tool()
+@instrument_tool
+async def dolibarr_get_tasks_batch(task_ids: list[int], includetimespent: int = 0) -> str:
+    """Get several Dolibarr tasks at once by ID (fetched concurrently) - errors are reported per task."""
+    logger.info(f"Fetching batch of {len(task_ids or [])} task(s)")
+
+    if not task_ids:
+        return "❌ Error: task_ids is required and must be a non-empty list of task IDs"
+
+    # bool is an int subclass (True == 1): checked before de-duplication merges them
+    if any(isinstance(task_id, bool) or not isinstance(task_id, int) or task_id <= 0 for task_id in task_ids):
+        return "❌ Error: every task ID must be a positive integer"
+
+    # Keep the caller's order but fetch each task only once
+    unique_ids = list(dict.fromkeys(task_ids))
+
+    if len(unique_ids) > BATCH_MAX_SIZE:
+        return f"❌ Error: at most {BATCH_MAX_SIZE} task IDs can be fetched in one batch, got {len(unique_ids)}"
+
+    if includetimespent not in [0, 1, 2]:
+        return "❌ Error: includetimespent must be 0, 1, or 2"
+
+    if not DOLIBARR_URL or not DOLIBARR_API_KEY:
+        return "❌ Error: DOLIBARR_URL and DOLIBARR_API_KEY must be configured"
+
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    params = {"includetimespent": includetimespent}
+
+    async def fetch_one(task_id):
+        async with semaphore:
+            try:
+                url = f"{DOLIBARR_URL}/api/index.php/tasks/{task_id}"
+                return task_id, await cached_get_json(url, params), None
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code == 404:
+                    return task_id, None, "not found"
+                elif e.response.status_code == 401:
+                    return task_id, None, "authentication failed or insufficient permissions"
+                return task_id, None, f"API error {e.response.status_code} - {e.response.text}"
+            except Exception as e:
+                logger.error(f"Error fetching task {task_id} in batch: {e}")
+                return task_id, None, str(e)
+
+    results = await asyncio.gather(*(fetch_one(task_id) for task_id in unique_ids))
+
+    found = [(task_id, task) for task_id, task, error in results if error is None]
+    remember_refs([task for _task_id, task in found])
+    failed = [(task_id, error) for task_id, task, error in results if error is not None]
+
+    sections = [f"✅ Retrieved {len(found)}/{len(unique_ids)} task(s):"]
+    for task_id, task in found:
+        section = format_task_info(task)
+        if includetimespent >= 1 and task.get('timespent_total_duration'):
+            section += f"\n{format_timespent_summary(task)}"
+        sections.append(section)
+
+    if failed:
+        error_lines = [f"❌ {len(failed)} task(s) could not be retrieved:"]
+        error_lines.extend(f"   • Task {task_id}: {error}" for task_id, error in failed)
+        sections.append("\n".join(error_lines))
+
+    return "\n\n".join(sections)
+
+@mcp.tool()
+@instrument_tool
+async def dolibarr_search_tasks(project_id: str = "", progress_min: str = "", progress_max: str = "", start_from: str = "", start_to: str = "", end_from: str = "", end_to: str = "", label: str = "", parent_id: str = "", max_results: str = "500", sortfield: str = "t.rowid", sortorder: str = "ASC", output_format: str = "text", fields: str = "") -> str:
+    """Search tasks across all projects with filters applied by Dolibarr - project, progress range (0-100), start/end date ranges (ISO 8601, inclusive), label pattern (* wildcard) and parent task (0 for top-level tasks); output_format 'json' or 'tsv' returns only the comma-separated fields."""
+    logger.info("Searching tasks")
+
+    if not DOLIBARR_URL or not DOLIBARR_API_KEY:
+        return "❌ Error: DOLIBARR_URL and DOLIBARR_API_KEY must be configured"
+
+    try:
+        output_format, fields = parse_output_options(output_format, fields, SEARCH_FIELDS)
+        sqlfilters = build_task_search_filter(project_id, progress_min, progress_max, start_from, start_to,
+                                              end_from, end_to, label, parent_id)
+        max_results = int(max_results) if max_results.strip() else 500
+    except ValueError as e:
+        return f"❌ Error: {str(e)}"
+
+    if not 1 <= max_results <= SEARCH_MAX_RESULTS:
+        return f"❌ Error: max_results must be between 1 and {SEARCH_MAX_RESULTS}"
+
+    sortorder = sortorder.strip().upper() or "ASC"
+    if sortorder not in ("ASC", "DESC"):
+        return "❌ Error: sortorder must be ASC or DESC"
+
+    params = {"sortfield": sortfield.strip() or "t.rowid", "sortorder": sortorder}
+    if sqlfilters:
+        params["sqlfilters"] = sqlfilters
+
+    try:
+        url = f"{DOLIBARR_URL}/api/index.php/tasks"
+        tasks = []
+        truncated = False
+        # Small searches do not need full pages
+        async for page in iter_pages(url, params, limit=min(PAGE_SIZE, max_results + 1)):
+            remember_refs(page)
+            tasks.extend(page)
+            if len(tasks) > max_results:
+                truncated = True
+                del tasks[max_results:]
+                break
+
+        if output_format != "text":
+            return format_rows(select_rows(tasks, fields), fields, output_format, **({"truncated": True} if truncated else {}))
+
+        if not tasks:
+            return "📊 No tasks match the search criteria"
+
+        result_lines = [f"✅ Found {len(tasks)} task(s){' (first results only)' if truncated else ''}:\n"]
+        result_lines.extend(format_task_line(task) for task in tasks)
+        if truncated:
+            result_lines.append(f"\n⚠️ More than {max_results} tasks match - narrow the filters or raise max_results")
+
+        return "\n".join(result_lines)
+
+    except UnknownFieldError as e:
+        return f"❌ Error: {str(e)}"
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 401:
+            return "❌ Error: Authentication failed or insufficient permissions"
+        elif e.response.status_code == 400:
+            return f"❌ Error: Dolibarr rejected the search - {e.response.text}"
+        else:
+            return f"❌ API Error: {e.response.status_code} - {e.response.text}"
+    except Exception as e:
+        logger.error(f"Error searching tasks: {e}")
+        return f"❌ Error: {str(e)}"
+
+@mcp.tool()
+@instrument_tool
+async def dolibarr_get_task_tree(project_id: int = 0, task_id: int = 0, max_depth: int = 0, output_format: str = "text", fields: str = "") -> str:
+    """Show the task hierarchy of a project - or the subtree under task_id - with planned workload, time spent and workload-weighted progress rolled up to every parent; max_depth limits the levels shown (0 = all), orphans and parent loops are reported; output_format 'json' or 'tsv' returns one row per task with the comma-separated fields."""
+    logger.info(f"Building task tree for project {project_id or '?'} from task {task_id or 'root'}")
+
+    if project_id < 0 or task_id < 0 or (not project_id and not task_id):
+        return "❌ Error: project_id or task_id is required and must be a positive integer"
+
+    if max_depth < 0:
+        return "❌ Error: max_depth must be 0 (no limit) or a positive integer"
+
+    if not DOLIBARR_URL or not DOLIBARR_API_KEY:
+        return "❌ Error: DOLIBARR_URL and DOLIBARR_API_KEY must be configured"
+
+    try:
+        output_format, fields = parse_output_options(output_format, fields, TREE_FIELDS)
+    except ValueError as e:
+        return f"❌ Error: {str(e)}"
+
+    try:
+        if not project_id:
+            task = await fetch_task(task_id)
+            project_id = int(task.get('fk_project') or 0)
+            if not project_id:
+                return f"❌ Error: Task {task_id} is not attached to a project"
+
+        # Same cache entry as dolibarr_get_project_tasks, invalidated by task writes
+        url = f"{DOLIBARR_URL}/api/index.php/projects/{project_id}/tasks"
+        tasks = await cached_get_json(url, {"includetimespent": 1}, operation="list")
+        remember_refs(tasks or [])
+        tree = TaskTree(tasks or [])
+
+        if task_id and task_id not in tree.nodes:
+            return f"❌ Error: Task {task_id} is not part of project {project_id}"
+
+        nodes = tree.subtree(task_id or None, max_depth)
+
+        if output_format != "text":
+            check_fields(tasks or [], [field for field in fields if field not in TREE_FIELDS])
+            anomalies = {"orphans": tree.orphans, "cycles": tree.cycles}
+            return format_rows(
+                (tree.row(node_id, depth, fields) for node_id, depth in nodes), fields, output_format,
+                **{key: value for key, value in anomalies.items() if value}
+            )
+
+        if not tree.nodes:
+            return f"📊 No tasks found for project {project_id}"
+
+        if task_id:
+            header = f"✅ Task tree under task {task_id} ({tree.nodes[task_id]['count']} task(s)):\n"
+        else:
+            top = tree.roots + tree.orphans
+            planned = sum(tree.nodes[root]["planned"] for root in top)
+            spent = sum(tree.nodes[root]["spent"] for root in top)
+            weighted = sum(tree.nodes[root]["weighted"] for root in top)
+            progress = weighted / planned if planned else sum(tree.nodes[root]["progress_sum"] for root in top) / len(tree.nodes)
+            header = (
+                f"✅ Task tree of project {project_id} ({len(tree.nodes)} task(s)) - "
+                f"Planned: {planned / 3600:.2f}h - Spent: {spent / 3600:.2f}h - Progress: {progress:.1f}%\n"
+            )
+
+        result_lines = [header]
+        result_lines.extend(tree.format_line(node_id, depth, max_depth) for node_id, depth in nodes)
+
+        if tree.orphans:
+            result_lines.append(f"\n⚠️ {len(tree.orphans)} orphan task(s) whose parent is not in the project: {', '.join(map(str, tree.orphans))}")
+        for cycle in tree.cycles:
+            result_lines.append(f"⚠️ Parent loop: {' -> '.join(map(str, cycle))} -> {cycle[0]} (cut at task {cycle[0]})")
+
+        return "\n".join(result_lines)
+
+    except UnknownFieldError as e:
+        return f"❌ Error: {str(e)}"
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 404:
+            if project_id:
+                return f"📊 No tasks found for project {project_id}"
             return f"❌ Error: Task {task_id} not found"
         elif e.response.status_code == 401:
             return "❌ Error: Authentication failed or insufficient permissions"
         else:
             return f"❌ API Error: {e.response.status_code} - {e.response.text}"
     except Exception as e:
-        logger.error(f"Error fetching task: {e}")
+        logger.error(f"Error building task tree: {e}")
+        return f"❌ Error: {str(e)}"
+
+@mcp.tool()
+@instrument_tool
+async def dolibarr_task_timesheet(task_id: str = "", project_id: str = "", date_from: str = "", date_to: str = "", group_by: str = "user", entries_page: str = "", entries_limit: str = "100", output_format: str = "text") -> str:
+    """Total the time spent of one task, of a project, or of every task within a date range (date_from/date_to ISO 8601, inclusive) - group_by is a comma-separated list of user, task, day, week (ISO week) and month; raw entries are only listed when entries_page is set (0-based, entries_limit per page); output_format 'json' or 'tsv' returns the totals, or the entries page when entries_page is set."""
+    logger.info(f"Building timesheet for task {task_id or '-'} / project {project_id or '-'} from {date_from or '-'} to {date_to or '-'}")
+
+    if not DOLIBARR_URL or not DOLIBARR_API_KEY:
+        return "❌ Error: DOLIBARR_URL and DOLIBARR_API_KEY must be configured"
+
+    try:
+        output_format, _fields = parse_output_options(output_format, "", ())
+        task_id = int(task_id) if task_id.strip() else 0
+        project_id = int(project_id) if project_id.strip() else 0
+        start = parse_timesheet_date(date_from, "date_from")
+        end = parse_timesheet_date(date_to, "date_to")
+        page = int(entries_page) if entries_page.strip() else None
+        limit = int(entries_limit) if entries_limit.strip() else 100
+    except ValueError as e:
+        return f"❌ Error: {str(e)}"
+
+    if task_id < 0 or project_id < 0:
+        return "❌ Error: task_id and project_id must be positive integers"
+    if not (task_id or project_id or start or end):
+        return "❌ Error: task_id, project_id or a date range (date_from/date_to) is required"
+    if start and end and start > end:
+        return "❌ Error: date_from must not be after date_to"
+
+    groups = tuple(dict.fromkeys(group.strip().lower() for group in group_by.split(",") if group.strip())) or ("user",)
+    unknown = [group for group in groups if group not in TIMESHEET_GROUPS]
+    if unknown:
+        return f"❌ Error: unknown group_by {', '.join(unknown)} - expected: {', '.join(TIMESHEET_GROUPS)}"
+
+    if page is not None and (page < 0 or not 1 <= limit <= TIMESHEET_MAX_ENTRIES):
+        return f"❌ Error: entries_page must be 0 or more and entries_limit between 1 and {TIMESHEET_MAX_ENTRIES}"
+
+    aggregator = TimesheetAggregator(groups, start, end, (page or 0) * limit, limit if page is not None else 0)
+    failed = []
+    read = 0
+    truncated = False
+
+    async def fetch_lines(tid):
+        url = f"{DOLIBARR_URL}/api/index.php/tasks/{tid}"
+        # Not cached - time spent lines are large and rarely read twice
+        return await get_json(url, {"includetimespent": 2})
+
+    def consume(tid, future):
+        try:
+            task = future.result()
+        except httpx.HTTPStatusError as e:
+            if task_id:
+                raise
+            # Tasks deleted during a scan are simply skipped
+            if e.response.status_code != 404:
+                failed.append((tid, f"API error {e.response.status_code}"))
+            return
+        except Exception as e:
+            if task_id:
+                raise
+            failed.append((tid, str(e)))
+            return
+        aggregator.add_task(tid, (task or {}).get('timespent_lines'))
+
+    # Sliding window: up to BATCH_CONCURRENCY fetches in flight, lines folded
+    # in task order as soon as the oldest fetch completes, then released
+    pending = deque()
+    scan = iter_timesheet_task_ids(task_id, project_id, start, end)
+    # One task is an interactive read; a project or date range scan is bulk work
+    with bulk_priority(not task_id):
+        try:
+            async for task_ids in scan:
+                for tid in task_ids:
+                    # Each task is one GET: a scope matching more tasks is cut, with a notice
+                    if read >= TIMESHEET_MAX_TASKS:
+                        truncated = True
+                        break
+                    read += 1
+                    pending.append((tid, asyncio.ensure_future(fetch_lines(tid))))
+                    if len(pending) >= BATCH_CONCURRENCY:
+                        tid, future = pending.popleft()
+                        await asyncio.wait([future])
+                        consume(tid, future)
+                if truncated:
+                    break
+            while pending:
+                tid, future = pending.popleft()
+                await asyncio.wait([future])
+                consume(tid, future)
+
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                return f"❌ Error: Task {task_id} not found"
+            elif e.response.status_code == 401:
+                return "❌ Error: Authentication failed or insufficient permissions"
+            else:
+                return f"❌ API Error: {e.response.status_code} - {e.response.text}"
+        except Exception as e:
+            logger.error(f"Error building timesheet: {e}")
+            return f"❌ Error: {str(e)}"
+        finally:
+            for _tid, future in pending:
+                future.cancel()
+            await scan.aclose()
+
+    total_hours = round(aggregator.total_seconds / 3600, 2)
+    extra = {"total_hours": total_hours, "total_entries": aggregator.total_entries, "tasks": aggregator.tasks}
+    if failed:
+        extra["failed_tasks"] = [tid for tid, _error in failed]
+    if truncated:
+        extra["truncated"] = True
+
+    if output_format != "text":
+        if page is not None:
+            return format_rows(aggregator.entry_rows(), TIMESHEET_ENTRY_FIELDS, output_format, page=page, **extra)
+        return format_rows(aggregator.rows(), groups + ("hours", "entries", "seconds"), output_format, **extra)
+
+    if task_id:
+        scope = f"task {task_id}"
+    elif project_id:
+        scope = f"project {project_id}"
+    else:
+        scope = "all tasks"
+    if start or end:
+        scope += f" from {start or 'the beginning'} to {end or 'today'}"
+
+    if not aggregator.total_entries:
+        result_lines = [f"📊 No time spent found for {scope}"]
+    else:
+        result_lines = [
+            f"✅ Timesheet of {scope}: {total_hours:.2f}h in {aggregator.total_entries} entries over {aggregator.tasks} task(s)\n",
+            f"By {' / '.join(groups)}:",
+        ]
+        result_lines.extend(f"• {' / '.join(row[:-3])}: {row[-3]:.2f}h ({row[-2]} entr{'y' if row[-2] == 1 else 'ies'})" for row in aggregator.rows())
+
+        if page is not None:
+            first = page * limit
+            if aggregator.entries:
+                result_lines.append(f"\n📊 Time Spent Entries ({first + 1}-{first + len(aggregator.entries)} of {aggregator.total_entries}):")
+                result_lines.extend(f"{format_timespent_line(line)} (task {tid})" for tid, line in aggregator.entries)
+                if first + len(aggregator.entries) < aggregator.total_entries:
+                    result_lines.append(f"   ... next page: entries_page={page + 1}")
+            else:
+                result_lines.append(f"\n📊 No entries on page {page} ({aggregator.total_entries} entries in total)")
+
+    if truncated:
+        result_lines.append(f"\n⚠️ Only the first {TIMESHEET_MAX_TASKS} tasks were read (DOLIBARR_TIMESHEET_MAX_TASKS): the totals are partial - narrow the scope with project_id or task_id")
+    if failed:
+        result_lines.append(f"\n❌ {len(failed)} task(s) could not be read and are not counted:")
+        result_lines.extend(f"   • Task {tid}: {error}" for tid, error in failed)
+
+    return "\n".join(result_lines)
+
+@mcp.tool()
+@instrument_tool
+async def dolibarr_task_changes(since: str = "", project_id: str = "", consumer: str = "", max_results: str = "500", output_format: str = "text", fields: str = "") -> str:
+    """List tasks modified since a watermark (t.tms), optionally of one project, and return the next watermark - pass it back as since, or leave since empty to continue from the watermark the server remembers for this consumer name (the first call only starts the feed); since also accepts an ISO 8601 date. output_format 'json' or 'tsv' returns only the comma-separated fields."""
+    logger.info(f"Reading task changes since {since or 'remembered watermark'} for consumer '{consumer}'")
+
+    if not DOLIBARR_URL or not DOLIBARR_API_KEY:
+        return "❌ Error: DOLIBARR_URL and DOLIBARR_API_KEY must be configured"
+
+    try:
+        output_format, fields = parse_output_options(output_format, fields, CHANGE_TASK_FIELDS)
+        max_results = int(max_results) if max_results.strip() else 500
+        sqlfilters = build_task_search_filter(project_id=project_id)
+        key = ("tasks", project_id.strip(), consumer.strip())
+        remembered = change_watermarks.get(key)
+        watermark = parse_watermark(since) if since.strip() else (parse_watermark(remembered) if remembered else None)
+    except ValueError as e:
+        return f"❌ Error: {str(e)}"
+
+    if not 1 <= max_results <= CHANGES_MAX_RESULTS:
+        return f"❌ Error: max_results must be between 1 and {CHANGES_MAX_RESULTS}"
+
+    scope = f"task(s) of project {project_id.strip()}" if project_id.strip() else "task(s)"
+
+    try:
+        changes, token, truncated = await read_changes("tasks", watermark, sqlfilters, max_results)
+        change_watermarks[key] = token
+        remember_refs(changes)
+        await apply_changes("tasks", changes)
+
+        if output_format != "text":
+            extra = {"watermark": token}
+            if truncated:
+                extra["truncated"] = True
+            return format_rows(select_rows(changes, fields), fields, output_format, **extra)
+
+        if watermark is None:
+            return f"🔖 Change feed started at watermark {token} - call again with since={token} (or an empty since and the same consumer) to get later changes"
+
+        if not changes:
+            return f"📊 No {scope} changed since {format_tms_filter(watermark[0])} UTC\n🔖 Next watermark: {token}"
+
+        result_lines = [f"✅ {len(changes)} {scope} changed since {format_tms_filter(watermark[0])} UTC:\n"]
+        result_lines.extend(
+            f"{format_task_line(task)} - Modified: {format_tms_filter(parse_tms(task.get('tms')))}" for task in changes
+        )
+        result_lines.append(f"\n🔖 Next watermark: {token}")
+        if truncated:
+            result_lines.append(f"⚠️ More than {max_results} changes - call again with the new watermark for the rest")
+
+        return "\n".join(result_lines)
+
+    except UnknownFieldError as e:
+        return f"❌ Error: {str(e)}"
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 401:
+            return "❌ Error: Authentication failed or insufficient permissions"
+        else:
+            return f"❌ API Error: {e.response.status_code} - {e.response.text}"
+    except Exception as e:
+        logger.error(f"Error reading task changes: {e}")
         return f"❌ Error: {str(e)}"
 
 @mcp.tool()
+@instrument_tool
 async def dolibarr_create_task(ref: str = "", label: str = "", fk_project: str = "", description: str = "", fk_task_parent: str = "", date_start: str = "", date_end: str = "", planned_workload: str = "", progress: str = "", priority: str = "", budget_amount: str = "", note_public: str = "", note_private: str = "") -> str:
     """Create a new Dolibarr task - planned_workload in SECONDS, date_start/date_end in ISO 8601 format (YYYY-MM-DDTHH:MM:SS or YYYY-MM-DD)."""
     logger.info(f"Creating task: {ref} - {label}")
@@ -305,13 +1519,15 @@ async def dolibarr_create_task(ref: str = "", label: str = "", fk_project: str =
         if note_private.strip():
             task_data["note_private"] = note_private.strip()
 
-        async with httpx.AsyncClient() as client:
-            url = f"{DOLIBARR_URL}/api/index.php/tasks"
-            response = await client.post(url, headers=get_headers(), json=task_data, timeout=10)
-            response.raise_for_status()
-            task_id = response.json()
+        url = f"{DOLIBARR_URL}/api/index.php/tasks"
+        response = await send_request("POST", url, json=task_data, operation="write")
+        response.raise_for_status()
+        task_id = response.json()
+        remember_refs({"id": task_id, "ref": task_data["ref"]})
+
+        cache.invalidate(f"{DOLIBARR_URL}/api/index.php/projects/{task_data['fk_project']}/tasks")
 
-            return f"✅ Task Created Successfully!\n\n   Task ID: {task_id}\n   Reference: {ref}\n   Label: {label}\n   Project ID: {fk_project}"
+        return f"✅ Task Created Successfully!\n\n   Task ID: {task_id}\n   Reference: {ref}\n   Label: {label}\n   Project ID: {fk_project}"
 
     except ValueError as e:
         return f"❌ Error: Invalid number format - {str(e)}"
@@ -327,6 +1543,7 @@ async def dolibarr_create_task(ref: str = "", label: str = "", fk_project: str =
         return f"❌ Error: {str(e)}"
 
 @mcp.tool()
+@instrument_tool
 async def dolibarr_modify_task(task_id: int, label: str = "", description: str = "", progress: str = "", planned_workload: str = "", priority: str = "", budget_amount: str = "", date_start: str = "", date_end: str = "", note_public: str = "", note_private: str = "") -> str:
     """Update an existing Dolibarr task - planned_workload in SECONDS, date_start/date_end in ISO 8601 format (YYYY-MM-DDTHH:MM:SS or YYYY-MM-DD)."""
     logger.info(f"Updating task: {task_id}")
@@ -337,80 +1554,30 @@ async def dolibarr_modify_task(task_id: int, label: str = "", description: str =
     if not DOLIBARR_URL or not DOLIBARR_API_KEY:
         return "❌ Error: DOLIBARR_URL and DOLIBARR_API_KEY must be configured"
 
-    update_data = {}
-
-    if label.strip():
-        update_data["label"] = label.strip()
-
-    if description.strip():
-        update_data["description"] = description.strip()
-
-    if progress.strip():
-        try:
-            prog_int = int(progress)
-            if 0 <= prog_int <= 100:
-                update_data["progress"] = prog_int
-            else:
-                return "❌ Error: progress must be between 0 and 100"
-        except ValueError:
-            return f"❌ Error: progress must be a valid integer, got: {progress}"
-
-    if planned_workload.strip():
-        try:
-            # planned_workload must be in SECONDS (not hours)
-            seconds = int(float(planned_workload))
-
-            # Validation: warn if value seems too small (likely hours instead of seconds)
-            if seconds > 0 and seconds < 3600:
-                logger.warning(f"planned_workload={seconds}s is less than 1 hour - did you mean to send seconds?")
-                return f"❌ Error: planned_workload must be in SECONDS, not hours. Got {seconds} which is only {seconds/60:.1f} minutes. For 20 hours, send '72000' (20*3600). For 1 hour, send '3600'."
-
-            update_data["planned_workload"] = seconds
-        except ValueError:
-            return f"❌ Error: planned_workload must be a valid number in SECONDS (e.g., '72000' for 20 hours), got: {planned_workload}"
-
-    if priority.strip():
-        try:
-            update_data["priority"] = int(priority)
-        except ValueError:
-            return f"❌ Error: priority must be a valid integer, got: {priority}"
-
-    if budget_amount.strip():
-        try:
-            update_data["budget_amount"] = float(budget_amount)
-        except ValueError:
-            return f"❌ Error: budget_amount must be a valid number, got: {budget_amount}"
-
-    # Date format: ISO 8601 (YYYY-MM-DDTHH:MM:SS) or simple date (YYYY-MM-DD)
-    if date_start.strip():
-        try:
-            update_data["date_start"] = convert_iso_date_to_timestamp(date_start)
-        except ValueError as e:
-            return f"❌ Error: date_start - {str(e)}"
-
-    if date_end.strip():
-        try:
-            update_data["date_end"] = convert_iso_date_to_timestamp(date_end)
-        except ValueError as e:
-            return f"❌ Error: date_end - {str(e)}"
-
-    if note_public.strip():
-        update_data["note_public"] = note_public.strip()
-
-    if note_private.strip():
-        update_data["note_private"] = note_private.strip()
+    try:
+        update_data = build_task_update({
+            "label": label, "description": description, "progress": progress, "planned_workload": planned_workload,
+            "priority": priority, "budget_amount": budget_amount, "date_start": date_start, "date_end": date_end,
+            "note_public": note_public, "note_private": note_private,
+        })
+    except ValueError as e:
+        return f"❌ Error: {str(e)}"
 
     if not update_data:
         return "❌ Error: At least one field to update must be provided"
 
     try:
-        async with httpx.AsyncClient() as client:
-            url = f"{DOLIBARR_URL}/api/index.php/tasks/{task_id}"
-            response = await client.put(url, headers=get_headers(), json=update_data, timeout=10)
-            response.raise_for_status()
-            updated_task = response.json()
+        url = f"{DOLIBARR_URL}/api/index.php/tasks/{task_id}"
+        response = await send_request("PUT", url, json=update_data, operation="write")
+        response.raise_for_status()
+        updated_task = response.json()
 
-            return f"✅ Task Updated Successfully:\n\n{format_task_info(updated_task)}"
+        # Write-through: drop every cached variant, then keep the fresh copy
+        invalidate_task_cache(task_id, updated_task.get('fk_project') if isinstance(updated_task, dict) else None)
+        cache.set(url, {"includetimespent": 0}, updated_task)
+        remember_refs(updated_task)
+
+        return f"✅ Task Updated Successfully:\n\n{format_task_info(updated_task)}"
 
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 404:
@@ -424,6 +1591,114 @@ async def dolibarr_modify_task(task_id: int, label: str = "", description: str =
         return f"❌ Error: {str(e)}"
 
 @mcp.tool()
+@instrument_tool
+async def dolibarr_modify_tasks_bulk(patches: list[dict], output_format: str = "text") -> str:
+    """Update many Dolibarr tasks in one call - patches is a list of {"task_id": N, field: value}, with the fields of dolibarr_modify_task (planned_workload in SECONDS, dates in ISO 8601). All patches are validated before any update is sent."""
+    logger.info(f"Updating {len(patches or [])} task(s) in bulk")
+
+    if not patches:
+        return "❌ Error: patches is required and must be a non-empty list of {\"task_id\": N, field: value} objects"
+
+    if len(patches) > BULK_UPDATE_MAX_TASKS:
+        return f"❌ Error: at most {BULK_UPDATE_MAX_TASKS} tasks can be updated in one call, got {len(patches)}"
+
+    output_format = output_format.strip().lower() or "text"
+    if output_format not in OUTPUT_FORMATS:
+        return f"❌ Error: output_format must be one of: {', '.join(OUTPUT_FORMATS)}"
+
+    if not DOLIBARR_URL or not DOLIBARR_API_KEY:
+        return "❌ Error: DOLIBARR_URL and DOLIBARR_API_KEY must be configured"
+
+    # Validate everything before sending anything
+    valid = []
+    invalid = []
+    seen = set()
+    for number, patch in enumerate(patches, start=1):
+        try:
+            if not isinstance(patch, dict):
+                raise ValueError("must be an object with task_id and the fields to update")
+            booleans = sorted(key for key, value in patch.items() if isinstance(value, bool))
+            if booleans:
+                raise ValueError(f"{', '.join(booleans)} must not be a boolean")
+            values = {key: "" if value is None else str(value) for key, value in patch.items()}
+            unknown = sorted(set(values) - set(TASK_UPDATE_FIELDS) - {"task_id"})
+            if unknown:
+                raise ValueError(f"unknown field(s) {', '.join(unknown)} - expected task_id and any of: {', '.join(TASK_UPDATE_FIELDS)}")
+            try:
+                task_id = parse_whole_number(values.get("task_id", "").strip())
+            except ValueError:
+                raise ValueError(f"task_id must be a positive integer, got: {values.get('task_id', '')!r}")
+            if task_id <= 0:
+                raise ValueError(f"task_id must be a positive integer, got: {task_id}")
+            # Two concurrent PUTs on one task would race
+            if task_id in seen:
+                raise ValueError(f"task {task_id} appears in more than one patch")
+            seen.add(task_id)
+            update_data = build_task_update(values)
+            if not update_data:
+                raise ValueError(f"task {task_id} - at least one field to update must be provided")
+            valid.append((task_id, update_data))
+        except ValueError as e:
+            invalid.append(f"   • Patch {number}: {str(e)}")
+
+    if invalid:
+        return "\n".join([f"❌ Error: {len(invalid)} invalid patch(es) - nothing was updated:"] + invalid)
+
+    semaphore = asyncio.Semaphore(BULK_UPDATE_CONCURRENCY)
+
+    async def put_one(task_id, update_data):
+        url = f"{DOLIBARR_URL}/api/index.php/tasks/{task_id}"
+        async with semaphore:
+            # A PUT of the same fields is idempotent: gateway errors are retried here, per task
+            for attempt in range(BULK_RETRIES + 1):
+                try:
+                    response = await send_request("PUT", url, json=update_data, operation="write")
+                    if is_transient(response) and attempt < BULK_RETRIES:
+                        await asyncio.sleep(retry_delay(attempt))
+                        continue
+                    response.raise_for_status()
+                    return task_id, update_data, response.json(), None
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code == 404:
+                        return task_id, update_data, None, "task not found"
+                    elif e.response.status_code == 401:
+                        return task_id, update_data, None, "authentication failed or insufficient permissions"
+                    return task_id, update_data, None, f"API error {e.response.status_code} - {e.response.text}"
+                except Exception as e:
+                    logger.error(f"Error updating task {task_id} in bulk: {e}")
+                    return task_id, update_data, None, str(e)
+
+    results = await asyncio.gather(*(put_one(task_id, update_data) for task_id, update_data in valid))
+
+    # Write-through, as dolibarr_modify_task does
+    for task_id, _update_data, task, error in results:
+        if error is None and isinstance(task, dict):
+            invalidate_task_cache(task_id, task.get('fk_project'))
+            cache.set(f"{DOLIBARR_URL}/api/index.php/tasks/{task_id}", {"includetimespent": 0}, task)
+            remember_refs(task)
+        elif error is None:
+            invalidate_task_cache(task_id)
+
+    failed = sum(1 for result in results if result[3] is not None)
+    rows = [
+        [task_id, task.get('ref') if isinstance(task, dict) else None, "failed" if error else "updated", ",".join(update_data), error]
+        for task_id, update_data, task, error in results
+    ]
+
+    if output_format != "text":
+        return format_rows(rows, BULK_UPDATE_FIELDS, output_format, updated=len(results) - failed, failed=failed)
+
+    status = "✅" if not failed else "⚠️"
+    lines = [f"{status} Updated {len(results) - failed}/{len(results)} task(s)"]
+    for task_id, ref, _status, fields, error in rows:
+        if error:
+            lines.append(f"   ❌ {task_id}: {error}")
+        else:
+            lines.append(f"   ✅ {task_id}{f' ({ref})' if ref else ''}: {fields.replace(',', ', ')}")
+    return "\n".join(lines)
+
+@mcp.tool()
+@instrument_tool
 async def dolibarr_task_add_spenttime(task_id: int, date: str = "", duration: str = "", user_id: str = "", note: str = "") -> str:
     """Add a time spent entry to a Dolibarr task - date in ISO 8601 format (YYYY-MM-DDTHH:MM:SS or YYYY-MM-DD), duration in seconds."""
     logger.info(f"Adding time spent to task: {task_id}")
@@ -466,13 +1741,14 @@ async def dolibarr_task_add_spenttime(task_id: int, date: str = "", duration: st
         if note.strip():
             timespent_data["note"] = note.strip()
 
-        async with httpx.AsyncClient() as client:
-            url = f"{DOLIBARR_URL}/api/index.php/tasks/{task_id}/addtimespent"
-            response = await client.post(url, headers=get_headers(), json=timespent_data, timeout=10)
-            response.raise_for_status()
-            result = response.json()
+        url = f"{DOLIBARR_URL}/api/index.php/tasks/{task_id}/addtimespent"
+        response = await send_request("POST", url, json=timespent_data, operation="write")
+        response.raise_for_status()
+        result = response.json()
+
+        invalidate_task_cache(task_id)
 
-            return f"✅ Time Spent Added Successfully!\n\n   Task ID: {task_id}\n   Date: {date_str}\n   Duration: {duration_seconds} seconds ({duration_hours} hours)\n   Note: {note if note else 'N/A'}"
+        return f"✅ Time Spent Added Successfully!\n\n   Task ID: {task_id}\n   Date: {date_str}\n   Duration: {duration_seconds} seconds ({duration_hours} hours)\n   Note: {note if note else 'N/A'}"
 
     except ValueError as e:
         return f"❌ Error: Invalid number format - {str(e)}"
@@ -489,7 +1765,95 @@ async def dolibarr_task_add_spenttime(task_id: int, date: str = "", duration: st
         logger.error(f"Error adding time spent: {e}")
         return f"❌ Error: {str(e)}"
 
+@mcp.tool()
+@instrument_tool
+async def dolibarr_task_add_spenttime_bulk(entries: str = "", input_format: str = "auto") -> str:
+    """Add many time spent entries in one call - entries as JSON lines or CSV (task_id,date,duration,user_id,note), date in ISO 8601, duration in seconds."""
+    logger.info("Importing time spent entries in bulk")
+
+    if not entries.strip():
+        return "❌ Error: entries is required (JSON lines or CSV with task_id, date, duration, user_id, note)"
+
+    if not DOLIBARR_URL or not DOLIBARR_API_KEY:
+        return "❌ Error: DOLIBARR_URL and DOLIBARR_API_KEY must be configured"
+
+    try:
+        rows = parse_timespent_entries(entries, input_format)
+    except ValueError as e:
+        return f"❌ Error: {str(e)}"
+
+    if not rows:
+        return "❌ Error: no time spent entries found in input"
+
+    if len(rows) > BULK_MAX_ENTRIES:
+        return f"❌ Error: at most {BULK_MAX_ENTRIES} entries can be imported in one call, got {len(rows)}"
+
+    # Validate everything before sending anything
+    valid = []
+    invalid = []
+    for line_number, values in rows:
+        try:
+            valid.append((line_number, *build_timespent_entry(values)))
+        except ValueError as e:
+            invalid.append(f"   • Line {line_number}: {str(e)}")
+
+    if invalid:
+        return "\n".join([f"❌ Error: {len(invalid)} invalid entr{'y' if len(invalid) == 1 else 'ies'} - nothing was imported:"] + invalid)
+
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def post_one(line_number, task_id, timespent_data):
+        url = f"{DOLIBARR_URL}/api/index.php/tasks/{task_id}/addtimespent"
+        async with semaphore:
+            # Connection failures and 429 are retried by send_request (nothing was
+            # processed). A POST is never retried on a gateway error: Dolibarr may
+            # have committed the entry before the proxy gave up.
+            try:
+                response = await send_request("POST", url, json=timespent_data, operation="write")
+                if is_transient(response):
+                    return line_number, task_id, timespent_data, f"outcome unknown (gateway error {response.status_code}) - check the task's time spent before importing this line again"
+                response.raise_for_status()
+                return line_number, task_id, timespent_data, None
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code == 404:
+                    return line_number, task_id, timespent_data, "task not found"
+                elif e.response.status_code == 401:
+                    return line_number, task_id, timespent_data, "authentication failed or insufficient permissions"
+                return line_number, task_id, timespent_data, f"API error {e.response.status_code} - {e.response.text}"
+            except httpx.ReadTimeout:
+                return line_number, task_id, timespent_data, "outcome unknown (timeout) - check the task's time spent before importing this line again"
+            except Exception as e:
+                logger.error(f"Error adding time spent for line {line_number}: {e}")
+                return line_number, task_id, timespent_data, str(e)
+
+    results = await asyncio.gather(*(post_one(*entry) for entry in valid))
+
+    succeeded = [result for result in results if result[3] is None]
+    failed = [result for result in results if result[3] is not None]
+
+    for task_id in {task_id for _line, task_id, _data, _error in succeeded}:
+        invalidate_task_cache(task_id)
+
+    total_hours = sum(data["duration"] for _line, _task, data, _error in succeeded) / 3600
+    task_count = len({task_id for _line, task_id, _data, _error in succeeded})
+    status = "✅" if not failed else "⚠️"
+    lines = [f"{status} Imported {len(succeeded)}/{len(results)} time spent entries ({total_hours:.2f} hours on {task_count} task(s))"]
+
+    if failed:
+        lines.append(f"\n❌ {len(failed)} entr{'y' if len(failed) == 1 else 'ies'} failed:")
+        lines.extend(f"   • Line {line_number} (task {task_id}): {error}" for line_number, task_id, _data, error in sorted(failed))
+
+    return "\n".join(lines)
+
+@mcp.tool()
+@instrument_tool
+async def dolibarr_cache_stats() -> str:
+    """Show read cache hit/miss counters, coalesced request counts and upstream scheduler queues for this server."""
+    logger.info("Reporting cache statistics")
+    return format_cache_stats()
+
 # === SERVER STARTUP ===
+
 if __name__ == "__main__":
     logger.info("Starting Dolibarr Tasks MCP server...")
 
@@ -498,8 +1862,12 @@ if __name__ == "__main__":
     if not DOLIBARR_API_KEY:
         logger.warning("DOLIBARR_API_KEY not set - server will return errors until configured")
 
+    if MCP_TRANSPORT not in MCP_TRANSPORTS:
+        logger.error(f"Unknown DOLIBARR_MCP_TRANSPORT '{MCP_TRANSPORT}' - expected one of: {', '.join(MCP_TRANSPORTS)}")
+        sys.exit(1)
+
     try:
-        mcp.run(transport='stdio')
+        run_server(mcp)
     except Exception as e:
         logger.error(f"Server error: {e}", exc_info=True)
         sys.exit(1)
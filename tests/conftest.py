@@ -0,0 +1,34 @@
+"""Shared setup for the unit tests: configuration and import paths of the servers, fake Dolibarr."""
+
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+# The servers read their configuration at import time
+os.environ.setdefault("DOLIBARR_URL", "http://dolibarr.invalid")
+os.environ.setdefault("DOLIBARR_API_KEY", "test")
+os.environ["DOLIBARR_MIRROR_PATH"] = ""
+os.environ["DOLIBARR_RETRY_BASE_DELAY"] = "0"
+
+ROOT = Path(__file__).resolve().parent.parent
+for directory in ("mcp-server-common", "mcp-server-projects", "mcp-server-tasks", "benchmarks"):
+    sys.path.insert(0, str(ROOT / directory))
+
+
+@pytest.fixture
+def fake():
+    """A FakeDolibarr serving the shared HTTP client, with a cold cache and a closed breaker."""
+    import dolibarr_common
+    from fake_dolibarr import FakeDolibarr
+
+    fake = FakeDolibarr(projects=5, tasks=10)
+    dolibarr_common.cache.clear()
+    dolibarr_common.breaker.record_success()
+    dolibarr_common._http_client = httpx.AsyncClient(transport=fake.transport(), headers=dolibarr_common.get_headers())
+    yield fake
+    asyncio.run(dolibarr_common._http_client.aclose())
+    dolibarr_common._http_client = None
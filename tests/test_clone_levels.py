@@ -0,0 +1,35 @@
+"""Unit tests for plan_clone_levels, the creation order of dolibarr_clone_project."""
+
+from dolibarr_projects_server import plan_clone_levels
+
+
+def task(task_id, parent=0):
+    return {"id": str(task_id), "fk_task_parent": str(parent)}
+
+
+def ids(levels):
+    return [[task["id"] for task in level] for level in levels]
+
+
+def test_levels_follow_the_hierarchy():
+    levels, cycles = plan_clone_levels([task(1), task(2, parent=1), task(3, parent=2), task(4), task(5, parent=4)])
+    assert ids(levels) == [["1", "4"], ["2", "5"], ["3"]]
+    assert cycles == 0
+
+
+def test_parent_outside_the_list_and_self_parent_are_level_zero():
+    levels, cycles = plan_clone_levels([task(1, parent=99), task(2, parent=2)])
+    assert ids(levels) == [["1", "2"]]
+    assert cycles == 0
+
+
+def test_cycle_members_are_cloned_flat():
+    tasks = [task(1), task(2, parent=3), task(3, parent=2)]
+    levels, cycles = plan_clone_levels(tasks)
+    assert cycles == 2
+    assert ids(levels) == [["1", "2", "3"]]
+    assert all(task["fk_task_parent"] == "0" for task in tasks[1:])
+
+
+def test_no_tasks():
+    assert plan_clone_levels([]) == ([], 0)
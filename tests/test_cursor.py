@@ -0,0 +1,33 @@
+"""Unit tests for the continuation cursors of dolibarr_list_all_projects."""
+
+import asyncio
+
+import pytest
+
+import dolibarr_projects_server as projects
+
+
+def list_all(**arguments):
+    return asyncio.run(projects.mcp._tool_manager.get_tool("dolibarr_list_all_projects").fn(**arguments))
+
+
+def test_cursor_round_trip():
+    token = projects.encode_cursor(3, 50, "t.ref", "DESC")
+    assert projects.decode_cursor(token) == (3, 50, "t.ref", "DESC")
+
+
+@pytest.mark.parametrize("token", ["", "not-a-cursor", projects.encode_cursor(0, 10, "t.rowid", "SIDEWAYS")])
+def test_malformed_cursor_is_rejected(token):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        projects.decode_cursor(token)
+
+
+def test_chunk_mode_rejects_invalid_sortorder(fake):
+    assert list_all(chunk_size="2", sortorder="DROP") == "❌ Error: sortorder must be ASC or DESC"
+
+
+def test_chunk_mode_returns_a_cursor_for_the_next_chunk(fake):
+    result = list_all(chunk_size="2", sortorder="desc", output_format="json", fields="id")
+    assert '"rows":[["5"],["4"]]' in result
+    token = result.split('"cursor":"')[1].split('"')[0]
+    assert projects.decode_cursor(token) == (1, 2, "t.rowid", "DESC")
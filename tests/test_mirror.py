@@ -0,0 +1,41 @@
+"""Unit tests for the local mirror of the projects server."""
+
+import asyncio
+
+import pytest
+
+import dolibarr_projects_server as projects
+
+
+@pytest.fixture
+def mirror(tmp_path, monkeypatch):
+    local = projects.LocalMirror(str(tmp_path / "mirror.db"))
+    monkeypatch.setattr(projects, "mirror", local)
+    yield local
+    local.close()
+
+
+def test_full_sync_copies_projects_and_tasks(fake, mirror):
+    asyncio.run(projects.sync_mirror(full=True))
+    assert mirror.counts() == (5, 10)
+    assert mirror.get_project(3)["ref"] == "PJ000003"
+
+
+def test_delta_sync_removes_rows_deleted_in_dolibarr(fake, mirror):
+    asyncio.run(projects.sync_mirror(full=True))
+    del fake.projects[2]
+    del fake.tasks[7]
+
+    asyncio.run(projects.sync_mirror())
+
+    assert mirror.get_project(2) is None
+    assert mirror.counts() == (4, 9)
+    # Task 7 belongs to project 3, which is still there
+    assert [task["id"] for task in mirror.get_project_tasks(3)] == ["3", "8"]
+
+
+def test_delta_sync_keeps_rows_missing_from_the_id_listing_but_in_the_delta(mirror):
+    mirror.store([{"id": "1", "ref": "PJ1", "tms": 10}], [], full=True)
+    mirror.store([{"id": "2", "ref": "PJ2", "tms": 20}], [], live_ids=(set(), set()))
+    assert mirror.get_project(1) is None
+    assert mirror.get_project(2)["ref"] == "PJ2"
@@ -0,0 +1,39 @@
+"""Unit tests for the read cache invalidation of the tasks server."""
+
+import asyncio
+import json
+
+import dolibarr_common
+import dolibarr_projects_server as projects
+import dolibarr_tasks_server as tasks
+
+
+def call(module, tool_name, **arguments):
+    return asyncio.run(module.mcp._tool_manager.get_tool(tool_name).fn(**arguments))
+
+
+def task_durations(project_id):
+    result = call(projects, "dolibarr_get_project_tasks", project_id=project_id, includetimespent=1,
+                  output_format="json", fields="id,duration_effective")
+    return dict(json.loads(result)["rows"])
+
+
+def test_time_spent_refreshes_the_project_task_list(fake):
+    # Task 6 belongs to project 1; the task itself is not cached, only its project's list
+    assert task_durations(1)["6"] == "10800"
+
+    result = call(tasks, "dolibarr_task_add_spenttime", task_id=6, date="2025-01-15", duration="3600")
+    assert result.startswith("✅")
+
+    assert task_durations(1)["6"] == "14400"
+
+
+def test_known_project_only_drops_its_own_task_list(fake):
+    call(projects, "dolibarr_get_project_tasks", project_id=1, includetimespent=1)
+    call(projects, "dolibarr_get_project_tasks", project_id=2, includetimespent=1)
+
+    tasks.invalidate_task_cache(6, project_id=1)
+
+    base = f"{dolibarr_common.DOLIBARR_URL}/api/index.php/projects"
+    assert dolibarr_common.cache.peek(f"{base}/1/tasks") == []
+    assert dolibarr_common.cache.peek(f"{base}/2/tasks") != []
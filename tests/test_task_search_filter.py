@@ -0,0 +1,50 @@
+"""Unit tests for the sqlfilters builders of the tasks server."""
+
+import pytest
+
+from dolibarr_common import build_ref_filter
+from dolibarr_tasks_server import build_like_pattern, build_task_search_filter
+
+
+def test_empty_criteria_build_no_filter():
+    assert build_task_search_filter() == ""
+
+
+def test_criteria_are_combined_with_and():
+    sqlfilters = build_task_search_filter(project_id="7", progress_max="99", label="design")
+    assert sqlfilters == "(t.fk_projet:=:7) and (t.progress:<=:99) and (t.label:like:'%design%')"
+
+
+def test_label_wildcards_and_parentheses():
+    assert build_like_pattern("Phase*") == "Phase%"
+    assert build_like_pattern("Setup (v2)") == "%Setup _v2_%"
+
+
+def test_label_with_quote_is_rejected():
+    with pytest.raises(ValueError, match="quote"):
+        build_task_search_filter(label="O'Brien")
+
+
+def test_ref_with_quote_is_rejected():
+    with pytest.raises(ValueError, match="quote"):
+        build_ref_filter("TK'01")
+
+
+def test_date_upper_bound_covers_the_whole_day():
+    sqlfilters = build_task_search_filter(end_from="2025-01-01", end_to="2025-01-31")
+    assert sqlfilters == "(t.datee:>=:'2025-01-01 00:00:00') and (t.datee:<=:'2025-01-31 23:59:59')"
+
+
+def test_date_bound_with_time_is_kept():
+    assert build_task_search_filter(start_to="2025-01-31T12:30:00") == "(t.dateo:<=:'2025-01-31 12:30:00')"
+
+
+@pytest.mark.parametrize("bound", ["2025-01-31T12:30:00+02:00", "2025-01-31T12:30:00Z"])
+def test_date_bound_with_utc_offset_is_rejected(bound):
+    with pytest.raises(ValueError, match="UTC offset"):
+        build_task_search_filter(start_from=bound)
+
+
+def test_progress_out_of_range_is_rejected():
+    with pytest.raises(ValueError, match="between 0 and 100"):
+        build_task_search_filter(progress_min="120")
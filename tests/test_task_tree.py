@@ -0,0 +1,48 @@
+"""Unit tests for TaskTree, the task hierarchy of dolibarr_get_task_tree."""
+
+from dolibarr_tasks_server import TaskTree
+
+
+def task(task_id, parent=0, planned=0, spent=0, progress=0):
+    return {"id": str(task_id), "ref": f"TK{task_id}", "label": f"Task {task_id}", "fk_task_parent": str(parent),
+            "planned_workload": str(planned), "duration_effective": str(spent), "progress": str(progress)}
+
+
+def test_pre_order_and_depths():
+    tree = TaskTree([task(1), task(2, parent=1), task(3, parent=2), task(4, parent=1), task(5)])
+    assert tree.order == [1, 2, 3, 4, 5]
+    assert [tree.nodes[task_id]["depth"] for task_id in tree.order] == [0, 1, 2, 1, 0]
+
+
+def test_totals_roll_up_to_every_parent():
+    tree = TaskTree([task(1, planned=3600, spent=1800, progress=50),
+                     task(2, parent=1, planned=7200, spent=3600, progress=100),
+                     task(3, parent=2, planned=3600, progress=0)])
+    root = tree.nodes[1]
+    assert (root["count"], root["planned"], root["spent"]) == (3, 14400, 5400)
+    # (3600 * 50 + 7200 * 100 + 3600 * 0) / 14400
+    assert tree.rollup_progress(1) == 62.5
+
+
+def test_progress_is_a_plain_average_without_planned_workload():
+    tree = TaskTree([task(1, progress=20), task(2, parent=1, progress=60)])
+    assert tree.rollup_progress(1) == 40
+
+
+def test_orphans_are_shown_as_roots():
+    tree = TaskTree([task(1), task(2, parent=99)])
+    assert tree.orphans == [2]
+    assert tree.nodes[2]["depth"] == 0
+
+
+def test_parent_loops_are_cut_at_their_lowest_task():
+    tree = TaskTree([task(1), task(4, parent=3), task(3, parent=5), task(5, parent=4)])
+    assert tree.cycles == [[3, 5, 4]]
+    assert sorted(tree.order) == [1, 3, 4, 5]
+    assert tree.nodes[3]["depth"] == 0
+
+
+def test_subtree_with_max_depth():
+    tree = TaskTree([task(1), task(2, parent=1), task(3, parent=2), task(4)])
+    assert list(tree.subtree(1, max_depth=1)) == [(1, 0), (2, 1)]
+    assert list(tree.subtree()) == [(1, 0), (2, 1), (3, 2), (4, 0)]
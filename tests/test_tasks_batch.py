@@ -0,0 +1,23 @@
+"""Unit tests for dolibarr_get_tasks_batch."""
+
+import asyncio
+
+import pytest
+
+import dolibarr_tasks_server as tasks
+
+
+def get_batch(task_ids):
+    return asyncio.run(tasks.mcp._tool_manager.get_tool("dolibarr_get_tasks_batch").fn(task_ids=task_ids))
+
+
+@pytest.mark.parametrize("task_ids", [[True], [1, False], [2, 0], ["3"]])
+def test_invalid_task_ids_are_rejected(fake, task_ids):
+    assert get_batch(task_ids) == "❌ Error: every task ID must be a positive integer"
+    assert fake.requests == 0
+
+
+def test_duplicate_ids_are_fetched_once(fake):
+    result = get_batch([2, 3, 2])
+    assert "❌" not in result
+    assert fake.requests == 2
@@ -0,0 +1,46 @@
+"""Unit tests for dolibarr_task_timesheet."""
+
+import asyncio
+import json
+
+import dolibarr_common
+import dolibarr_tasks_server as tasks
+
+
+def timesheet(**arguments):
+    return asyncio.run(tasks.mcp._tool_manager.get_tool("dolibarr_task_timesheet").fn(**arguments))
+
+
+def test_date_range_scan_is_capped(fake, monkeypatch):
+    monkeypatch.setattr(tasks, "TIMESHEET_MAX_TASKS", 3)
+    before = fake.requests
+
+    result = json.loads(timesheet(date_from="2000-01-01", output_format="json"))
+
+    assert result["tasks"] == 3
+    assert result["truncated"] is True
+    # One listing page plus one includetimespent=2 read per task kept
+    assert fake.requests - before == 4
+
+
+def test_scope_under_the_cap_is_not_truncated(fake):
+    result = timesheet(project_id="1")
+    assert "⚠️" not in result
+    assert result.startswith("✅ Timesheet of project 1")
+
+
+def requests_by_class(run):
+    waits = dolibarr_common.limiter.waits
+    before = {name: stats["requests"] for name, stats in waits.items()}
+    run()
+    return {name: waits[name]["requests"] - before[name] for name in waits if waits[name]["requests"] > before[name]}
+
+
+def test_single_task_timesheet_is_interactive(fake, monkeypatch):
+    monkeypatch.setattr(dolibarr_common, "current_session", lambda: object())
+    assert requests_by_class(lambda: timesheet(task_id="4")) == {"interactive": 1}
+
+
+def test_project_timesheet_is_bulk(fake, monkeypatch):
+    monkeypatch.setattr(dolibarr_common, "current_session", lambda: object())
+    assert set(requests_by_class(lambda: timesheet(project_id="1"))) == {"bulk"}
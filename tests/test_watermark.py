@@ -0,0 +1,25 @@
+"""Unit tests for the change feed watermarks."""
+
+import pytest
+
+from dolibarr_common import format_watermark, parse_watermark
+
+
+def test_watermark_round_trip():
+    assert parse_watermark(format_watermark(1700000000, {12, 3})) == (1700000000, {3, 12})
+    assert parse_watermark(format_watermark(1700000000, set())) == (1700000000, set())
+
+
+def test_iso_date_is_read_as_utc():
+    assert parse_watermark("2024-01-01T00:00:00") == (1704067200, set())
+    assert parse_watermark("2024-01-01") == (1704067200, set())
+
+
+def test_iso_date_offset_is_converted():
+    assert parse_watermark("2024-01-01T02:00:00+02:00") == (1704067200, set())
+
+
+@pytest.mark.parametrize("since", ["yesterday", "12:ab", "-5"])
+def test_invalid_watermark_is_rejected(since):
+    with pytest.raises(ValueError, match="since must be"):
+        parse_watermark(since)